@@ -1,7 +1,12 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, IndexModel, ASCENDING
+from pymongo.collation import Collation
+from pymongo.errors import BulkWriteError
 from dotenv import load_dotenv
+import argparse
+import csv
 import os
 import logging
+import time
 from datetime import datetime
 
 # Configure logging
@@ -15,6 +20,77 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Case-insensitive matching for dimension names, the same semantics the API's lookups use
+CASE_INSENSITIVE = Collation(locale="en", strength=2)
+
+DIMENSIONS = {
+    "transmissions": ("transmissionid", "transmissiontype", ["Automatic", "Manual", "Semi-Automatic"]),
+    "fueltype": ("fueltypeid", "fueltype", ["Petrol", "Diesel", "Electric", "Hybrid"])
+}
+
+# Single-field cars indexes replaced by the compound ones in create_indexes, and
+# model_year_price, replaced by modelkey_year_price
+SUPERSEDED_CAR_INDEXES = ["model_year", "year", "price", "model_year_price"]
+
+# Legacy seed keys that the API never read
+LEGACY_NAME_FIELDS = {"transmissions": "transmission_type", "fueltype": "fuel_type"}
+
+def model_key(name):
+    """The trimmed, lower-cased model name the API filters and searches on, like Postgres' Cars.ModelKey"""
+    return None if name is None else name.strip().lower()
+
+def backfill_model_keys(mongo_db):
+    """Set modelkey on cars written before it existed, in one server-side update (idempotent)"""
+    result = mongo_db.cars.update_many(
+        {"modelkey": {"$exists": False}, "model": {"$type": "string"}},
+        [{"$set": {"modelkey": {"$toLower": {"$trim": {"input": "$model"}}}}}]
+    )
+    if result.modified_count:
+        logger.info(f"Set modelkey on {result.modified_count} cars")
+
+def create_indexes(mongo_db):
+    """Create the indexes the API's query shapes rely on (idempotent)"""
+    for collection, (id_field, name_field, _) in DIMENSIONS.items():
+        mongo_db[collection].create_indexes([
+            IndexModel([(id_field, ASCENDING)], unique=True, name=f"{id_field}_unique"),
+            IndexModel([(name_field, ASCENDING)], unique=True, collation=CASE_INSENSITIVE, name=f"{name_field}_ci")
+        ])
+        logger.info(f"Ensured indexes on {collection}")
+
+    existing = mongo_db.cars.index_information()
+    for name in SUPERSEDED_CAR_INDEXES:
+        if name in existing:
+            mongo_db.cars.drop_index(name)
+
+    # Equality fields lead, then the range field; the (field, _id) indexes also
+    # serve sorting by that field and keyset paging past (value, _id). Model
+    # filters match on the stored modelkey rather than through a collation, which
+    # would still tell ' Fiesta' from 'Fiesta'.
+    mongo_db.cars.create_indexes([
+        IndexModel([("modelkey", ASCENDING), ("year", ASCENDING), ("price", ASCENDING)], name="modelkey_year_price"),
+        IndexModel([("fueltypeid", ASCENDING), ("transmissionid", ASCENDING), ("year", ASCENDING)], name="fuel_transmission_year"),
+        IndexModel([("year", ASCENDING), ("_id", ASCENDING)], name="year_id"),
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)], name="price_id"),
+        IndexModel([("mileage", ASCENDING), ("_id", ASCENDING)], name="mileage_id"),
+        # Postgres CarID of cars copied by replicate.py; cars created through the API have none
+        IndexModel([("carid", ASCENDING)], unique=True, name="carid_unique",
+                   partialFilterExpression={"carid": {"$exists": True}})
+    ])
+    logger.info("Ensured indexes on cars")
+
+def seed_dimensions(mongo_db):
+    """Add the seed transmission and fuel types that are missing, under the field names the API queries"""
+    for collection, (_, _, names) in DIMENSIONS.items():
+        legacy = mongo_db[collection].delete_many({LEGACY_NAME_FIELDS[collection]: {"$exists": True}})
+        if legacy.deleted_count:
+            logger.info(f"Removed {legacy.deleted_count} legacy documents from {collection}")
+        # Missing names take the next free id, like types first met in a CSV; a
+        # fixed id may already belong to a type added by load_cars or the API
+        ids = dimension_ids(mongo_db, collection)
+        for name in names:
+            resolve_dimension(mongo_db, collection, ids, name)
+        logger.info(f"Seeded {collection}")
+
 def setup_mongodb():
     try:
         load_dotenv()
@@ -32,29 +108,11 @@ def setup_mongodb():
                 mongo_db.create_collection(collection)
                 logger.info(f"Created collection: {collection}")
 
-                # Insert initial data only if collection was just created
-                if collection == "transmissions":
-                    transmissions_data = [
-                        {"transmission_type": "Automatic"},
-                        {"transmission_type": "Manual"},
-                        {"transmission_type": "Semi-Automatic"}
-                    ]
-                    mongo_db.transmissions.insert_many(transmissions_data)
-                    logger.info("Inserted transmission types")
-                
-                elif collection == "fueltype":
-                    fuel_types_data = [
-                        {"fuel_type": "Petrol"},
-                        {"fuel_type": "Diesel"},
-                        {"fuel_type": "Electric"},
-                        {"fuel_type": "Hybrid"}
-                    ]
-                    mongo_db.fueltype.insert_many(fuel_types_data)
-                    logger.info("Inserted fuel types")
-                
-                elif collection == "cars" and mongo_db.cars.count_documents({}) == 0:
+                # Insert a sample car only if the collection was just created
+                if collection == "cars" and mongo_db.cars.count_documents({}) == 0:
                     car_data = {
                         "model": "Civic",
+                        "modelkey": "civic",
                         "year": 2018,
                         "price": 16000,
                         "transmissionid": 1,
@@ -69,12 +127,81 @@ def setup_mongodb():
             else:
                 logger.info(f"Collection {collection} already exists")
 
+        seed_dimensions(mongo_db)
+        backfill_model_keys(mongo_db)
+        create_indexes(mongo_db)
+
         return mongo_db
 
     except Exception as e:
         logger.error(f"Error setting up MongoDB: {str(e)}")
         raise
 
+def dimension_ids(mongo_db, collection):
+    """Map lower-cased names to ids for a dimension collection"""
+    id_field, name_field, _ = DIMENSIONS[collection]
+    return {
+        doc[name_field].lower(): doc[id_field]
+        for doc in mongo_db[collection].find({}, {id_field: 1, name_field: 1, "_id": 0})
+        if id_field in doc and name_field in doc
+    }
+
+def resolve_dimension(mongo_db, collection, ids, name):
+    """Return the id for name, adding a dimension document the first time it is seen"""
+    dim_id = ids.get(name.lower())
+    if dim_id is None:
+        id_field, name_field, _ = DIMENSIONS[collection]
+        dim_id = max(ids.values(), default=0) + 1
+        mongo_db[collection].insert_one({id_field: dim_id, name_field: name})
+        ids[name.lower()] = dim_id
+        logger.info(f"Added {collection} entry: {name} ({dim_id})")
+    return dim_id
+
+def load_cars(mongo_db, csv_path, batch_size=1000):
+    """Stream a ford.csv-style file into cars with unordered insert_many batches"""
+    transmissions = dimension_ids(mongo_db, "transmissions")
+    fuel_types = dimension_ids(mongo_db, "fueltype")
+
+    start = time.perf_counter()
+    inserted = 0
+    failed = 0
+
+    def flush(batch):
+        nonlocal inserted, failed
+        try:
+            inserted += len(mongo_db.cars.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details["nInserted"]
+            failed += len(e.details["writeErrors"])
+        elapsed = time.perf_counter() - start
+        logger.info(f"Loaded {inserted} cars ({inserted / elapsed:.0f} docs/sec)")
+
+    with open(csv_path, newline='') as f:
+        batch = []
+        for row in csv.DictReader(f):
+            batch.append({
+                "model": row["model"],
+                "modelkey": model_key(row["model"]),
+                "year": int(row["year"]),
+                "price": float(row["price"]),
+                "transmissionid": resolve_dimension(mongo_db, "transmissions", transmissions, row["transmission"]),
+                "mileage": float(row["mileage"]),
+                "fueltypeid": resolve_dimension(mongo_db, "fueltype", fuel_types, row["fuelType"]),
+                "tax": float(row["tax"]),
+                "mpg": float(row["mpg"]),
+                "enginesize": float(row["engineSize"])
+            })
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+    elapsed = time.perf_counter() - start
+    rate = inserted / elapsed if elapsed else float("inf")
+    logger.info(f"Loaded {inserted} cars ({failed} failed) in {elapsed:.2f}s ({rate:.0f} docs/sec)")
+    return inserted
+
 def verify_data(mongo_db):
     """Verify data in MongoDB collections"""
     try:
@@ -98,9 +225,17 @@ def verify_data(mongo_db):
         raise
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the ford-data collections and indexes")
+    parser.add_argument("--load", metavar="CSV", help="Stream a cars CSV (e.g. Data/ford.csv) into the cars collection")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Documents per insert_many call")
+    args = parser.parse_args()
+
     try:
         # Setup MongoDB connection and create collections
         mongo_db = setup_mongodb()
+
+        if args.load:
+            load_cars(mongo_db, args.load, args.batch_size)
         
         # Verify data
         verify_data(mongo_db)
@@ -0,0 +1,248 @@
+import argparse
+import logging
+import os
+import time
+
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge, start_http_server
+from pymongo import DeleteMany, MongoClient, ReplaceOne
+
+import mongo_setup
+
+# mongo_setup configures logging on import; replace it with this script's handlers
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('replicate.log'),
+        logging.StreamHandler()
+    ],
+    force=True
+)
+logger = logging.getLogger(__name__)
+
+REPLICATION_LAG = Gauge(
+    "replication_lag_seconds", "Age of the oldest CarLogs entry not yet applied to MongoDB; 0 when caught up"
+)
+REPLICATED_ENTRIES = Counter("replication_entries_total", "CarLogs entries consumed")
+REPLICATED_WRITES = Counter("replication_writes_total", "MongoDB writes issued, by kind", ["op"])
+
+# Current state of cars, with dimension names for mapping to MongoDB's own ids
+CAR_SELECT = """
+    SELECT c.CarID, c.Model, c.Year, c.Price, c.Mileage, c.Tax, c.MPG, c.EngineSize,
+           t.TransmissionType, f.FuelType
+    FROM Cars c
+    LEFT JOIN Transmissions t ON t.TransmissionID = c.TransmissionID
+    LEFT JOIN FuelTypes f ON f.FuelTypeID = c.FuelTypeID
+"""
+
+# Entries whose transaction is below the snapshot's xmin are committed (or rolled
+# back) for good: no entry can later appear before the returned ones in this order
+PENDING_ENTRIES = """
+    SELECT TxID::text, LogID, CarID FROM CarLogs
+    WHERE (TxID, LogID) > (%s::xid8, %s) AND TxID < pg_snapshot_xmin(pg_current_snapshot())
+    ORDER BY CarLogs.TxID, LogID
+    LIMIT %s
+"""
+
+
+def connect():
+    load_dotenv()
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    MONGO_URI = os.getenv("MONGO_URI")
+    if not DATABASE_URL or not MONGO_URI:
+        raise ValueError("DATABASE_URL and MONGO_URI environment variables must be set")
+    conn = psycopg2.connect(DATABASE_URL)
+    # Each batch reads its change entries and the cars they name from one snapshot
+    conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+    return conn, MongoClient(MONGO_URI)['ford-data']
+
+
+def acquire_lock(conn, consumer):
+    """Hold a session advisory lock so only one worker applies a consumer's changes"""
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(hashtext('replicate:' || %s))", (consumer,))
+            if not cur.fetchone()[0]:
+                raise RuntimeError(f"Another replicate.py worker is running for consumer '{consumer}'")
+
+
+def load_checkpoint(cur, consumer):
+    """Last applied (TxID, LogID), or the start of the log"""
+    cur.execute("SELECT LastTxID::text, LastLogID FROM ReplicationCheckpoints WHERE Consumer = %s", (consumer,))
+    return cur.fetchone() or ("0", 0)
+
+
+def save_checkpoint(cur, consumer, txid, logid):
+    cur.execute(
+        "INSERT INTO ReplicationCheckpoints (Consumer, LastTxID, LastLogID) VALUES (%s, %s::xid8, %s) "
+        "ON CONFLICT (Consumer) DO UPDATE SET LastTxID = EXCLUDED.LastTxID, "
+        "LastLogID = EXCLUDED.LastLogID, UpdatedAt = NOW()",
+        (consumer, txid, logid)
+    )
+
+
+def load_dimensions(mongo_db):
+    return {collection: mongo_setup.dimension_ids(mongo_db, collection) for collection in mongo_setup.DIMENSIONS}
+
+
+def car_document(mongo_db, dimensions, row):
+    """A cars document for a Cars row, in the field types mongo_setup.load_cars writes.
+
+    Transmission and fuel types are matched by name to MongoDB's ids, adding any
+    the collection does not have yet; the two databases number them independently.
+    """
+    carid, model, year, price, mileage, tax, mpg, enginesize, transmission, fuel_type = row
+
+    def dimension(collection, name):
+        if name is None:
+            return None
+        return mongo_setup.resolve_dimension(mongo_db, collection, dimensions[collection], name)
+
+    return {
+        "carid": carid,
+        "model": model,
+        "modelkey": mongo_setup.model_key(model),
+        "year": year,
+        "price": float(price) if price is not None else None,
+        "transmissionid": dimension("transmissions", transmission),
+        "mileage": float(mileage) if mileage is not None else None,
+        "fueltypeid": dimension("fueltype", fuel_type),
+        "tax": float(tax) if tax is not None else None,
+        "mpg": mpg,
+        "enginesize": enginesize
+    }
+
+
+def apply(mongo_db, carids, documents):
+    """Write the current state of each car in one unordered bulk_write.
+
+    Cars still in Postgres are replaced (or inserted) whole and the rest deleted,
+    so applying the same change twice, or out of order, leaves the same result.
+    """
+    ops = [
+        ReplaceOne({"carid": carid}, documents[carid], upsert=True) if carid in documents
+        else DeleteMany({"carid": carid})
+        for carid in carids
+    ]
+    if not ops:
+        return
+    mongo_db.cars.bulk_write(ops, ordered=False)
+    REPLICATED_WRITES.labels("replace").inc(len(documents))
+    REPLICATED_WRITES.labels("delete").inc(len(ops) - len(documents))
+
+
+def update_lag(cur, txid, logid):
+    cur.execute(
+        "SELECT EXTRACT(EPOCH FROM LOCALTIMESTAMP - LogDate) FROM CarLogs "
+        "WHERE (TxID, LogID) > (%s::xid8, %s) ORDER BY TxID, LogID LIMIT 1",
+        (txid, logid)
+    )
+    row = cur.fetchone()
+    lag = max(float(row[0]), 0.0) if row else 0.0
+    REPLICATION_LAG.set(lag)
+    return lag
+
+
+def replicate_batch(conn, mongo_db, dimensions, consumer, batch_size):
+    """Apply up to batch_size CarLogs entries past the checkpoint; returns how many were consumed.
+
+    MongoDB is written before the checkpoint commits, so a crash in between
+    replays the batch, which apply() makes harmless.
+    """
+    with conn:
+        with conn.cursor() as cur:
+            txid, logid = load_checkpoint(cur, consumer)
+            cur.execute(PENDING_ENTRIES, (txid, logid, batch_size))
+            entries = cur.fetchall()
+            if entries:
+                # Several entries for one car collapse into a single write of its latest state
+                carids = sorted({carid for _, _, carid in entries if carid is not None})
+                documents = {}
+                if carids:
+                    cur.execute(CAR_SELECT + " WHERE c.CarID = ANY(%s)", (carids,))
+                    documents = {row[0]: car_document(mongo_db, dimensions, row) for row in cur.fetchall()}
+                apply(mongo_db, carids, documents)
+                txid, logid, _ = entries[-1]
+                save_checkpoint(cur, consumer, txid, logid)
+                REPLICATED_ENTRIES.inc(len(entries))
+            lag = update_lag(cur, txid, logid)
+    if entries:
+        logger.info(f"Applied {len(entries)} changes to {len(carids)} cars; lag {lag:.1f}s")
+    return len(entries)
+
+
+def snapshot(conn, mongo_db, dimensions, consumer, batch_size):
+    """Copy every car to MongoDB, remove replicated cars Postgres no longer has, and
+    start the checkpoint at the copy's snapshot.
+
+    Changes committed while the copy ran are applied again by the next batches.
+    """
+    start = time.perf_counter()
+    copied = 0
+    seen = set()
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text")
+            xmin = cur.fetchone()[0]
+        with conn.cursor(name="replicate_snapshot") as cur:
+            cur.itersize = batch_size
+            cur.execute(CAR_SELECT + " ORDER BY c.CarID")
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                documents = {row[0]: car_document(mongo_db, dimensions, row) for row in rows}
+                apply(mongo_db, list(documents), documents)
+                seen.update(documents)
+                copied += len(rows)
+                logger.info(f"Copied {copied} cars ({copied / (time.perf_counter() - start):.0f} docs/sec)")
+
+        stale = [
+            doc["carid"] for doc in mongo_db.cars.find({"carid": {"$exists": True}}, {"carid": 1, "_id": 0})
+            if doc["carid"] not in seen
+        ]
+        if stale:
+            mongo_db.cars.delete_many({"carid": {"$in": stale}})
+        with conn.cursor() as cur:
+            save_checkpoint(cur, consumer, xmin, 0)
+    logger.info(f"Snapshot copied {copied} cars and removed {len(stale)} in {time.perf_counter() - start:.2f}s")
+
+
+def run(conn, mongo_db, consumer, batch_size, poll_interval, once=False):
+    dimensions = load_dimensions(mongo_db)
+    while True:
+        consumed = replicate_batch(conn, mongo_db, dimensions, consumer, batch_size)
+        if consumed < batch_size:
+            if once:
+                return
+            time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replicate Postgres car changes from CarLogs into MongoDB")
+    parser.add_argument("--snapshot", action="store_true", help="Copy every car first, then follow CarLogs from there")
+    parser.add_argument("--once", action="store_true", help="Exit once caught up instead of polling")
+    parser.add_argument("--consumer", default="mongo", help="Checkpoint name; one worker per name")
+    parser.add_argument("--batch-size", type=int, default=1000, help="CarLogs entries per bulk_write")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when caught up")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+    args = parser.parse_args()
+
+    try:
+        conn, mongo_db = connect()
+        try:
+            acquire_lock(conn, args.consumer)
+            mongo_setup.create_indexes(mongo_db)
+            if args.metrics_port:
+                start_http_server(args.metrics_port)
+            if args.snapshot:
+                snapshot(conn, mongo_db, load_dimensions(mongo_db), args.consumer, args.batch_size)
+            run(conn, mongo_db, args.consumer, args.batch_size, args.poll_interval, args.once)
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"Replication failed: {str(e)}")
+        raise
@@ -22,19 +22,158 @@ CREATE TABLE IF NOT EXISTS Cars (
     Tax INT,
     MPG FLOAT,
     EngineSize FLOAT,
+    ModelKey VARCHAR(255) GENERATED ALWAYS AS (lower(btrim(Model))) STORED,
     FOREIGN KEY (TransmissionID) REFERENCES Transmissions(TransmissionID),
     FOREIGN KEY (FuelTypeID) REFERENCES FuelTypes(FuelTypeID)
 );
 
--- Create the CarLogs table (must be created before the trigger)
+-- Model names come with stray spaces and mixed case (' Fiesta', 'FIESTA');
+-- ModelKey is the trimmed, lower-cased name, kept by Postgres on every write.
+-- Model filters and the API's GET /models/search match on it.
+ALTER TABLE Cars ADD COLUMN IF NOT EXISTS ModelKey VARCHAR(255) GENERATED ALWAYS AS (lower(btrim(Model))) STORED;
+
+-- Move an unpartitioned CarLogs from an earlier setup aside; its rows are
+-- copied into the partitioned table below
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'carlogs' AND relkind = 'r') THEN
+        ALTER TABLE CarLogs RENAME TO CarLogs_legacy;
+        ALTER INDEX IF EXISTS carlogs_pkey RENAME TO carlogs_legacy_pkey;
+        ALTER SEQUENCE IF EXISTS carlogs_logid_seq RENAME TO carlogs_legacy_logid_seq;
+    END IF;
+END;
+$$;
+
+-- Create the CarLogs table (must be created before the trigger).
+-- Partitioned by month on LogDate so old months can be dropped whole. There is
+-- no foreign key to Cars: 'Deleted' entries must outlive the car they describe.
+-- TxID is the writing transaction, so readers can tell which entries are
+-- committed for good (see replicate.py).
 CREATE TABLE IF NOT EXISTS CarLogs (
-    LogID SERIAL PRIMARY KEY,
+    LogID BIGSERIAL,
     CarID INT,
-    LogDate TIMESTAMP DEFAULT NOW(),
+    LogDate TIMESTAMP NOT NULL DEFAULT NOW(),
     LogAction VARCHAR(50),
-    FOREIGN KEY (CarID) REFERENCES Cars(CarID)
+    TxID xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    PRIMARY KEY (LogID, LogDate)
+) PARTITION BY RANGE (LogDate);
+
+ALTER TABLE CarLogs ADD COLUMN IF NOT EXISTS TxID xid8 NOT NULL DEFAULT pg_current_xact_id();
+
+-- Catches rows outside the monthly partitions, e.g. if maintenance lapses
+CREATE TABLE IF NOT EXISTS CarLogs_default PARTITION OF CarLogs DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_carlogs_carid ON CarLogs (CarID, LogDate);
+-- Change-feed order for replicate.py
+CREATE INDEX IF NOT EXISTS idx_carlogs_txid_logid ON CarLogs (TxID, LogID);
+
+-- Position of each CarLogs consumer: the last (TxID, LogID) it applied
+CREATE TABLE IF NOT EXISTS ReplicationCheckpoints (
+    Consumer VARCHAR(100) PRIMARY KEY,
+    LastTxID xid8 NOT NULL,
+    LastLogID BIGINT NOT NULL,
+    UpdatedAt TIMESTAMP NOT NULL DEFAULT NOW()
 );
 
+-- Create the monthly CarLogs partitions from this month to p_MonthsAhead months ahead.
+-- Rows of a new month that already landed in the default partition (because
+-- maintenance lapsed) are moved into it: Postgres refuses to create a partition
+-- whose rows the default holds, so the default is detached meanwhile.
+CREATE OR REPLACE FUNCTION CreateCarLogPartitions(p_MonthsAhead INT DEFAULT 3) RETURNS VOID AS $$
+DECLARE
+    v_From DATE;
+    v_To DATE;
+    v_Partition TEXT;
+BEGIN
+    FOR i IN 0..p_MonthsAhead LOOP
+        v_From := (date_trunc('month', NOW()) + make_interval(months => i))::DATE;
+        v_To := (v_From + INTERVAL '1 month')::DATE;
+        v_Partition := 'carlogs_' || to_char(v_From, 'YYYY_MM');
+        CONTINUE WHEN to_regclass(v_Partition) IS NOT NULL;
+        IF EXISTS (SELECT 1 FROM CarLogs_default WHERE LogDate >= v_From AND LogDate < v_To) THEN
+            ALTER TABLE CarLogs DETACH PARTITION CarLogs_default;
+            EXECUTE format('CREATE TABLE %I PARTITION OF CarLogs FOR VALUES FROM (%L) TO (%L)', v_Partition, v_From, v_To);
+            EXECUTE format(
+                'INSERT INTO %I (LogID, CarID, LogDate, LogAction, TxID)
+                 SELECT LogID, CarID, LogDate, LogAction, TxID FROM CarLogs_default WHERE LogDate >= %L AND LogDate < %L',
+                v_Partition, v_From, v_To
+            );
+            DELETE FROM CarLogs_default WHERE LogDate >= v_From AND LogDate < v_To;
+            ALTER TABLE CarLogs ATTACH PARTITION CarLogs_default DEFAULT;
+        ELSE
+            EXECUTE format('CREATE TABLE %I PARTITION OF CarLogs FOR VALUES FROM (%L) TO (%L)', v_Partition, v_From, v_To);
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Retention: drop the monthly partitions older than p_RetentionMonths and trim
+-- the default partition to the same cutoff. Returns the number of partitions dropped.
+CREATE OR REPLACE FUNCTION DropOldCarLogPartitions(p_RetentionMonths INT DEFAULT 12) RETURNS INT AS $$
+DECLARE
+    v_Cutoff DATE := (date_trunc('month', NOW()) - make_interval(months => p_RetentionMonths))::DATE;
+    v_Partition TEXT;
+    v_Dropped INT := 0;
+BEGIN
+    FOR v_Partition IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'carlogs'::regclass
+          AND c.relname ~ '^carlogs_[0-9]{4}_[0-9]{2}$'
+          AND to_date(substring(c.relname FROM 9), 'YYYY_MM') < v_Cutoff
+    LOOP
+        EXECUTE format('DROP TABLE %I', v_Partition);
+        v_Dropped := v_Dropped + 1;
+    END LOOP;
+    DELETE FROM CarLogs_default WHERE LogDate < v_Cutoff;
+    RETURN v_Dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Run periodically (e.g. daily from pg_cron or cron + psql): keeps partitions
+-- ready ahead of time and applies the retention policy
+CREATE OR REPLACE FUNCTION MaintainCarLogs(p_RetentionMonths INT DEFAULT 12, p_MonthsAhead INT DEFAULT 3) RETURNS INT AS $$
+BEGIN
+    PERFORM CreateCarLogPartitions(p_MonthsAhead);
+    RETURN DropOldCarLogPartitions(p_RetentionMonths);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT CreateCarLogPartitions();
+
+DO $$
+BEGIN
+    IF to_regclass('carlogs_legacy') IS NOT NULL THEN
+        INSERT INTO CarLogs (CarID, LogDate, LogAction)
+        SELECT CarID, COALESCE(LogDate, NOW()), LogAction FROM CarLogs_legacy ORDER BY LogID;
+        DROP TABLE CarLogs_legacy;
+    END IF;
+END;
+$$;
+
+-- Indexes for filtered search on the API's GET /cars/.
+-- Equality columns lead, then the range column; the (column, CarID) indexes
+-- also serve sorting by that column and keyset paging past (value, CarID).
+DROP INDEX IF EXISTS idx_cars_model_year_price;
+CREATE INDEX IF NOT EXISTS idx_cars_modelkey_year_price ON Cars (ModelKey, Year, Price);
+CREATE INDEX IF NOT EXISTS idx_cars_fuel_transmission_year ON Cars (FuelTypeID, TransmissionID, Year);
+CREATE INDEX IF NOT EXISTS idx_cars_year_carid ON Cars (Year, CarID);
+CREATE INDEX IF NOT EXISTS idx_cars_price_carid ON Cars (Price, CarID);
+CREATE INDEX IF NOT EXISTS idx_cars_mileage_carid ON Cars (Mileage, CarID);
+
+-- Trigram index for fuzzy and substring model search (similarity, %, LIKE '%...%').
+-- pg_trgm ships with PostgreSQL's contrib package; without it the index is skipped
+-- and the API's model search falls back to LIKE matches.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_cars_modelkey_trgm ON Cars USING GIN (ModelKey gin_trgm_ops);
+    END IF;
+END;
+$$;
+
 -- Function to add a new car
 CREATE OR REPLACE FUNCTION AddNewCar(
     p_Model VARCHAR(255),
@@ -69,32 +208,137 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
--- Trigger function to log new car additions
-CREATE OR REPLACE FUNCTION LogNewCar() RETURNS TRIGGER AS $$
+-- Trigger function logging inserts, updates and deletes on Cars. It runs once
+-- per statement and reads the affected rows from the transition tables, so a
+-- bulk insert or COPY writes its log entries in a single INSERT ... SELECT.
+CREATE OR REPLACE FUNCTION LogCarChanges() RETURNS TRIGGER AS $$
 BEGIN
-    INSERT INTO CarLogs (CarID, LogDate, LogAction)
-    VALUES (NEW.CarID, NOW(), 'Added');
-    RETURN NEW;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO CarLogs (CarID, LogDate, LogAction)
+        SELECT CarID, NOW(), 'Added' FROM new_cars;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- Only rows whose values actually changed
+        INSERT INTO CarLogs (CarID, LogDate, LogAction)
+        SELECT n.CarID, NOW(), 'Updated'
+        FROM new_cars n
+        JOIN old_cars o ON o.CarID = n.CarID
+        WHERE n IS DISTINCT FROM o;
+    ELSE
+        INSERT INTO CarLogs (CarID, LogDate, LogAction)
+        SELECT CarID, NOW(), 'Deleted' FROM old_cars;
+    END IF;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Create trigger
+-- Create triggers (transition tables allow one event per trigger), replacing
+-- the per-row CarAdded trigger of earlier setups
+DROP TRIGGER IF EXISTS CarAdded ON Cars;
+DROP TRIGGER IF EXISTS CarUpdated ON Cars;
+DROP TRIGGER IF EXISTS CarDeleted ON Cars;
+DROP FUNCTION IF EXISTS LogNewCar();
+
 CREATE TRIGGER CarAdded
 AFTER INSERT ON Cars
-FOR EACH ROW
-EXECUTE FUNCTION LogNewCar();
+REFERENCING NEW TABLE AS new_cars
+FOR EACH STATEMENT
+EXECUTE FUNCTION LogCarChanges();
+
+CREATE TRIGGER CarUpdated
+AFTER UPDATE ON Cars
+REFERENCING OLD TABLE AS old_cars NEW TABLE AS new_cars
+FOR EACH STATEMENT
+EXECUTE FUNCTION LogCarChanges();
+
+CREATE TRIGGER CarDeleted
+AFTER DELETE ON Cars
+REFERENCING OLD TABLE AS old_cars
+FOR EACH STATEMENT
+EXECUTE FUNCTION LogCarChanges();
+
+-- Price model inputs of each car, encoded and scaled when the car is written
+-- through the API or by POST /features/backfill. Features holds float32 values;
+-- FeatureVersion identifies the scaler and label encoders that produced them.
+CREATE TABLE IF NOT EXISTS CarFeatures (
+    CarID INT PRIMARY KEY REFERENCES Cars(CarID) ON DELETE CASCADE,
+    FeatureVersion VARCHAR(16) NOT NULL,
+    Features BYTEA NOT NULL,
+    UpdatedAt TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Drop the vectors of cars whose model inputs changed, whoever changed them,
+-- so that a stored vector never describes an older version of its car
+CREATE OR REPLACE FUNCTION DropStaleCarFeatures() RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM CarFeatures f
+    USING new_cars n
+    JOIN old_cars o ON o.CarID = n.CarID
+    WHERE f.CarID = n.CarID
+      AND (n.Model, n.Year, n.TransmissionID, n.Mileage, n.FuelTypeID, n.Tax, n.MPG, n.EngineSize)
+          IS DISTINCT FROM (o.Model, o.Year, o.TransmissionID, o.Mileage, o.FuelTypeID, o.Tax, o.MPG, o.EngineSize);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS CarFeaturesStale ON Cars;
+
+CREATE TRIGGER CarFeaturesStale
+AFTER UPDATE ON Cars
+REFERENCING OLD TABLE AS old_cars NEW TABLE AS new_cars
+FOR EACH STATEMENT
+EXECUTE FUNCTION DropStaleCarFeatures();
+
+-- Price statistics per model, year, fuel type and transmission for the API's
+-- /stats endpoints. One row per (Dimension, Value); the unique index lets
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY run without blocking readers.
+-- Models are grouped on ModelKey and shown in their most common spelling.
+
+-- Rebuild a view from an earlier setup that grouped on the raw Model
+DO $$
+BEGIN
+    IF pg_get_viewdef(to_regclass('carpricestats')) NOT ILIKE '%modelkey%' THEN
+        DROP MATERIALIZED VIEW CarPriceStats;
+    END IF;
+END;
+$$;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS CarPriceStats AS
+SELECT
+    CASE
+        WHEN GROUPING(c.ModelKey) = 0 THEN 'model'
+        WHEN GROUPING(c.Year) = 0 THEN 'year'
+        WHEN GROUPING(f.FuelType) = 0 THEN 'fueltype'
+        ELSE 'transmission'
+    END AS Dimension,
+    CASE
+        WHEN GROUPING(c.ModelKey) = 0 THEN COALESCE(mode() WITHIN GROUP (ORDER BY btrim(c.Model)), 'Unknown')
+        ELSE COALESCE(c.Year::TEXT, f.FuelType, t.TransmissionType, 'Unknown')
+    END AS Value,
+    COUNT(*) AS CarCount,
+    ROUND(AVG(c.Price), 2) AS AvgPrice,
+    PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY c.Price) AS MedianPrice,
+    MIN(c.Price) AS MinPrice,
+    MAX(c.Price) AS MaxPrice
+FROM Cars c
+LEFT JOIN FuelTypes f ON f.FuelTypeID = c.FuelTypeID
+LEFT JOIN Transmissions t ON t.TransmissionID = c.TransmissionID
+GROUP BY GROUPING SETS ((c.ModelKey), (c.Year), (f.FuelType), (t.TransmissionType));
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_carpricestats_dimension_value ON CarPriceStats (Dimension, Value);
 
 -- Insert sample data
 INSERT INTO Transmissions (TransmissionType) VALUES 
 ('Automatic'),
 ('Manual'),
-('Semi-Automatic');
+('Semi-Automatic')
+ON CONFLICT (TransmissionType) DO NOTHING;
 
 INSERT INTO FuelTypes (FuelType) VALUES 
 ('Petrol'),
 ('Diesel'),
 ('Electric'),
-('Hybrid');
+('Hybrid')
+ON CONFLICT (FuelType) DO NOTHING;
 
 -- Insert a sample car using the AddNewCar function
 SELECT AddNewCar(
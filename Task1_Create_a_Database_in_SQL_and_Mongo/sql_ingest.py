@@ -0,0 +1,156 @@
+import argparse
+import csv
+import io
+import logging
+import os
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('sql_ingest.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "ford.csv")
+
+# Column order of the COPY target, matching the rows built by csv_rows()
+CAR_COLUMNS = "Model, Year, Price, TransmissionID, Mileage, FuelTypeID, Tax, MPG, EngineSize"
+
+
+def connect():
+    load_dotenv()
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if not DATABASE_URL:
+        raise ValueError("DATABASE_URL environment variable is not set")
+    return psycopg2.connect(DATABASE_URL)
+
+
+def load_dimension(cur, table, id_col, name_col):
+    """Read a dimension table into a {name: id} map"""
+    cur.execute(f"SELECT {name_col}, {id_col} FROM {table}")
+    return dict(cur.fetchall())
+
+
+def resolve_dimension(cur, mapping, table, id_col, name_col, name):
+    """Return the id for name, inserting the dimension row the first time it is seen"""
+    dim_id = mapping.get(name)
+    if dim_id is None:
+        cur.execute(
+            f"INSERT INTO {table} ({name_col}) VALUES (%s) "
+            f"ON CONFLICT ({name_col}) DO UPDATE SET {name_col} = EXCLUDED.{name_col} "
+            f"RETURNING {id_col}",
+            (name,)
+        )
+        dim_id = cur.fetchone()[0]
+        mapping[name] = dim_id
+        logger.info(f"Added {table} entry: {name} ({dim_id})")
+    return dim_id
+
+
+def read_chunks(csv_path, chunk_size):
+    """Stream the CSV as lists of at most chunk_size row dicts"""
+    with open(csv_path, newline='') as f:
+        chunk = []
+        for row in csv.DictReader(f):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def csv_rows(cur, chunk, transmissions, fuel_types):
+    """Build an in-memory CSV buffer of Cars rows for COPY"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in chunk:
+        writer.writerow([
+            row["model"],
+            row["year"],
+            row["price"],
+            resolve_dimension(cur, transmissions, "Transmissions", "TransmissionID", "TransmissionType", row["transmission"]),
+            row["mileage"],
+            resolve_dimension(cur, fuel_types, "FuelTypes", "FuelTypeID", "FuelType", row["fuelType"]),
+            row["tax"],
+            row["mpg"],
+            row["engineSize"]
+        ])
+    buffer.seek(0)
+    return buffer
+
+
+def ingest(conn, csv_path, chunk_size=5000):
+    """Bulk-load the CSV into Cars with COPY, one chunk at a time, in a single transaction.
+
+    The statement-level CarAdded trigger writes the CarLogs entries for each COPY
+    in one INSERT ... SELECT, so the trigger stays enabled during the load.
+    """
+    start = time.perf_counter()
+    total = 0
+    with conn:
+        with conn.cursor() as cur:
+            transmissions = load_dimension(cur, "Transmissions", "TransmissionID", "TransmissionType")
+            fuel_types = load_dimension(cur, "FuelTypes", "FuelTypeID", "FuelType")
+
+            for chunk in read_chunks(csv_path, chunk_size):
+                buffer = csv_rows(cur, chunk, transmissions, fuel_types)
+                cur.copy_expert(f"COPY Cars ({CAR_COLUMNS}) FROM STDIN WITH (FORMAT csv)", buffer)
+                total += len(chunk)
+                elapsed = time.perf_counter() - start
+                logger.info(f"Loaded {total} cars ({total / elapsed:.0f} rows/sec)")
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed else float("inf")
+    logger.info(f"Ingested {total} cars in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+    return rate
+
+
+def baseline(conn, csv_path, rows):
+    """Time the row-by-row AddNewCar path on the first rows of the CSV and roll it back"""
+    chunk = next(read_chunks(csv_path, rows), [])
+    start = time.perf_counter()
+    try:
+        with conn.cursor() as cur:
+            for row in chunk:
+                cur.execute(
+                    "SELECT AddNewCar(%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    (row["model"], row["year"], row["price"], row["transmission"], row["mileage"],
+                     row["fuelType"], row["tax"], row["mpg"], row["engineSize"])
+                )
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.rollback()
+    rate = len(chunk) / elapsed if elapsed else float("inf")
+    logger.info(f"AddNewCar baseline: {len(chunk)} cars in {elapsed:.2f}s ({rate:.0f} rows/sec)")
+    return rate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load ford.csv into the Postgres Cars table")
+    parser.add_argument("csv_path", nargs="?", default=DEFAULT_CSV, help="Path to the cars CSV")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per COPY batch")
+    parser.add_argument("--baseline", type=int, default=0, metavar="N",
+                        help="Also time N rows through AddNewCar (rolled back) and report the speedup")
+    args = parser.parse_args()
+
+    try:
+        conn = connect()
+        try:
+            baseline_rate = baseline(conn, args.csv_path, args.baseline) if args.baseline else None
+            rate = ingest(conn, args.csv_path, args.chunk_size)
+            if baseline_rate:
+                logger.info(f"Speedup over AddNewCar: {rate / baseline_rate:.1f}x")
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"Failed to ingest cars: {str(e)}")
+        raise
@@ -0,0 +1,422 @@
+from sqlalchemy import delete, false, text, tuple_, update
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import time
+import models
+import schemas
+import dimensions
+from model_names import model_key, similarity, trigrams
+
+COUNT_TTL_SECONDS = 60
+_car_count = {"value": None, "expires": 0.0}
+
+# Columns GET /cars/ can sort by; each has a (column, carid) index for keyset paging
+SORT_COLUMNS = ("carid", "year", "price", "mileage")
+# JSON types a cursor may hold for the sort column it seeks past
+SORT_KEY_TYPES = {"year": int, "price": (int, float), "mileage": int}
+
+# Postgres array types for the unnest() parameters of UPDATE_CARS
+COLUMN_ARRAY_TYPES = {
+    "carid": "int[]",
+    "model": "varchar[]",
+    "year": "int[]",
+    "price": "numeric[]",
+    "transmissionid": "int[]",
+    "mileage": "int[]",
+    "fueltypeid": "int[]",
+    "tax": "int[]",
+    "mpg": "float8[]",
+    "enginesize": "float8[]"
+}
+
+CAR_COLUMNS = "carid, model, year, price, transmissionid, mileage, fueltypeid, tax, mpg, enginesize"
+
+# Resolves (or creates) every transmission and fuel type named in the batch and
+# inserts all cars in a single statement. Dimension names already present are read
+# from the table; only unseen ones go through the upsert, whose DO UPDATE makes a
+# row inserted concurrently by another client come back in RETURNING as well.
+INSERT_CARS = text(f"""
+    WITH input AS (
+        SELECT * FROM unnest(
+            CAST(:model AS varchar[]), CAST(:year AS int[]), CAST(:price AS numeric[]),
+            CAST(:transmissiontype AS varchar[]), CAST(:mileage AS int[]), CAST(:fueltype AS varchar[]),
+            CAST(:tax AS int[]), CAST(:mpg AS float8[]), CAST(:enginesize AS float8[])
+        ) WITH ORDINALITY AS t(model, year, price, transmissiontype, mileage, fueltype, tax, mpg, enginesize, ord)
+    ),
+    existing_transmissions AS (
+        SELECT transmissionid, transmissiontype FROM transmissions
+        WHERE transmissiontype IN (SELECT transmissiontype FROM input)
+    ),
+    new_transmissions AS (
+        INSERT INTO transmissions (transmissiontype)
+        SELECT DISTINCT transmissiontype FROM input
+        WHERE transmissiontype NOT IN (SELECT transmissiontype FROM existing_transmissions)
+        ON CONFLICT (transmissiontype) DO UPDATE SET transmissiontype = EXCLUDED.transmissiontype
+        RETURNING transmissionid, transmissiontype
+    ),
+    existing_fueltypes AS (
+        SELECT fueltypeid, fueltype FROM fueltypes
+        WHERE fueltype IN (SELECT fueltype FROM input)
+    ),
+    new_fueltypes AS (
+        INSERT INTO fueltypes (fueltype)
+        SELECT DISTINCT fueltype FROM input
+        WHERE fueltype NOT IN (SELECT fueltype FROM existing_fueltypes)
+        ON CONFLICT (fueltype) DO UPDATE SET fueltype = EXCLUDED.fueltype
+        RETURNING fueltypeid, fueltype
+    ),
+    transmission_ids AS (
+        SELECT * FROM existing_transmissions UNION ALL SELECT * FROM new_transmissions
+    ),
+    fueltype_ids AS (
+        SELECT * FROM existing_fueltypes UNION ALL SELECT * FROM new_fueltypes
+    )
+    INSERT INTO cars (model, year, price, transmissionid, mileage, fueltypeid, tax, mpg, enginesize)
+    SELECT i.model, i.year, i.price, t.transmissionid, i.mileage, f.fueltypeid, i.tax, i.mpg, i.enginesize
+    FROM input i
+    JOIN transmission_ids t ON t.transmissiontype = i.transmissiontype
+    JOIN fueltype_ids f ON f.fueltype = i.fueltype
+    ORDER BY i.ord
+    RETURNING {CAR_COLUMNS}
+""")
+
+
+def create_cars(db: Session, cars: List[schemas.CarCreate]) -> List[dict]:
+    """Insert cars in one round trip and return the created rows in input order"""
+    if not cars:
+        return []
+    fields = list(schemas.CarCreate.model_fields)
+    params = {field: [getattr(car, field) for car in cars] for field in fields}
+    # Match dimension names case-insensitively against the cache so that only
+    # genuinely new types reach the upsert in INSERT_CARS
+    params["transmissiontype"] = [dimensions.transmissions.canonical(db, name) for name in params["transmissiontype"]]
+    params["fueltype"] = [dimensions.fueltypes.canonical(db, name) for name in params["fueltype"]]
+    rows = db.execute(INSERT_CARS, params).mappings().all()
+    db.commit()
+    dimensions.transmissions.invalidate_unless_known(row["transmissionid"] for row in rows)
+    dimensions.fueltypes.invalidate_unless_known(row["fueltypeid"] for row in rows)
+    # Serial ids are handed out in input order, so sorting by carid restores it
+    return sorted((dict(row) for row in rows), key=lambda row: row["carid"])
+
+
+def car_conditions(db: Session, filters: schemas.CarFilter) -> list:
+    """WHERE clauses for the filters that were set.
+
+    Transmission and fuel type names are resolved to ids through the dimension
+    caches, so the search stays a single-table query on the composite indexes.
+    """
+    conditions = []
+    if filters.model is not None:
+        conditions.append(models.Car.modelkey == model_key(filters.model))
+    if filters.min_year is not None:
+        conditions.append(models.Car.year >= filters.min_year)
+    if filters.max_year is not None:
+        conditions.append(models.Car.year <= filters.max_year)
+    if filters.min_price is not None:
+        conditions.append(models.Car.price >= filters.min_price)
+    if filters.max_price is not None:
+        conditions.append(models.Car.price <= filters.max_price)
+    if filters.min_mileage is not None:
+        conditions.append(models.Car.mileage >= filters.min_mileage)
+    if filters.max_mileage is not None:
+        conditions.append(models.Car.mileage <= filters.max_mileage)
+    for name, cache, column in (
+        (filters.transmissiontype, dimensions.transmissions, models.Car.transmissionid),
+        (filters.fueltype, dimensions.fueltypes, models.Car.fueltypeid)
+    ):
+        if name is None:
+            continue
+        dim_id = cache.get_id(db, name)
+        # An unknown type matches nothing
+        conditions.append(false() if dim_id is None else column == dim_id)
+    return conditions
+
+
+def list_cars(
+    db: Session,
+    filters: Optional[schemas.CarFilter] = None,
+    sort: str = "carid",
+    after: Optional[int] = None,
+    key=None,
+    skip: int = 0,
+    limit: int = 100,
+    columns: Optional[list] = None
+) -> list:
+    """Page through matching cars in `sort` order ("-" prefix for descending).
+
+    Pages seek past (`key`, `after`) when given, else offset by `skip`. Ties on the
+    sort column are broken by carid, so every row has a unique position to seek from.
+    Cars with no value in the sort column come last in either direction; a `key` of
+    None seeks among them. Returns Car objects, or plain row tuples of just `columns`
+    when given.
+    """
+    descending = sort.startswith("-")
+    column = getattr(models.Car, sort.lstrip("-"))
+    query = db.query(*columns) if columns else db.query(models.Car)
+    if filters is not None:
+        query = query.filter(*car_conditions(db, filters))
+
+    def ordered(query, *order):
+        return query.order_by(*[part.desc() if descending else part for part in order])
+
+    if column is models.Car.carid:
+        query = ordered(query, column)
+        if after is not None:
+            return query.filter(column < after if descending else column > after).limit(limit).all()
+        return query.offset(skip).limit(limit).all()
+
+    if after is None and skip:
+        order = [column.desc(), models.Car.carid.desc()] if descending else [column.asc(), models.Car.carid]
+        return query.order_by(order[0].nulls_last(), order[1]).offset(skip).limit(limit).all()
+
+    # Cars with a value, then those without, each read in the order of the
+    # (column, carid) index. NULLs never compare greater or less than a key, so
+    # a single seek past (key, after) would stop at them.
+    cars = []
+    if after is None or key is not None:
+        valued = query.filter(column.isnot(None))
+        if after is not None:
+            position, boundary = tuple_(column, models.Car.carid), tuple_(key, after)
+            valued = valued.filter(position < boundary if descending else position > boundary)
+        cars = ordered(valued, column, models.Car.carid).limit(limit).all()
+    if len(cars) < limit:
+        empty = query.filter(column.is_(None))
+        if after is not None and key is None:
+            empty = empty.filter(models.Car.carid < after if descending else models.Car.carid > after)
+        cars += ordered(empty, models.Car.carid).limit(limit - len(cars)).all()
+    return cars
+
+
+def estimated_car_count(db: Session) -> int:
+    """Planner row estimate for cars, cached for COUNT_TTL_SECONDS"""
+    now = time.monotonic()
+    if _car_count["value"] is None or now >= _car_count["expires"]:
+        estimate = db.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'cars'::regclass")).scalar()
+        if estimate is None or estimate < 0:
+            # The table has never been vacuumed or analyzed, so there is no estimate yet
+            estimate = db.query(models.Car).count()
+        _car_count.update(value=estimate, expires=now + COUNT_TTL_SECONDS)
+    return _car_count["value"]
+
+
+def get_car(db: Session, car_id: int) -> Optional[models.Car]:
+    return db.query(models.Car).filter(models.Car.carid == car_id).first()
+
+
+def comparable_cars(db: Session, car_ids: Optional[List[int]] = None) -> List[dict]:
+    """Cars as the comparables index keeps them: all of them, or the given ones"""
+    query = db.query(models.Car)
+    if car_ids is not None:
+        query = query.filter(models.Car.carid.in_(car_ids))
+    return [schemas.Car.model_validate(car).model_dump() for car in query.order_by(models.Car.carid)]
+
+
+# Distinct models containing q or similar to it by trigrams, served by the
+# idx_cars_modelkey_trgm GIN index. Models starting with q rank first.
+SEARCH_MODELS = text("""
+    SELECT mode() WITHIN GROUP (ORDER BY btrim(model)) AS model, count(*) AS cars,
+           similarity(modelkey, :q) AS similarity
+    FROM cars
+    WHERE modelkey % :q OR modelkey LIKE :pattern
+    GROUP BY modelkey
+    ORDER BY modelkey LIKE :prefix DESC, similarity(modelkey, :q) DESC, modelkey
+    LIMIT :limit
+""")
+
+# The same search on servers without pg_trgm: substring matches only, models
+# starting with q first, then alphabetical
+SEARCH_MODELS_LIKE = text("""
+    SELECT modelkey, mode() WITHIN GROUP (ORDER BY btrim(model)) AS model, count(*) AS cars
+    FROM cars
+    WHERE modelkey LIKE :pattern
+    GROUP BY modelkey
+    ORDER BY modelkey LIKE :prefix DESC, modelkey
+    LIMIT :limit
+""")
+
+_has_pg_trgm: Optional[bool] = None
+
+
+def has_pg_trgm(db: Session) -> bool:
+    """Whether pg_trgm is installed; setup.sql skips it on servers that don't ship it"""
+    global _has_pg_trgm
+    if _has_pg_trgm is None:
+        _has_pg_trgm = db.execute(text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")).scalar()
+    return _has_pg_trgm
+
+
+def like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_models(db: Session, q: str, limit: int) -> List[dict]:
+    """Models matching q, fuzzily where pg_trgm is installed, with the number of cars of each"""
+    key = model_key(q)
+    params = {"q": key, "pattern": f"%{like_escape(key)}%", "prefix": f"{like_escape(key)}%", "limit": limit}
+    if has_pg_trgm(db):
+        return [dict(row) for row in db.execute(SEARCH_MODELS, params).mappings()]
+    wanted = trigrams(key)
+    return [
+        {"model": row.model, "cars": row.cars, "similarity": similarity(trigrams(row.modelkey), wanted)}
+        for row in db.execute(SEARCH_MODELS_LIKE, params)
+    ]
+
+
+def model_names(db: Session) -> List[tuple]:
+    """(key, name) of every distinct model, with its most common spelling"""
+    rows = db.execute(text("""
+        SELECT modelkey, mode() WITHIN GROUP (ORDER BY btrim(model))
+        FROM cars
+        WHERE modelkey <> ''
+        GROUP BY modelkey
+    """))
+    return [tuple(row) for row in rows]
+
+
+def update_values(db: Session, car: schemas.CarUpdate) -> dict:
+    """Column values for the fields set on a partial update, with type names resolved to ids"""
+    update_data = car.dict(exclude_unset=True, exclude={"carid"})
+
+    # Resolve transmission and fuel types through the in-process cache
+    if "transmissiontype" in update_data:
+        update_data["transmissionid"] = dimensions.transmissions.get_or_create(db, update_data.pop("transmissiontype"))
+
+    if "fueltype" in update_data:
+        update_data["fueltypeid"] = dimensions.fueltypes.get_or_create(db, update_data.pop("fueltype"))
+    return update_data
+
+
+def update_car(db: Session, car_id: int, car: schemas.CarUpdate) -> Optional[models.Car]:
+    """Apply a partial update, returning None if the car does not exist"""
+    db_car = get_car(db, car_id)
+    if db_car is None:
+        return None
+
+    update_data = update_values(db, car)
+    for key, value in update_data.items():
+        setattr(db_car, key, value)
+
+    db.commit()
+    db.refresh(db_car)
+    return db_car
+
+
+def delete_car(db: Session, car_id: int) -> bool:
+    """Delete a car, returning False if it does not exist.
+
+    The CarDeleted trigger records the deletion in CarLogs; earlier log entries
+    are kept as the car's audit trail.
+    """
+    try:
+        deleted = db.query(models.Car).filter(models.Car.carid == car_id).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return deleted > 0
+
+
+def update_statement(columns: List[str]):
+    """UPDATE joining cars to one unnest()ed row per car, setting the given columns"""
+    names = ["carid"] + columns
+    arrays = ", ".join(f"CAST(:{name} AS {COLUMN_ARRAY_TYPES[name]})" for name in names)
+    assignments = ", ".join(f"{name} = u.{name}" for name in columns)
+    return text(f"""
+        UPDATE cars SET {assignments}
+        FROM unnest({arrays}) AS u({", ".join(names)})
+        WHERE cars.carid = u.carid
+        RETURNING cars.carid
+    """)
+
+
+def batch_outcomes(ids: List[int], done, status: str) -> List[dict]:
+    done = set(done)
+    return [{"carid": car_id, "status": status if car_id in done else "not_found"} for car_id in ids]
+
+
+def update_cars(db: Session, items: List[schemas.CarBatchUpdateItem]) -> List[dict]:
+    """Apply per-car partial updates in one transaction, with one set-based UPDATE per distinct
+    set of updated fields, and report each item as updated or not_found"""
+    groups = {}
+    try:
+        for item in items:
+            values = update_values(db, item)
+            columns = tuple(sorted(values))
+            if columns:
+                groups.setdefault(columns, []).append((item.carid, values))
+        updated = []
+        for columns, rows in groups.items():
+            params = {"carid": [car_id for car_id, _ in rows]}
+            params.update({column: [values[column] for _, values in rows] for column in columns})
+            updated += db.execute(update_statement(list(columns)), params).scalars().all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return batch_outcomes([item.carid for item in items], updated, "updated")
+
+
+def update_cars_where(db: Session, filters: schemas.CarFilter, car: schemas.CarUpdate) -> List[dict]:
+    """Apply one partial update to every car matching filters in a single UPDATE"""
+    try:
+        values = update_values(db, car)
+        statement = (
+            update(models.Car)
+            .where(*car_conditions(db, filters))
+            .values(**values)
+            .returning(models.Car.carid)
+            .execution_options(synchronize_session=False)
+        )
+        updated = db.execute(statement).scalars().all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return [{"carid": car_id, "status": "updated"} for car_id in sorted(updated)]
+
+
+def delete_cars(db: Session, ids: List[int]) -> List[dict]:
+    """Delete the given cars with one DELETE ... WHERE carid = ANY(...)"""
+    try:
+        deleted = db.execute(
+            text("DELETE FROM cars WHERE carid = ANY(:ids) RETURNING carid"),
+            {"ids": list(ids)}
+        ).scalars().all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return batch_outcomes(ids, deleted, "deleted")
+
+
+def delete_cars_where(db: Session, filters: schemas.CarFilter) -> List[dict]:
+    """Delete every car matching filters in a single DELETE"""
+    try:
+        statement = (
+            delete(models.Car)
+            .where(*car_conditions(db, filters))
+            .returning(models.Car.carid)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = db.execute(statement).scalars().all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return [{"carid": car_id, "status": "deleted"} for car_id in sorted(deleted)]
+
+
+def car_features(db: Session, car: models.Car) -> dict:
+    """A car as model input, with transmission and fuel type names from the cache"""
+    return {
+        "carid": car.carid,
+        "model": car.model,
+        "year": car.year,
+        "price": car.price,
+        "mileage": car.mileage,
+        "tax": car.tax,
+        "mpg": car.mpg,
+        "enginesize": car.enginesize,
+        "transmissiontype": dimensions.transmissions.get_name(db, car.transmissionid),
+        "fueltype": dimensions.fueltypes.get_name(db, car.fueltypeid)
+    }
@@ -1,6 +1,10 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from db_metrics import instrument_engine
 import os
 from dotenv import load_dotenv
 
@@ -8,14 +12,74 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# DB_ASYNC=true serves requests through asyncpg; otherwise the sync psycopg2 engine
+# is used, so both can be benchmarked on the same hardware
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=DB_POOL_PRE_PING
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+instrument_engine(engine, "sync")
 
 Base = declarative_base()
 
-def get_db():
+
+def async_database_url(url: str):
+    """Point a postgres:// or postgresql(+driver):// URL at the asyncpg driver"""
+    url = make_url(url.replace("postgres://", "postgresql://", 1))
+    return url.set(drivername="postgresql+asyncpg").update_query_dict(
+        {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+    )
+
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    async_engine = create_async_engine(
+        async_database_url(DATABASE_URL),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    )
+    instrument_engine(async_engine.sync_engine, "async")
+    # Objects are serialized after the session's greenlet has returned, so they
+    # must not be expired (and lazily reloaded) on commit
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_async_db if DB_ASYNC else get_sync_db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Call fn(session, *args, **kwargs) without blocking the event loop.
+
+    Query functions are written once against a sync Session: on an AsyncSession
+    they run through run_sync on asyncpg, otherwise in the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
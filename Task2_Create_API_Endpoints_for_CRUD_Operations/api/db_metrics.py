@@ -0,0 +1,29 @@
+from prometheus_client import Gauge
+from sqlalchemy import event
+import time
+
+from observability import DB_POOL_CHECKED_OUT, DB_POOL_SIZE, DB_QUERY_SECONDS
+
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size", ["pool"])
+
+
+def instrument_engine(engine, pool_name: str):
+    """Time every statement run on engine and export its pool usage.
+
+    Pass async_engine.sync_engine for an AsyncEngine; the events fire on the
+    sync core underneath it.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+        DB_QUERY_SECONDS.labels(operation).observe(elapsed)
+
+    pool = engine.pool
+    DB_POOL_CHECKED_OUT.labels(pool_name).set_function(pool.checkedout)
+    DB_POOL_SIZE.labels(pool_name).set_function(pool.size)
+    DB_POOL_OVERFLOW.labels(pool_name).set_function(lambda: max(pool.overflow(), 0))
@@ -0,0 +1,77 @@
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+import time
+import models
+
+CACHE_TTL_SECONDS = 300
+
+
+class DimensionCache:
+    """In-process, case-insensitive name <-> id map for a small lookup table.
+
+    The table is read in full on first use and again once the TTL has passed, or
+    straight away after this process adds a row to it.
+    """
+
+    def __init__(self, model, id_attr: str, name_attr: str, ttl: float = CACHE_TTL_SECONDS):
+        self.model = model
+        self.id_attr = id_attr
+        self.name_attr = name_attr
+        self.ttl = ttl
+        self.expires = 0.0
+        self.ids: Dict[str, int] = {}
+        self.names_by_id: Dict[int, str] = {}
+
+    def load(self, db: Session):
+        id_col = getattr(self.model, self.id_attr)
+        name_col = getattr(self.model, self.name_attr)
+        rows = db.query(id_col, name_col).order_by(id_col).all()
+        # Swap in whole new dicts so concurrent readers never see a half-built map
+        self.ids = {name.lower(): dim_id for dim_id, name in rows if name is not None}
+        self.names_by_id = {dim_id: name for dim_id, name in rows}
+        self.expires = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        self.expires = 0.0
+
+    def invalidate_unless_known(self, dim_ids):
+        """Force a reload if any of dim_ids was created since the last load"""
+        if any(dim_id not in self.names_by_id for dim_id in dim_ids):
+            self.invalidate()
+
+    def _ensure(self, db: Session):
+        if time.monotonic() >= self.expires:
+            self.load(db)
+
+    def get_id(self, db: Session, name: str) -> Optional[int]:
+        self._ensure(db)
+        return self.ids.get(name.lower())
+
+    def get_name(self, db: Session, dim_id: int) -> Optional[str]:
+        self._ensure(db)
+        return self.names_by_id.get(dim_id)
+
+    def canonical(self, db: Session, name: str) -> str:
+        """The stored spelling of name, or name itself if it is not known yet"""
+        dim_id = self.get_id(db, name)
+        return name if dim_id is None else self.names_by_id[dim_id]
+
+    def names(self, db: Session) -> List[str]:
+        self._ensure(db)
+        return list(self.names_by_id.values())
+
+    def get_or_create(self, db: Session, name: str) -> int:
+        """Id for name, adding a row (flushed, not committed) if it does not exist"""
+        dim_id = self.get_id(db, name)
+        if dim_id is None:
+            row = self.model(**{self.name_attr: name})
+            db.add(row)
+            db.flush()
+            dim_id = getattr(row, self.id_attr)
+            # Reload rather than insert the id here, in case the transaction rolls back
+            self.invalidate()
+        return dim_id
+
+
+transmissions = DimensionCache(models.Transmission, "transmissionid", "transmissiontype")
+fueltypes = DimensionCache(models.FuelType, "fueltypeid", "fueltype")
@@ -0,0 +1,88 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional, Sequence, Union
+import csv
+import io
+import json
+import os
+import crud
+import fast_json
+import models
+import schemas
+from database import DB_ASYNC, SessionLocal, AsyncSessionLocal
+
+EXPORT_FIELDS = ["carid", "model", "year", "price", "mileage", "tax", "mpg", "enginesize", "transmissionid", "fueltypeid"]
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate a comma-separated projection, defaulting to every field"""
+    if not fields:
+        return list(EXPORT_FIELDS)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in EXPORT_FIELDS]
+    if unknown or not selected:
+        raise ValueError(f"Unknown fields {unknown}. Available fields: {EXPORT_FIELDS}")
+    return selected
+
+
+def export_statement(db: Session, fields: List[str], filters: schemas.CarFilter):
+    """Select only the requested columns, fetched through a server-side cursor"""
+    columns = [getattr(models.Car, field) for field in fields]
+    return (
+        select(*columns)
+        .where(*crud.car_conditions(db, filters))
+        .order_by(models.Car.carid)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+
+def records(rows: Iterable[Sequence], fields: List[str]) -> List[dict]:
+    """Rows as {field: value} dicts; columns past len(fields), fetched only for paging, are dropped"""
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def format_rows(rows: Iterable[Sequence], fields: List[str], fmt: str) -> Union[str, bytes]:
+    """Serialize one batch of rows into a single chunk of the response body"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+    if fast_json.FAST_RESPONSES:
+        return fast_json.ndjson(records(rows, fields))
+    return "".join(json.dumps(record) + "\n" for record in records(rows, fields))
+
+
+def header(fields: List[str], fmt: str) -> str:
+    return format_rows([fields], fields, fmt) if fmt == "csv" else ""
+
+
+def stream_sync(fields: List[str], filters: schemas.CarFilter, fmt: str):
+    # The session belongs to the stream rather than the request, since the body
+    # is still being produced after the handler returns
+    db = SessionLocal()
+    try:
+        yield header(fields, fmt)
+        for partition in db.execute(export_statement(db, fields, filters)).partitions():
+            yield format_rows(partition, fields, fmt)
+    finally:
+        db.close()
+
+
+async def stream_async(fields: List[str], filters: schemas.CarFilter, fmt: str):
+    async with AsyncSessionLocal() as db:
+        yield header(fields, fmt)
+        statement = await db.run_sync(export_statement, fields, filters)
+        result = await db.stream(statement)
+        async for partition in result.partitions():
+            yield format_rows(partition, fields, fmt)
+
+
+def stream_cars(fields: List[str], filters: schemas.CarFilter, fmt: str):
+    """Body iterator for a StreamingResponse; memory stays at one batch of rows"""
+    return (stream_async if DB_ASYNC else stream_sync)(fields, filters, fmt)
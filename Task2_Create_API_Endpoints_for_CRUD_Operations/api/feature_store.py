@@ -0,0 +1,93 @@
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import models
+import crud
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def refresh(db: Session, encoder, car_ids: List[int]) -> Dict[int, bytes]:
+    """Encode the given cars and store their feature vectors; returns them by carid.
+
+    The cars are share-locked while they are encoded, so an update cannot commit
+    in between and leave a vector of its old values behind. Ids of cars that do
+    not exist are skipped.
+    """
+    if not car_ids:
+        return {}
+    try:
+        cars = db.execute(
+            select(models.Car).where(models.Car.carid.in_(car_ids)).with_for_update(read=True)
+        ).scalars().all()
+        vectors = dict(zip(
+            [car.carid for car in cars],
+            encoder.pack([crud.car_features(db, car) for car in cars])
+        ))
+        if vectors:
+            statement = insert(models.CarFeature).values([
+                {"carid": car_id, "featureversion": encoder.version, "features": vector}
+                for car_id, vector in vectors.items()
+            ])
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[models.CarFeature.carid],
+                set_={
+                    "featureversion": statement.excluded.featureversion,
+                    "features": statement.excluded.features,
+                    "updatedat": func.now()
+                }
+            ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return vectors
+
+
+def load(db: Session, encoder, car_ids: List[int]) -> Tuple[List[Tuple[int, Optional[float]]], np.ndarray]:
+    """(carid, price) of each given car that exists, in the order given, and their
+    model inputs as one matrix read from CarFeatures. The price is None for a car
+    without one.
+
+    Vectors that are missing, or were computed with other artifacts, are
+    computed and stored on the way.
+    """
+    rows = db.execute(
+        select(models.Car.carid, models.Car.price, models.CarFeature.features)
+        .outerjoin(models.CarFeature, and_(
+            models.CarFeature.carid == models.Car.carid,
+            models.CarFeature.featureversion == encoder.version
+        ))
+        .where(models.Car.carid.in_(car_ids))
+    ).all()
+    vectors = {car_id: features for car_id, _, features in rows if features is not None}
+    prices = {car_id: price for car_id, price, _ in rows}
+    missing = [car_id for car_id in prices if car_id not in vectors]
+    if missing:
+        vectors.update(refresh(db, encoder, missing))
+    cars = [(car_id, None if prices[car_id] is None else float(prices[car_id])) for car_id in car_ids if car_id in vectors]
+    return cars, encoder.unpack([vectors[car_id] for car_id, _ in cars])
+
+
+def backfill(db: Session, encoder, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Store vectors for every car without a current one, batch_size cars per
+    transaction in carid order; returns how many were computed"""
+    computed = 0
+    after = 0
+    while True:
+        car_ids = db.execute(
+            select(models.Car.carid)
+            .outerjoin(models.CarFeature, and_(
+                models.CarFeature.carid == models.Car.carid,
+                models.CarFeature.featureversion == encoder.version
+            ))
+            .where(models.CarFeature.carid.is_(None), models.Car.carid > after)
+            .order_by(models.Car.carid)
+            .limit(batch_size)
+        ).scalars().all()
+        if not car_ids:
+            return computed
+        computed += len(refresh(db, encoder, car_ids))
+        after = car_ids[-1]
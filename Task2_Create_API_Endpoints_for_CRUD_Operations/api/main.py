@@ -1,116 +1,423 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Path, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from typing import List
-import models
-import schemas
-from database import get_db, engine
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Union
+import logging
+import os
+import sys
+import time
+
+# comparables, fast_json, model_names, observability, prediction and response_cache
+# are shared with the MongoDB API and live in ../shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+import models  # noqa: E402
+import schemas  # noqa: E402
+import crud  # noqa: E402
+import comparables  # noqa: E402
+import dimensions  # noqa: E402
+import export  # noqa: E402
+import fast_json  # noqa: E402
+import model_names  # noqa: E402
+import feature_store  # noqa: E402
+import prediction  # noqa: E402
+import stats  # noqa: E402
+from database import get_db, run_db, engine, SessionLocal  # noqa: E402
+from pagination import encode_cursor, decode_cursor  # noqa: E402
+from response_cache import car_cache, respond  # noqa: E402
+from observability import MetricsMiddleware, configure_logging, metrics_response  # noqa: E402
 
 # Create tables
 models.Base.metadata.create_all(bind=engine)
 
+log_listener = configure_logging(logging.StreamHandler())
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Car API", description="API for managing car inventory")
+app.add_middleware(MetricsMiddleware)
+
+MAX_BATCH_SIZE = 1000
+
+def load_comparable_cars() -> List[dict]:
+    db = SessionLocal()
+    try:
+        return crud.comparable_cars(db)
+    finally:
+        db.close()
+
+async def load_comparables() -> List[dict]:
+    return await run_in_threadpool(load_comparable_cars)
+
+car_comparables = comparables.Comparables(load_comparables, "carid")
+
+def load_model_names() -> List[tuple]:
+    db = SessionLocal()
+    try:
+        return crud.model_names(db)
+    finally:
+        db.close()
+
+async def load_names() -> List[tuple]:
+    return await run_in_threadpool(load_model_names)
+
+car_models = model_names.ModelNames(load_names)
+
+@app.on_event("startup")
+def load_dimensions():
+    db = SessionLocal()
+    try:
+        dimensions.transmissions.load(db)
+        dimensions.fueltypes.load(db)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+async def start_prediction():
+    await prediction.start()
+
+@app.on_event("shutdown")
+async def stop_prediction():
+    await prediction.stop()
+
+# Registered after start_prediction: the index is scaled with the model's scaler
+@app.on_event("startup")
+async def start_comparables():
+    await car_comparables.start()
+
+@app.on_event("shutdown")
+async def stop_comparables():
+    await car_comparables.stop()
+
+@app.on_event("startup")
+async def start_stats_refresh():
+    stats.start()
+
+@app.on_event("shutdown")
+async def stop_stats_refresh():
+    await stats.stop()
+
+@app.on_event("shutdown")
+def stop_logging():
+    log_listener.stop()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return metrics_response()
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Car API", "status": "running"}
 
+@app.get("/fueltypes/", response_model=List[str])
+async def read_fuel_types(db: Session = Depends(get_db)):
+    return await run_db(db, dimensions.fueltypes.names)
+
+@app.get("/transmissions/", response_model=List[str])
+async def read_transmission_types(db: Session = Depends(get_db)):
+    return await run_db(db, dimensions.transmissions.names)
+
+async def refresh_features(db: Session, car_ids: List[int]):
+    """Store feature vectors for cars that were just written.
+
+    A failure is only logged: the write has succeeded, and a missing vector is
+    computed when the car is next scored.
+    """
+    encoder = prediction.loaded_encoder()
+    if encoder is None or not car_ids:
+        return
+    try:
+        await run_db(db, feature_store.refresh, encoder, car_ids)
+    except Exception as e:
+        logger.warning(f"Could not store feature vectors for {len(car_ids)} cars: {str(e)}")
+
+async def refresh_comparables(db: Session, car_ids: List[int]):
+    """Read cars that were just updated into the comparables index; a failure is
+    only logged, and the next rebuild catches up"""
+    if car_comparables.index is None or not car_ids:
+        return
+    try:
+        car_comparables.upsert(await run_db(db, crud.comparable_cars, car_ids))
+    except Exception as e:
+        logger.warning(f"Could not update the comparables index for {len(car_ids)} cars: {str(e)}")
+
 @app.post("/cars/", response_model=schemas.Car)
-def create_car(car: schemas.CarCreate, db: Session = Depends(get_db)):
-    # Call the addnewcar function
-    db.execute(
-        text("""
-        SELECT addnewcar(
-            :model, :year, :price, :transmissiontype, 
-            :mileage, :fueltype, :tax, :mpg, :enginesize
-        )
-        """),
-        {
-            "model": car.model,
-            "year": car.year,
-            "price": car.price,
-            "transmissiontype": car.transmissiontype,
-            "mileage": car.mileage,
-            "fueltype": car.fueltype,
-            "tax": car.tax,
-            "mpg": car.mpg,
-            "enginesize": car.enginesize
-        }
-    )
-    db.commit()
-    
-    # Get the last inserted car
-    new_car = db.query(models.Car).order_by(models.Car.carid.desc()).first()
-    print(f"\nNewly created car: {vars(new_car)}")
-    return new_car
+async def create_car(car: schemas.CarCreate, db: Session = Depends(get_db)):
+    created = (await run_db(db, crud.create_cars, [car]))[0]
+    await refresh_features(db, [created["carid"]])
+    car_comparables.upsert([schemas.Car.model_validate(created).model_dump()])
+    car_models.add([created["model"]])
+    return created
+
+@app.post("/cars/batch", response_model=List[schemas.Car])
+async def create_cars(cars: List[schemas.CarCreate], db: Session = Depends(get_db)):
+    if len(cars) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} cars per batch")
+    created = await run_db(db, crud.create_cars, cars)
+    await refresh_features(db, [row["carid"] for row in created])
+    car_comparables.upsert(schemas.Car.model_validate(row).model_dump() for row in created)
+    car_models.add(row["model"] for row in created)
+    return created
+
+def batch_mode(ids, filters: Optional[schemas.CarFilter]) -> str:
+    """Check that a batch request names either ids or a non-empty filter"""
+    if (ids is None) == (filters is None):
+        raise HTTPException(status_code=400, detail="Give either a list of cars or a filter")
+    if filters is not None:
+        if not filters.dict(exclude_none=True):
+            raise HTTPException(status_code=400, detail="The filter must set at least one field")
+        return "filter"
+    if len(ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} cars per batch")
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Each car may appear only once per batch")
+    return "ids"
+
+@app.patch("/cars/batch", response_model=List[schemas.CarBatchOutcome])
+async def update_cars(batch: schemas.CarBatchUpdate, db: Session = Depends(get_db)):
+    ids = None if batch.items is None else [item.carid for item in batch.items]
+    if batch_mode(ids, batch.filter) == "filter":
+        if batch.update is None or not batch.update.dict(exclude_unset=True):
+            raise HTTPException(status_code=400, detail="A filtered update needs at least one field in update")
+        outcomes = await run_db(db, crud.update_cars_where, batch.filter, batch.update)
+    else:
+        outcomes = await run_db(db, crud.update_cars, batch.items)
+    for outcome in outcomes:
+        await car_cache.invalidate(outcome["carid"])
+    updated = [outcome["carid"] for outcome in outcomes if outcome["status"] == "updated"]
+    await refresh_features(db, updated)
+    await refresh_comparables(db, updated)
+    if batch.items is None:
+        car_models.add([batch.update.model] if updated else [])
+    else:
+        updated_ids = set(updated)
+        car_models.add(item.model for item in batch.items if item.carid in updated_ids)
+    return outcomes
+
+@app.delete("/cars/batch", response_model=List[schemas.CarBatchOutcome])
+async def delete_cars(batch: schemas.CarBatchDelete, db: Session = Depends(get_db)):
+    if batch_mode(batch.ids, batch.filter) == "filter":
+        outcomes = await run_db(db, crud.delete_cars_where, batch.filter)
+    else:
+        outcomes = await run_db(db, crud.delete_cars, batch.ids)
+    for outcome in outcomes:
+        await car_cache.invalidate(outcome["carid"])
+    car_comparables.remove(outcome["carid"] for outcome in outcomes if outcome["status"] == "deleted")
+    return outcomes
 
 @app.get("/cars/", response_model=List[schemas.Car])
-def read_cars(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    cars = db.query(models.Car).offset(skip).limit(limit).all()
-    total_cars = db.query(models.Car).count()
-    print(f"\nTotal number of cars in database: {total_cars}")
+async def read_cars(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    sort: str = Query("carid", pattern=f"^-?({'|'.join(crud.SORT_COLUMNS)})$"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return; served through the fast JSON path"),
+    filters: schemas.CarFilter = Depends(),
+    db: Session = Depends(get_db)
+):
+    after = key = None
+    field = sort.lstrip("-")
+    if cursor is not None:
+        try:
+            after, key = decode_cursor(cursor, sort, crud.SORT_KEY_TYPES.get(field))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            after = int(after)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    fast = fields is not None or fast_json.FAST_RESPONSES
+    columns = None
+    if fast:
+        try:
+            selected = export.parse_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # carid and the sort column are needed for the next cursor even when not returned
+        fetched = selected + [name for name in dict.fromkeys(("carid", field)) if name not in selected]
+        columns = [getattr(models.Car, name) for name in fetched]
+
+    cars = await run_db(
+        db, crud.list_cars, filters, sort, after=after, key=key, skip=skip, limit=limit, columns=columns
+    )
+    headers = {}
+    if len(cars) == limit:
+        last = cars[-1]
+        headers["X-Next-Cursor"] = encode_cursor(
+            last.carid, sort, None if field == "carid" else getattr(last, field)
+        )
+    if include_total:
+        headers["X-Total-Count"] = str(await run_db(db, crud.estimated_car_count))
+    if fast:
+        return fast_json.json_response(export.records(cars, selected), headers)
+    response.headers.update(headers)
     return cars
 
+@app.get("/cars/export")
+async def export_cars(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to include"),
+    filters: schemas.CarFilter = Depends()
+):
+    try:
+        selected = export.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"Content-Disposition": "attachment; filename=cars.csv"} if format == "csv" else None
+    return StreamingResponse(
+        export.stream_cars(selected, filters, format),
+        media_type=export.MEDIA_TYPES[format],
+        headers=headers
+    )
+
 @app.get("/cars/{car_id}", response_model=schemas.Car)
-def read_car(car_id: int, db: Session = Depends(get_db)):
-    car = db.query(models.Car).filter(models.Car.carid == car_id).first()
-    if car is None:
-        raise HTTPException(status_code=404, detail="Car not found")
-    return car
+async def read_car(
+    car_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    entry = await car_cache.get(car_id)
+    if entry is None:
+        version = car_cache.version()
+        car = await run_db(db, crud.get_car, car_id)
+        if car is None:
+            raise HTTPException(status_code=404, detail="Car not found")
+        entry = await car_cache.set(car_id, schemas.Car.model_validate(car).model_dump(mode="json"), version)
+    return respond(entry, if_none_match)
 
 @app.put("/cars/{car_id}", response_model=schemas.Car)
-def update_car(car_id: int, car: schemas.CarUpdate, db: Session = Depends(get_db)):
-    db_car = db.query(models.Car).filter(models.Car.carid == car_id).first()
+async def update_car(car_id: int, car: schemas.CarUpdate, db: Session = Depends(get_db)):
+    db_car = await run_db(db, crud.update_car, car_id, car)
+    await car_cache.invalidate(car_id)
     if db_car is None:
         raise HTTPException(status_code=404, detail="Car not found")
-
-    update_data = car.dict(exclude_unset=True)
-    
-    # Handle transmission type update
-    if "transmissiontype" in update_data:
-        trans_type = update_data.pop("transmissiontype")
-        trans = db.query(models.Transmission).filter(models.Transmission.transmissiontype == trans_type).first()
-        if trans is None:
-            trans = models.Transmission(transmissiontype=trans_type)
-            db.add(trans)
-            db.flush()
-        update_data["transmissionid"] = trans.transmissionid
-
-    # Handle fuel type update
-    if "fueltype" in update_data:
-        fuel_type = update_data.pop("fueltype")
-        fuel = db.query(models.FuelType).filter(models.FuelType.fueltype == fuel_type).first()
-        if fuel is None:
-            fuel = models.FuelType(fueltype=fuel_type)
-            db.add(fuel)
-            db.flush()
-        update_data["fueltypeid"] = fuel.fueltypeid
-
-    for key, value in update_data.items():
-        setattr(db_car, key, value)
-    
-    db.commit()
-    db.refresh(db_car)
-    return db_car
+    # Serialize before the feature refresh commits and expires db_car
+    updated = schemas.Car.model_validate(db_car)
+    await refresh_features(db, [car_id])
+    car_comparables.upsert([updated.model_dump()])
+    car_models.add([updated.model])
+    return updated
 
 @app.delete("/cars/{car_id}")
-def delete_car(car_id: int, db: Session = Depends(get_db)):
-    # First check if car exists
-    car = db.query(models.Car).filter(models.Car.carid == car_id).first()
-    if car is None:
-        raise HTTPException(status_code=404, detail="Car not found")
-    
+async def delete_car(car_id: int, db: Session = Depends(get_db)):
     try:
-        # First delete related records in carlogs
-        db.execute(
-            text("DELETE FROM carlogs WHERE carid = :car_id"),
-            {"car_id": car_id}
-        )
-        
-        # Then delete the car
-        db.delete(car)
-        db.commit()
-        return {"message": "Car and related logs deleted successfully"}
+        deleted = await run_db(db, crud.delete_car, car_id)
     except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    await car_cache.invalidate(car_id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Car not found")
+    car_comparables.remove([car_id])
+    return {"message": "Car deleted successfully"}
+
+@app.get("/cache/stats")
+async def read_cache_stats():
+    return car_cache.stats()
+
+@app.get("/cars/{car_id}/comparables", response_model=List[schemas.ComparableCar])
+async def read_comparables(
+    car_id: int,
+    k: int = Query(comparables.DEFAULT_K, ge=1, le=comparables.MAX_K),
+    db: Session = Depends(get_db)
+):
+    index = car_comparables.require()
+    car = index.get(car_id)
+    if car is None:
+        # Created by another process since the last rebuild, or missing
+        cars = await run_db(db, crud.comparable_cars, [car_id])
+        if not cars:
+            raise HTTPException(status_code=404, detail="Car not found")
+        car = cars[0]
+    return index.nearest(car, k, exclude=car_id)
+
+@app.post("/cars/comparables", response_model=List[schemas.ComparableCar])
+async def find_comparables(
+    car: schemas.ComparablesQuery,
+    k: int = Query(comparables.DEFAULT_K, ge=1, le=comparables.MAX_K),
+    db: Session = Depends(get_db)
+):
+    index = car_comparables.require()
+    fueltypeid = await run_db(db, dimensions.fueltypes.get_id, car.fueltype)
+    return index.nearest({**car.dict(), "fueltypeid": fueltypeid}, k)
+
+@app.get("/comparables/stats")
+async def read_comparables_stats():
+    return car_comparables.require().stats()
+
+@app.get("/models/search", response_model=List[schemas.ModelMatch])
+async def search_models(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(model_names.DEFAULT_LIMIT, ge=1, le=model_names.MAX_LIMIT),
+    db: Session = Depends(get_db)
+):
+    return await run_db(db, crud.search_models, q, limit)
+
+@app.get("/models/autocomplete", response_model=List[str])
+async def autocomplete_models(
+    prefix: str = Query(..., min_length=1),
+    limit: int = Query(model_names.DEFAULT_LIMIT, ge=1, le=model_names.MAX_LIMIT)
+):
+    return await car_models.complete(prefix, limit)
+
+@app.post("/predict/price", response_model=Union[schemas.PricePrediction, List[schemas.PricePrediction]])
+async def predict_price(cars: Union[schemas.CarFeatures, List[schemas.CarFeatures]]):
+    single = not isinstance(cars, list)
+    if single:
+        cars = [cars]
+    elif len(cars) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} cars per batch")
+    prices = await prediction.predict_prices([car.dict() for car in cars])
+    results = [{"predicted_price": price} for price in prices]
+    return results[0] if single else results
+
+async def predict_stored_prices(db: Session, car_ids: List[int]) -> List[dict]:
+    """Score stored cars from their feature vectors: one read and one model call"""
+    cars, vectors = await run_db(db, feature_store.load, prediction.feature_encoder(), car_ids)
+    prices = await prediction.predict_vectors(vectors)
+    return [
+        {"carid": car_id, "actual_price": actual, "predicted_price": price}
+        for (car_id, actual), price in zip(cars, prices)
+    ]
+
+@app.get("/predict/price/{car_id}", response_model=schemas.CarPricePrediction)
+async def predict_car_price(car_id: int, db: Session = Depends(get_db)):
+    results = await predict_stored_prices(db, [car_id])
+    if not results:
+        raise HTTPException(status_code=404, detail="Car not found")
+    return results[0]
+
+@app.post("/predict/price/cars", response_model=List[schemas.CarPricePrediction])
+async def predict_car_prices(car_ids: List[int], db: Session = Depends(get_db)):
+    if len(car_ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} cars per batch")
+    results = await predict_stored_prices(db, car_ids)
+    found = {result["carid"] for result in results}
+    missing = [car_id for car_id in car_ids if car_id not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Cars not found: {missing}")
+    return results
+
+@app.post("/features/backfill")
+async def backfill_features(
+    batch_size: int = Query(feature_store.BACKFILL_BATCH_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    encoder = prediction.feature_encoder()
+    start = time.perf_counter()
+    computed = await run_db(db, feature_store.backfill, encoder, batch_size)
+    return {"version": encoder.version, "computed": computed, "seconds": round(time.perf_counter() - start, 3)}
+
+@app.get("/stats/{dimension}", response_model=List[schemas.PriceStats])
+async def read_price_stats(
+    dimension: str = Path(..., pattern=f"^({'|'.join(stats.STATS_DIMENSIONS)})$"),
+    db: Session = Depends(get_db)
+):
+    return await run_db(db, stats.read_stats, dimension)
+
+@app.post("/stats/refresh")
+async def refresh_price_stats(db: Session = Depends(get_db)):
+    await run_db(db, stats.refresh_stats)
+    return {"message": "Statistics refreshed"}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Computed, DDL, DateTime, Integer, LargeBinary, String, Float, ForeignKey, Index, event, func
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -15,10 +15,42 @@ class Car(Base):
     tax = Column(Integer)
     mpg = Column(Float)
     enginesize = Column(Float)
+    # Trimmed, lower-cased model, written by Postgres; what model filters and search match on
+    modelkey = Column(String(255), Computed("lower(btrim(model))", persisted=True))
 
     transmission = relationship("Transmission", back_populates="cars")
     fueltype = relationship("FuelType", back_populates="cars")
 
+    # Same composite indexes as setup.sql, for databases created by create_all
+    __table_args__ = (
+        Index("idx_cars_modelkey_year_price", "modelkey", "year", "price"),
+        Index("idx_cars_fuel_transmission_year", "fueltypeid", "transmissionid", "year"),
+        Index("idx_cars_year_carid", "year", "carid"),
+        Index("idx_cars_price_carid", "price", "carid"),
+        Index("idx_cars_mileage_carid", "mileage", "carid")
+    )
+
+# The trigram index needs pg_trgm, which is only created where the server ships it
+event.listen(Car.__table__, "after_create", DDL("""
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS idx_cars_modelkey_trgm ON cars USING GIN (modelkey gin_trgm_ops);
+        END IF;
+    END;
+    $$
+""").execute_if(dialect="postgresql"))
+
+class CarFeature(Base):
+    """Encoded and scaled price model inputs of a car; see feature_store.py"""
+    __tablename__ = "carfeatures"
+
+    carid = Column(Integer, ForeignKey("cars.carid", ondelete="CASCADE"), primary_key=True)
+    featureversion = Column(String(16), nullable=False)
+    features = Column(LargeBinary, nullable=False)
+    updatedat = Column(DateTime, nullable=False, server_default=func.now())
+
 class Transmission(Base):
     __tablename__ = "transmissions"
 
@@ -0,0 +1,34 @@
+import base64
+import json
+
+
+def encode_cursor(last_id, sort: str, key=None) -> str:
+    """Opaque token for the page that starts after last_id, and after key when sorting by another column.
+
+    The sort it was issued under is kept, so that it is never applied to another one.
+    """
+    state = {"after": last_id, "sort": sort}
+    if key is not None:
+        state["key"] = key
+    payload = json.dumps(state).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, key_type=None):
+    """Return the (id, sort key) a cursor token points after, raising ValueError if it is
+    malformed or was issued under another sort.
+
+    key_type is the type (or tuple of types) the sort key must have, None when
+    sorting by id; a key of None stands for a row without a value.
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        state = json.loads(base64.urlsafe_b64decode(padded))
+        after, key, issued = state["after"], state.get("key"), state.get("sort")
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ValueError("Invalid cursor")
+    if issued != sort:
+        raise ValueError(f"Cursor was issued for sort={issued}, not sort={sort}")
+    if key is not None and (key_type is None or isinstance(key, bool) or not isinstance(key, key_type)):
+        raise ValueError("Invalid cursor")
+    return after, key
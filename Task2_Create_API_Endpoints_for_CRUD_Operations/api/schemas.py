@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class CarBase(BaseModel):
     model: str
@@ -31,4 +31,73 @@ class CarUpdate(BaseModel):
     mpg: Optional[float] = None
     enginesize: Optional[float] = None
     transmissiontype: Optional[str] = None
-    fueltype: Optional[str] = None 
\ No newline at end of file
+    fueltype: Optional[str] = None 
+
+class CarBatchUpdateItem(CarUpdate):
+    carid: int
+
+class CarFeatures(BaseModel):
+    model: str
+    year: int
+    mileage: int
+    tax: int
+    mpg: float
+    enginesize: float
+    transmissiontype: str
+    fueltype: str
+
+class ComparablesQuery(BaseModel):
+    model: str
+    year: int
+    mileage: int
+    tax: int
+    mpg: float
+    enginesize: float
+    fueltype: str
+
+class ComparableCar(Car):
+    distance: float
+
+class ModelMatch(BaseModel):
+    model: str
+    cars: int
+    similarity: float
+
+class PricePrediction(BaseModel):
+    predicted_price: float
+
+class CarPricePrediction(PricePrediction):
+    carid: int
+    actual_price: Optional[float] = None
+
+class CarFilter(BaseModel):
+    model: Optional[str] = None
+    min_year: Optional[int] = None
+    max_year: Optional[int] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_mileage: Optional[int] = None
+    max_mileage: Optional[int] = None
+    transmissiontype: Optional[str] = None
+    fueltype: Optional[str] = None
+
+class PriceStats(BaseModel):
+    value: str
+    count: int
+    avg_price: float
+    median_price: float
+    min_price: float
+    max_price: float
+
+class CarBatchUpdate(BaseModel):
+    items: Optional[List[CarBatchUpdateItem]] = None
+    filter: Optional[CarFilter] = None
+    update: Optional[CarUpdate] = None
+
+class CarBatchDelete(BaseModel):
+    ids: Optional[List[int]] = None
+    filter: Optional[CarFilter] = None
+
+class CarBatchOutcome(BaseModel):
+    carid: int
+    status: str
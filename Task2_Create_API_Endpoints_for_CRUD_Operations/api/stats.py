@@ -0,0 +1,81 @@
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from typing import List
+import asyncio
+import logging
+import os
+from database import SessionLocal
+
+# Seconds between background refreshes of the CarPriceStats view; 0 disables them
+STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "300"))
+
+STATS_DIMENSIONS = ("model", "year", "fueltype", "transmission")
+
+READ_STATS = text("""
+    SELECT value, carcount AS count, avgprice AS avg_price, medianprice AS median_price,
+           minprice AS min_price, maxprice AS max_price
+    FROM carpricestats
+    WHERE dimension = :dimension
+    ORDER BY value
+""")
+
+logger = logging.getLogger(__name__)
+
+refresher = None
+
+
+def read_stats(db: Session, dimension: str) -> List[dict]:
+    """Precomputed price statistics for one dimension, read from the CarPriceStats view"""
+    try:
+        return [dict(row) for row in db.execute(READ_STATS, {"dimension": dimension}).mappings()]
+    except ProgrammingError:
+        db.rollback()
+        raise HTTPException(status_code=503, detail="CarPriceStats view is missing; run setup.sql")
+
+
+def refresh_stats(db: Session):
+    """Recompute CarPriceStats without blocking readers of the current contents"""
+    try:
+        db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY carpricestats"))
+        db.commit()
+    except ProgrammingError:
+        db.rollback()
+        raise HTTPException(status_code=503, detail="CarPriceStats view is missing; run setup.sql")
+
+
+def refresh_in_session():
+    db = SessionLocal()
+    try:
+        refresh_stats(db)
+    finally:
+        db.close()
+
+
+async def refresh_periodically():
+    while True:
+        await asyncio.sleep(STATS_REFRESH_SECONDS)
+        try:
+            await run_in_threadpool(refresh_in_session)
+        except Exception as e:
+            logger.error(f"Error refreshing CarPriceStats: {str(e)}")
+
+
+def start():
+    """Start the scheduled refresh when STATS_REFRESH_SECONDS is set"""
+    global refresher
+    if STATS_REFRESH_SECONDS > 0 and refresher is None:
+        refresher = asyncio.get_running_loop().create_task(refresh_periodically())
+
+
+async def stop():
+    global refresher
+    if refresher is not None:
+        refresher.cancel()
+        try:
+            await refresher
+        except asyncio.CancelledError:
+            pass
+        refresher = None
@@ -0,0 +1,57 @@
+from pymongo import monitoring
+
+from observability import DB_POOL_CHECKED_OUT, DB_POOL_SIZE, DB_QUERY_SECONDS
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Record the server-reported duration of every MongoDB command"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        DB_QUERY_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        DB_QUERY_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+
+class PoolTracker(monitoring.ConnectionPoolListener):
+    """Track open and checked-out connections across the client's server pools"""
+
+    def __init__(self, pool_name: str = "mongo"):
+        self.checked_out = DB_POOL_CHECKED_OUT.labels(pool_name)
+        self.size = DB_POOL_SIZE.labels(pool_name)
+
+    def connection_created(self, event):
+        self.size.inc()
+
+    def connection_closed(self, event):
+        self.size.dec()
+
+    def connection_checked_out(self, event):
+        self.checked_out.inc()
+
+    def connection_checked_in(self, event):
+        self.checked_out.dec()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
@@ -0,0 +1,55 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+CACHE_TTL_SECONDS = 300
+
+
+class DimensionCache:
+    """In-process, case-insensitive name <-> id map for a small lookup collection.
+
+    Replaces the anchored `$regex` find_one calls, which cannot use an index. The
+    collection is read in full at startup and again once the TTL has passed.
+    """
+
+    def __init__(self, collection, id_field: str, name_field: str, ttl: float = CACHE_TTL_SECONDS):
+        self.collection = collection
+        self.id_field = id_field
+        self.name_field = name_field
+        self.ttl = ttl
+        self.expires = 0.0
+        self.ids: Dict[str, int] = {}
+        self.names_by_id: Dict[int, str] = {}
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        ids, names_by_id = {}, {}
+        projection = {self.id_field: 1, self.name_field: 1, "_id": 0}
+        async for doc in self.collection.find({}, projection).sort(self.id_field, 1):
+            # Skip documents seeded without the fields the API reads
+            if self.id_field in doc and self.name_field in doc:
+                ids[doc[self.name_field].lower()] = doc[self.id_field]
+                names_by_id[doc[self.id_field]] = doc[self.name_field]
+        self.ids, self.names_by_id = ids, names_by_id
+        self.expires = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        self.expires = 0.0
+
+    async def _ensure(self):
+        if time.monotonic() >= self.expires:
+            async with self._lock:
+                if time.monotonic() >= self.expires:
+                    await self.load()
+
+    async def get_id(self, name: str) -> Optional[int]:
+        await self._ensure()
+        return self.ids.get(name.lower())
+
+    async def get_name(self, dim_id: int) -> Optional[str]:
+        await self._ensure()
+        return self.names_by_id.get(dim_id)
+
+    async def names(self) -> List[str]:
+        await self._ensure()
+        return list(self.names_by_id.values())
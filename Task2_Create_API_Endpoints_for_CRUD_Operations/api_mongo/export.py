@@ -0,0 +1,73 @@
+from typing import Any, Dict, List, Optional, Union
+import csv
+import io
+import json
+import os
+import fast_json
+
+EXPORT_FIELDS = ["id", "model", "year", "price", "mileage", "tax", "mpg", "enginesize", "transmissionid", "fueltypeid"]
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate a comma-separated projection, defaulting to every field"""
+    if not fields:
+        return list(EXPORT_FIELDS)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in EXPORT_FIELDS]
+    if unknown or not selected:
+        raise ValueError(f"Unknown fields {unknown}. Available fields: {EXPORT_FIELDS}")
+    return selected
+
+
+def projection(fields: List[str]) -> Dict[str, int]:
+    """Mongo projection fetching only the requested fields"""
+    return {"_id": int("id" in fields), **{field: 1 for field in fields if field != "id"}}
+
+
+def records(docs: List[Dict[str, Any]], fields: List[str]) -> List[Dict[str, Any]]:
+    """Documents fetched with projection(fields) as output dicts, with _id as the string id.
+
+    Each document is projected to fields on its own, since documents need not share
+    a shape: a field a document lacks comes out as null, and other fields the caller
+    fetched (a sort key for paging) are dropped.
+    """
+    return [
+        {field: str(doc["_id"]) if field == "id" else doc.get(field) for field in fields}
+        for doc in docs
+    ]
+
+
+def format_docs(docs: List[Dict[str, Any]], fields: List[str], fmt: str) -> Union[str, bytes]:
+    """Serialize one batch of documents into a single chunk of the response body"""
+    if fmt != "csv" and fast_json.FAST_RESPONSES:
+        return fast_json.ndjson(records(docs, fields))
+    rows = [[str(doc["_id"]) if field == "id" else doc.get(field) for field in fields] for doc in docs]
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(dict(zip(fields, row))) + "\n" for row in rows)
+
+
+async def stream_cars(collection, query: Dict[str, Any], fields: List[str], fmt: str):
+    """Body iterator for a StreamingResponse; memory stays at one cursor batch"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(fields)
+        yield buffer.getvalue()
+
+    cursor = collection.find(query, projection(fields)).sort("_id", 1).batch_size(EXPORT_BATCH_SIZE)
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield format_docs(batch, fields, fmt)
+            batch = []
+    if batch:
+        yield format_docs(batch, fields, fmt)
@@ -0,0 +1,94 @@
+from bson import Binary
+from pymongo import UpdateOne
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+BACKFILL_BATCH_SIZE = 1000
+
+# Car fields the price model reads; a stored vector is only written while they are unchanged
+FEATURE_INPUTS = ["model", "year", "mileage", "tax", "mpg", "enginesize", "transmissionid", "fueltypeid"]
+
+
+
+def car_update(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Update document setting fields, which drops the stored vector when a model input
+    is among them, so a vector from the old values is never served"""
+    update = {"$set": fields}
+    if any(field in fields for field in FEATURE_INPUTS):
+        update["$unset"] = {"features": ""}
+    return update
+
+
+class FeatureStore:
+    """Encoded and scaled price model inputs, kept in each car document.
+
+    Vectors are written to a `features` sub-document holding the float32 bytes
+    and the version of the scaler and label encoders that produced them. A
+    replacement of the document, as replicate.py does, drops the vector along
+    with the old values, and scoring computes it again.
+    """
+
+    def __init__(self, collection, transmissions, fueltypes):
+        self.collection = collection
+        self.transmissions = transmissions
+        self.fueltypes = fueltypes
+
+    async def model_input(self, car: Dict[str, Any]) -> Dict[str, Any]:
+        """A car document as model input, with transmission and fuel type names from the cache"""
+        features = dict(car)
+        features["transmissiontype"] = await self.transmissions.get_name(car.get("transmissionid"))
+        features["fueltype"] = await self.fueltypes.get_name(car.get("fueltypeid"))
+        return features
+
+    async def refresh(self, encoder, cars: List[Dict[str, Any]]) -> Dict[Any, bytes]:
+        """Encode the given car documents and store their vectors; returns them by _id.
+
+        Each write only matches while the document still has the values that were
+        encoded, so a concurrent update is never overwritten with a stale vector.
+        """
+        if not cars:
+            return {}
+        vectors = dict(zip(
+            [car["_id"] for car in cars],
+            encoder.pack([await self.model_input(car) for car in cars])
+        ))
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": car["_id"], **{field: car.get(field) for field in FEATURE_INPUTS}},
+                {"$set": {"features": {"version": encoder.version, "vector": Binary(vectors[car["_id"]])}}}
+            )
+            for car in cars
+        ], ordered=False)
+        return vectors
+
+    async def load(self, encoder, ids: List[Any]) -> Tuple[List[Tuple[Any, Optional[float]]], np.ndarray]:
+        """(_id, price) of each given car that exists, in the order given, and their
+        model inputs as one matrix read from the stored vectors. The price is None
+        for a car without one.
+
+        Vectors that are missing, or were computed with other artifacts, are
+        computed and stored on the way.
+        """
+        projection = {"price": 1, "features": 1, **{field: 1 for field in FEATURE_INPUTS}}
+        docs = await self.collection.find({"_id": {"$in": ids}}, projection).to_list(None)
+        vectors = {
+            doc["_id"]: doc["features"]["vector"] for doc in docs
+            if doc.get("features", {}).get("version") == encoder.version
+        }
+        vectors.update(await self.refresh(encoder, [doc for doc in docs if doc["_id"] not in vectors]))
+        prices = {doc["_id"]: doc.get("price") for doc in docs}
+        cars = [(car_id, None if prices[car_id] is None else float(prices[car_id])) for car_id in ids if car_id in vectors]
+        return cars, encoder.unpack([vectors[car_id] for car_id, _ in cars])
+
+    async def backfill(self, encoder, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+        """Store vectors for every car without a current one, batch_size documents
+        per bulk_write in _id order; returns how many were computed"""
+        computed = 0
+        query = {"features.version": {"$ne": encoder.version}}
+        projection = {field: 1 for field in FEATURE_INPUTS}
+        while True:
+            cars = await self.collection.find(query, projection).sort("_id", 1).limit(batch_size).to_list(None)
+            if not cars:
+                return computed
+            computed += len(await self.refresh(encoder, cars))
+            query["_id"] = {"$gt": cars[-1]["_id"]}
@@ -1,19 +1,39 @@
-from fastapi import FastAPI, HTTPException, Query, Path
+from fastapi import FastAPI, HTTPException, Query, Path, Response, Depends, Header
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, UpdateOne
+from pymongo.read_concern import ReadConcern
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from bson import ObjectId
+import asyncio
 import os
+import base64
+import json
+import time
 from dotenv import load_dotenv
 import logging
+import sys
 from datetime import datetime
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='app.log'
-)
+# comparables, fast_json, model_names, observability, prediction and response_cache
+# are shared with the SQL API and live in ../shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+from dimensions import DimensionCache  # noqa: E402
+from stats import STATS_FIELDS, StatsCache  # noqa: E402
+from response_cache import car_cache, respond  # noqa: E402
+from db_metrics import CommandTimer, PoolTracker  # noqa: E402
+from observability import MetricsMiddleware, configure_logging, metrics_response  # noqa: E402
+import prediction  # noqa: E402
+import comparables  # noqa: E402
+import export  # noqa: E402
+import fast_json  # noqa: E402
+import model_names  # noqa: E402
+from feature_store import BACKFILL_BATCH_SIZE, FeatureStore, car_update  # noqa: E402
+
+# Configure logging; records are written to app.log off the event loop
+log_listener = configure_logging(logging.FileHandler('app.log'))
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -23,12 +43,18 @@ app = FastAPI(
     description="An API for managing car information with MongoDB integration",
     version="1.0.0"
 )
+app.add_middleware(MetricsMiddleware)
 
 # MongoDB connection
 MONGODB_URL = os.getenv("MONGODB_URL")
-client = AsyncIOMotorClient(MONGODB_URL)
+client = AsyncIOMotorClient(MONGODB_URL, event_listeners=[CommandTimer(), PoolTracker()])
 db = client["ford-data"]
 
+transmissions = DimensionCache(db.transmissions, "transmissionid", "transmissiontype")
+fueltypes = DimensionCache(db.fueltype, "fueltypeid", "fueltype")
+price_stats = StatsCache(db.cars)
+car_features = FeatureStore(db.cars, transmissions, fueltypes)
+
 class Car(BaseModel):
     model: str = Field(..., description="The model name of the car")
     year: int = Field(..., ge=1900, le=datetime.now().year + 1, description="The manufacturing year")
@@ -89,6 +115,57 @@ class UpdateCar(BaseModel):
             }
         }
 
+class CarBatchUpdateItem(UpdateCar):
+    id: str = Field(..., description="The car to update")
+
+class CarFeatures(BaseModel):
+    model: str = Field(..., description="The model name of the car")
+    year: int = Field(..., ge=1900, le=datetime.now().year + 1, description="The manufacturing year")
+    mileage: float = Field(..., ge=0, description="The mileage of the car")
+    tax: float = Field(..., ge=0, description="The tax amount")
+    mpg: float = Field(..., gt=0, description="Miles per gallon")
+    enginesize: float = Field(..., gt=0, description="The engine size in liters")
+    transmissiontype: str = Field(..., description="The type of transmission")
+    fueltype: str = Field(..., description="The type of fuel")
+
+class ComparablesQuery(BaseModel):
+    model: str = Field(..., description="The model name of the car")
+    year: int = Field(..., ge=1900, le=datetime.now().year + 1, description="The manufacturing year")
+    mileage: float = Field(..., ge=0, description="The mileage of the car")
+    tax: float = Field(..., ge=0, description="The tax amount")
+    mpg: float = Field(..., gt=0, description="Miles per gallon")
+    enginesize: float = Field(..., gt=0, description="The engine size in liters")
+    fueltype: str = Field(..., description="The type of fuel")
+
+class CarFilter(BaseModel):
+    model: Optional[str] = Field(None, description="Model name, ignoring case and surrounding spaces")
+    min_year: Optional[int] = Field(None, description="Earliest manufacturing year")
+    max_year: Optional[int] = Field(None, description="Latest manufacturing year")
+    min_price: Optional[float] = Field(None, description="Lowest price")
+    max_price: Optional[float] = Field(None, description="Highest price")
+    min_mileage: Optional[int] = Field(None, description="Lowest mileage")
+    max_mileage: Optional[int] = Field(None, description="Highest mileage")
+    transmissiontype: Optional[str] = Field(None, description="Transmission type name")
+    fueltype: Optional[str] = Field(None, description="Fuel type name")
+
+class CarBatchUpdate(BaseModel):
+    items: Optional[List[CarBatchUpdateItem]] = Field(None, description="Per-car partial updates")
+    filter: Optional[CarFilter] = Field(None, description="Update every car matching this filter")
+    update: Optional[UpdateCar] = Field(None, description="Fields to set on the filtered cars")
+
+class CarBatchDelete(BaseModel):
+    ids: Optional[List[str]] = Field(None, description="Cars to delete")
+    filter: Optional[CarFilter] = Field(None, description="Delete every car matching this filter")
+
+MAX_BATCH_SIZE = 1000
+
+# Fields GET /cars/ can sort by; each has a (field, _id) index for keyset paging
+SORT_FIELDS = ("id", "year", "price", "mileage")
+# JSON types a cursor may hold for the sort field it seeks past
+SORT_KEY_TYPES = {"year": (int, float), "price": (int, float), "mileage": (int, float)}
+
+MAX_PREDICT_BATCH_SIZE = 1000
+
 def car_helper(car) -> dict:
     """Convert MongoDB car document to API response format"""
     return {
@@ -104,14 +181,165 @@ def car_helper(car) -> dict:
         "fueltypeid": car["fueltypeid"]
     }
 
+def car_key(car_id: str) -> str:
+    """Canonical form of a car id, under which it is cached and invalidated; raises if malformed"""
+    return str(ObjectId(car_id))
+
+def encode_cursor(last_id: ObjectId, sort: str, key=None) -> str:
+    """Opaque token for the page that starts after last_id, and after key when sorting by another
+    field. The sort it was issued under is kept, so that it is never applied to another one."""
+    state = {"after": str(last_id), "sort": sort}
+    if key is not None:
+        state["key"] = key
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, key_type=None):
+    """Return the (ObjectId, sort key) a cursor token points after, raising ValueError if it is
+    malformed, was issued under another sort, or holds a key that isn't a key_type (None
+    when sorting by id). A key of None stands for a document without the sort field."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        after, key, issued = ObjectId(state["after"]), state.get("key"), state.get("sort")
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if issued != sort:
+        raise ValueError(f"Cursor was issued for sort={issued}, not sort={sort}")
+    if key is not None and (key_type is None or isinstance(key, bool) or not isinstance(key, key_type)):
+        raise ValueError("Invalid cursor")
+    return after, key
+
+async def car_query(filters: CarFilter) -> Dict[str, Any]:
+    """Mongo filter for the filters that were set.
+
+    Transmission and fuel type names are resolved to ids through the dimension
+    caches, so the filter runs on the cars indexes alone.
+    """
+    query: Dict[str, Any] = {}
+    if filters.model is not None:
+        query["modelkey"] = model_names.model_key(filters.model)
+    for field, low, high in (
+        ("year", filters.min_year, filters.max_year),
+        ("price", filters.min_price, filters.max_price),
+        ("mileage", filters.min_mileage, filters.max_mileage)
+    ):
+        bounds = {}
+        if low is not None:
+            bounds["$gte"] = low
+        if high is not None:
+            bounds["$lte"] = high
+        if bounds:
+            query[field] = bounds
+    for field, name, cache in (
+        ("transmissionid", filters.transmissiontype, transmissions),
+        ("fueltypeid", filters.fueltype, fueltypes)
+    ):
+        if name is not None:
+            # An unknown type matches nothing
+            dim_id = await cache.get_id(name)
+            query[field] = dim_id if dim_id is not None else {"$in": []}
+    return query
+
+def matching(query: Dict[str, Any], condition: Dict[str, Any]) -> Dict[str, Any]:
+    return {"$and": [query, condition]} if query else condition
+
+async def find_page(query: Dict[str, Any], field: str, direction: int, projection, limit: int, skip: int = 0,
+                    after: Optional[ObjectId] = None, key=None) -> List[Dict[str, Any]]:
+    """A page of matching cars in (field, _id) order, past (key, after) when after is given.
+    Ties on field are broken by _id, so every document has a unique position.
+
+    Cars without a value in field come last in either direction. They are read by a
+    second find in _id order, so that each part runs in the order of the (field, _id)
+    index; a key of None seeks among them.
+    """
+    op = "$gt" if direction == 1 else "$lt"
+    if field == "_id":
+        if after is not None:
+            query, skip = matching(query, {"_id": {op: after}}), 0
+        return await db.cars.find(query, projection).sort("_id", direction).skip(skip).limit(limit).to_list(length=limit)
+
+    valued = matching(query, {field: {"$ne": None}})
+    docs = []
+    if after is None:
+        docs = await db.cars.find(valued, projection).sort([(field, direction), ("_id", direction)]) \
+            .skip(skip).limit(limit).to_list(length=limit)
+        # Offset into the cars without a value by those skipped past the valued ones
+        skip = 0 if docs or not skip else max(0, skip - await db.cars.count_documents(valued))
+    elif key is not None:
+        past = {"$or": [{field: {op: key}}, {field: key, "_id": {op: after}}]}
+        docs = await db.cars.find(matching(valued, past), projection).sort([(field, direction), ("_id", direction)]) \
+            .limit(limit).to_list(length=limit)
+    if len(docs) < limit:
+        empty = matching(query, {field: None})
+        if after is not None and key is None:
+            empty = matching(empty, {"_id": {op: after}})
+        docs += await db.cars.find(empty, projection).sort("_id", direction).skip(skip if after is None else 0) \
+            .limit(limit - len(docs)).to_list(length=limit - len(docs))
+    return docs
+
+async def load_comparables() -> List[Dict[str, Any]]:
+    return [car_helper(car) async for car in db.cars.find({}, {"features": 0})]
+
+car_comparables = comparables.Comparables(load_comparables, "id")
+
+async def load_model_names() -> List[tuple]:
+    """(modelkey, name) of every distinct model, with its most common spelling"""
+    pipeline = [
+        {"$match": {"modelkey": {"$type": "string", "$ne": ""}}},
+        {"$group": {"_id": {"key": "$modelkey", "name": "$model"}, "cars": {"$sum": 1}}},
+        {"$sort": {"cars": -1}},
+        {"$group": {"_id": "$_id.key", "name": {"$first": "$_id.name"}}}
+    ]
+    return [(doc["_id"], doc["name"].strip()) async for doc in db.cars.aggregate(pipeline)]
+
+car_models = model_names.ModelNames(load_model_names)
+
+COUNT_TTL_SECONDS = 60
+car_count_cache = {"value": None, "expires": 0.0}
+
+async def estimated_car_count() -> int:
+    """Collection-metadata count of cars, cached for COUNT_TTL_SECONDS"""
+    now = time.monotonic()
+    if car_count_cache["value"] is None or now >= car_count_cache["expires"]:
+        car_count_cache["value"] = await db.cars.estimated_document_count()
+        car_count_cache["expires"] = now + COUNT_TTL_SECONDS
+    return car_count_cache["value"]
+
+@app.on_event("startup")
+async def load_dimensions():
+    await transmissions.load()
+    await fueltypes.load()
+
+@app.on_event("startup")
+async def start_prediction():
+    await prediction.start()
+
+@app.on_event("shutdown")
+async def stop_prediction():
+    await prediction.stop()
+
+# Registered after start_prediction: the index is scaled with the model's scaler
+@app.on_event("startup")
+async def start_comparables():
+    await car_comparables.start()
+
+@app.on_event("shutdown")
+async def stop_comparables():
+    await car_comparables.stop()
+
+@app.on_event("shutdown")
+def stop_logging():
+    log_listener.stop()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: request latency and status, MongoDB command latency and pool usage"""
+    return metrics_response()
+
 @app.get("/fueltypes/", response_model=List[str], tags=["Fuel Types"])
 async def get_fuel_types():
     """Get all available fuel types"""
     try:
-        fuel_types = []
-        async for fuel in db.fueltype.find():
-            fuel_types.append(fuel["fueltype"])
-        return fuel_types
+        return await fueltypes.names()
     except Exception as e:
         logger.error(f"Error fetching fuel types: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching fuel types")
@@ -120,49 +348,73 @@ async def get_fuel_types():
 async def get_transmission_types():
     """Get all available transmission types"""
     try:
-        transmission_types = []
-        async for transmission in db.transmissions.find():
-            transmission_types.append(transmission["transmissiontype"])
-        return transmission_types
+        return await transmissions.names()
     except Exception as e:
         logger.error(f"Error fetching transmission types: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching transmission types")
 
+async def refresh_features(cars):
+    """Store feature vectors for car documents that were just written.
+
+    A failure is only logged: the write has succeeded, and a missing vector is
+    computed when the car is next scored.
+    """
+    encoder = prediction.loaded_encoder()
+    if encoder is None or not cars:
+        return
+    try:
+        await car_features.refresh(encoder, cars)
+    except Exception as e:
+        logger.warning(f"Could not store feature vectors: {str(e)}")
+
+async def refresh_written(ids):
+    """Read batch-updated cars back once, for their feature vectors and the
+    comparables index; a failure is only logged, as in refresh_features"""
+    if not ids:
+        return
+    try:
+        cars = await db.cars.find({"_id": {"$in": list(ids)}}, {"features": 0}).to_list(None)
+    except Exception as e:
+        logger.warning(f"Could not read back {len(ids)} updated cars: {str(e)}")
+        return
+    await refresh_features(cars)
+    car_comparables.upsert(car_helper(car) for car in cars)
+    car_models.add(car["model"] for car in cars)
+
 @app.post("/cars/", response_model=Dict[str, Any], tags=["Cars"])
 async def create_car(car: Car):
     """Create a new car entry"""
     try:
         # Get transmission ID
-        transmission = await db.transmissions.find_one(
-            {"transmissiontype": {"$regex": f"^{car.transmissiontype}$", "$options": "i"}}
-        )
-        if not transmission:
+        transmission_id = await transmissions.get_id(car.transmissiontype)
+        if transmission_id is None:
             raise HTTPException(status_code=404, detail=f"Transmission type '{car.transmissiontype}' not found")
         
         # Get fuel type ID
-        fuel_type = await db.fueltype.find_one(
-            {"fueltype": {"$regex": f"^{car.fueltype}$", "$options": "i"}}
-        )
-        if not fuel_type:
-            # Get available fuel types for error message
-            fuel_types = [ft["fueltype"] async for ft in db.fueltype.find()]
+        fuel_type_id = await fueltypes.get_id(car.fueltype)
+        if fuel_type_id is None:
             raise HTTPException(
                 status_code=404, 
-                detail=f"Fuel type '{car.fueltype}' not found. Available types: {fuel_types}"
+                detail=f"Fuel type '{car.fueltype}' not found. Available types: {await fueltypes.names()}"
             )
         
         car_dict = car.dict()
-        car_dict["transmissionid"] = transmission["transmissionid"]
-        car_dict["fueltypeid"] = fuel_type["fueltypeid"]
+        car_dict["transmissionid"] = transmission_id
+        car_dict["fueltypeid"] = fuel_type_id
+        car_dict["modelkey"] = model_names.model_key(car.model)
         
         # Remove transmissiontype and fueltype from dict before inserting
         del car_dict["transmissiontype"]
         del car_dict["fueltype"]
         
-        result = await db.cars.insert_one(car_dict)
-        created_car = await db.cars.find_one({"_id": result.inserted_id})
+        # insert_one sets car_dict["_id"], so the document need not be read back
+        await db.cars.insert_one(car_dict)
+        price_stats.invalidate()
+        await refresh_features([car_dict])
+        car_comparables.upsert([car_helper(car_dict)])
+        car_models.add([car.model])
         logger.info(f"Created car: {car.model}")
-        return car_helper(created_car)
+        return car_helper(car_dict)
     except HTTPException:
         raise
     except Exception as e:
@@ -171,32 +423,245 @@ async def create_car(car: Car):
 
 @app.get("/cars/", response_model=List[Dict[str, Any]], tags=["Cars"])
 async def get_cars(
+    response: Response,
     skip: int = Query(0, ge=0, description="Number of cars to skip"),
-    limit: int = Query(10, ge=1, le=100, description="Number of cars to return")
+    limit: int = Query(10, ge=1, le=100, description="Number of cars to return"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    include_total: bool = Query(False, description="Return an estimated total in X-Total-Count"),
+    sort: str = Query("id", pattern=f"^-?({'|'.join(SORT_FIELDS)})$", description="Sort field, prefixed with - for descending"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return; served through the fast JSON path"),
+    filters: CarFilter = Depends()
 ):
-    """Get all cars with pagination"""
+    """Search cars with optional filters, sorted, with cursor or skip pagination"""
     try:
-        cars = []
-        cursor = db.cars.find().skip(skip).limit(limit)
-        async for car in cursor:
-            cars.append(car_helper(car))
-        return cars
+        direction = -1 if sort.startswith("-") else 1
+        field = sort.lstrip("-")
+        field = "_id" if field == "id" else field
+        query = await car_query(filters)
+
+        fast = fields is not None or fast_json.FAST_RESPONSES
+        projection = None
+        if fast:
+            try:
+                selected = export.parse_fields(fields)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            # _id and the sort field are needed for the next cursor even when not returned
+            projection = export.projection(selected + ["id"] + ([] if field == "_id" else [field]))
+
+        if cursor is not None:
+            try:
+                after, key = decode_cursor(cursor, sort, SORT_KEY_TYPES.get(field))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            docs = await find_page(query, field, direction, projection, limit, after=after, key=key)
+        else:
+            docs = await find_page(query, field, direction, projection, limit, skip=skip)
+
+        headers = {}
+        if len(docs) == limit:
+            last = docs[-1]
+            headers["X-Next-Cursor"] = encode_cursor(
+                last["_id"], sort, None if field == "_id" else last.get(field)
+            )
+        if include_total:
+            headers["X-Total-Count"] = str(await estimated_car_count())
+        if fast:
+            return fast_json.json_response(export.records(docs, selected), headers)
+        response.headers.update(headers)
+        return [car_helper(car) for car in docs]
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching cars: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching cars")
 
+@app.get("/cars/export", tags=["Cars"])
+async def export_cars(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to include"),
+    filters: CarFilter = Depends()
+):
+    """Stream every matching car as NDJSON or CSV"""
+    try:
+        selected = export.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"Content-Disposition": "attachment; filename=cars.csv"} if format == "csv" else None
+    return StreamingResponse(
+        export.stream_cars(db.cars, await car_query(filters), selected, format),
+        media_type=export.MEDIA_TYPES[format],
+        headers=headers
+    )
+
 @app.get("/cars/{car_id}", response_model=Dict[str, Any], tags=["Cars"])
-async def get_car(car_id: str):
-    """Get a specific car by ID"""
+async def get_car(car_id: str, if_none_match: Optional[str] = Header(None)):
+    """Get a specific car by ID, served from the response cache when possible"""
     try:
-        car = await db.cars.find_one({"_id": ObjectId(car_id)})
-        if car:
-            return car_helper(car)
-        raise HTTPException(status_code=404, detail="Car not found")
+        car_id = car_key(car_id)
+        entry = await car_cache.get(car_id)
+        if entry is None:
+            version = car_cache.version()
+            car = await db.cars.find_one({"_id": ObjectId(car_id)})
+            if not car:
+                raise HTTPException(status_code=404, detail="Car not found")
+            entry = await car_cache.set(car_id, car_helper(car), version)
+        return respond(entry, if_none_match)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching car {car_id}: {str(e)}")
         raise HTTPException(status_code=400, detail="Invalid car ID")
 
+async def update_fields(car: UpdateCar) -> Dict[str, Any]:
+    """$set document for the fields provided on a partial update, raising LookupError for unknown types"""
+    update_data = car.dict(exclude_unset=True, exclude={"id"})  # Only get fields that were actually provided
+    if update_data.get("model") is not None:
+        update_data["modelkey"] = model_names.model_key(update_data["model"])
+
+    # Only validate transmission type if it's being updated
+    if car.transmissiontype is not None:
+        transmission_id = await transmissions.get_id(car.transmissiontype)
+        if transmission_id is None:
+            raise LookupError(f"Transmission type '{car.transmissiontype}' not found")
+        update_data["transmissionid"] = transmission_id
+    update_data.pop("transmissiontype", None)
+
+    # Only validate fuel type if it's being updated
+    if car.fueltype is not None:
+        fuel_type_id = await fueltypes.get_id(car.fueltype)
+        if fuel_type_id is None:
+            raise LookupError(f"Fuel type '{car.fueltype}' not found")
+        update_data["fueltypeid"] = fuel_type_id
+    update_data.pop("fueltype", None)
+    return update_data
+
+def check_batch(ids: Optional[List[str]], filters: Optional[CarFilter]):
+    """Reject batch requests that do not name exactly one of ids or a non-empty filter"""
+    if (ids is None) == (filters is None):
+        raise HTTPException(status_code=400, detail="Give either a list of cars or a filter")
+    if filters is not None and not filters.dict(exclude_none=True):
+        raise HTTPException(status_code=400, detail="The filter must set at least one field")
+    if ids is not None:
+        if len(ids) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} cars per batch")
+        if len(set(ids)) != len(ids):
+            raise HTTPException(status_code=400, detail="Each car may appear only once per batch")
+
+async def run_batch(ids: List[ObjectId], make_op) -> set:
+    """Run make_op(_id) for the given cars that exist as one unordered bulk_write in a
+    transaction, returning the ids that were found and written"""
+    async with await client.start_session() as session:
+        async with session.start_transaction():
+            found = {car["_id"] async for car in db.cars.find({"_id": {"$in": ids}}, {"_id": 1}, session=session)}
+            ops = [make_op(car_id) for car_id in ids if car_id in found]
+            if ops:
+                await db.cars.bulk_write(ops, ordered=False, session=session)
+    return found
+
+async def run_filtered(query: Dict[str, Any], write) -> List[ObjectId]:
+    """Run write(query, session), a single update_many or delete_many, in a snapshot
+    transaction and return the ids of the cars it matched.
+
+    The ids are read inside the same transaction with the same filter, so they are
+    exactly the cars written; a concurrent write to one of them aborts the transaction.
+    """
+    async with await client.start_session() as session:
+        async with session.start_transaction(read_concern=ReadConcern("snapshot")):
+            ids = [car["_id"] async for car in db.cars.find(query, {"_id": 1}, session=session).sort("_id", 1)]
+            if ids:
+                await write(query, session)
+    return ids
+
+def invalidate_cars(ids):
+    """Evict batch-written cars from the read caches"""
+    price_stats.invalidate()
+    return asyncio.gather(*(car_cache.invalidate(car_key(car_id)) for car_id in ids))
+
+@app.patch("/cars/batch", response_model=List[Dict[str, Any]], tags=["Cars"])
+async def update_cars(batch: CarBatchUpdate):
+    """Apply per-car partial updates, or one update to every car matching a filter, in one transaction"""
+    check_batch(None if batch.items is None else [item.id for item in batch.items], batch.filter)
+    try:
+        if batch.filter is not None:
+            if batch.update is None:
+                raise HTTPException(status_code=400, detail="A filtered update needs at least one field in update")
+            try:
+                update_data = await update_fields(batch.update)
+            except LookupError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            if not update_data:
+                raise HTTPException(status_code=400, detail="A filtered update needs at least one field in update")
+            found = await run_filtered(
+                await car_query(batch.filter),
+                lambda query, session: db.cars.update_many(query, car_update(update_data), session=session)
+            )
+            order = [str(car_id) for car_id in found]
+            outcomes = {car_id: {"id": car_id, "status": "updated"} for car_id in order}
+        else:
+            items, outcomes = [], {}
+            for item in batch.items:
+                if not ObjectId.is_valid(item.id):
+                    outcomes[item.id] = {"id": item.id, "status": "invalid", "detail": "Invalid car ID"}
+                    continue
+                try:
+                    update_data = await update_fields(item)
+                except LookupError as e:
+                    outcomes[item.id] = {"id": item.id, "status": "invalid", "detail": str(e)}
+                    continue
+                if not update_data:
+                    outcomes[item.id] = {"id": item.id, "status": "invalid", "detail": "No valid fields provided for update"}
+                    continue
+                items.append((ObjectId(item.id), update_data))
+
+            updates = dict(items)
+            found = await run_batch(list(updates), lambda car_id: UpdateOne({"_id": car_id}, car_update(updates[car_id])))
+            for car_id in updates:
+                outcomes[str(car_id)] = {"id": str(car_id), "status": "updated" if car_id in found else "not_found"}
+            order = [car_key(item.id) if ObjectId.is_valid(item.id) else item.id for item in batch.items]
+
+        await invalidate_cars(found)
+        await refresh_written(list(found))
+        logger.info(f"Batch updated {len(found)} cars")
+        return [outcomes[car_id] for car_id in order]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error batch updating cars: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error updating cars")
+
+@app.delete("/cars/batch", response_model=List[Dict[str, Any]], tags=["Cars"])
+async def delete_cars(batch: CarBatchDelete):
+    """Delete the listed cars, or every car matching a filter, in one transaction"""
+    check_batch(batch.ids, batch.filter)
+    try:
+        if batch.filter is not None:
+            found = await run_filtered(
+                await car_query(batch.filter),
+                lambda query, session: db.cars.delete_many(query, session=session)
+            )
+            order = [str(car_id) for car_id in found]
+        else:
+            ids = [ObjectId(car_id) for car_id in batch.ids if ObjectId.is_valid(car_id)]
+            found = await run_batch(ids, lambda car_id: DeleteOne({"_id": car_id}))
+            order = batch.ids
+
+        await invalidate_cars(found)
+        car_comparables.remove(str(car_id) for car_id in found)
+        logger.info(f"Batch deleted {len(found)} cars")
+        outcomes = []
+        for car_id in order:
+            if not ObjectId.is_valid(car_id):
+                outcomes.append({"id": car_id, "status": "invalid", "detail": "Invalid car ID"})
+            else:
+                outcomes.append({"id": car_id, "status": "deleted" if ObjectId(car_id) in found else "not_found"})
+        return outcomes
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error batch deleting cars: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error deleting cars")
+
 @app.put("/cars/{car_id}", response_model=Dict[str, Any], tags=["Cars"])
 async def update_car(
     car_id: str,
@@ -204,44 +669,29 @@ async def update_car(
 ):
     """Update a specific car with partial updates allowed"""
     try:
-        update_data = {}
-        car_dict = car.dict(exclude_unset=True)  # Only get fields that were actually provided
-
-        # Only validate transmission type if it's being updated
-        if car.transmissiontype is not None:
-            transmission = await db.transmissions.find_one(
-                {"transmissiontype": {"$regex": f"^{car.transmissiontype}$", "$options": "i"}}
-            )
-            if not transmission:
-                raise HTTPException(status_code=404, detail=f"Transmission type '{car.transmissiontype}' not found")
-            update_data["transmissionid"] = transmission["transmissionid"]
-            del car_dict["transmissiontype"]
-
-        # Only validate fuel type if it's being updated
-        if car.fueltype is not None:
-            fuel_type = await db.fueltype.find_one(
-                {"fueltype": {"$regex": f"^{car.fueltype}$", "$options": "i"}}
-            )
-            if not fuel_type:
-                raise HTTPException(status_code=404, detail=f"Fuel type '{car.fueltype}' not found")
-            update_data["fueltypeid"] = fuel_type["fueltypeid"]
-            del car_dict["fueltype"]
-
-        # Add any other fields that were provided
-        update_data.update(car_dict)
+        car_id = car_key(car_id)
+        try:
+            update_data = await update_fields(car)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
 
         if not update_data:
             raise HTTPException(status_code=400, detail="No valid fields provided for update")
 
         result = await db.cars.update_one(
             {"_id": ObjectId(car_id)},
-            {"$set": update_data}
+            car_update(update_data)
         )
+        await car_cache.invalidate(car_id)
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Car not found")
+        price_stats.invalidate()
             
         updated_car = await db.cars.find_one({"_id": ObjectId(car_id)})
+        await refresh_features([updated_car])
+        car_comparables.upsert([car_helper(updated_car)])
+        car_models.add([updated_car["model"]])
         logger.info(f"Updated car: {car_id}")
         return car_helper(updated_car)
     except HTTPException:
@@ -254,15 +704,97 @@ async def update_car(
 async def delete_car(car_id: str):
     """Delete a specific car"""
     try:
+        car_id = car_key(car_id)
         result = await db.cars.delete_one({"_id": ObjectId(car_id)})
+        await car_cache.invalidate(car_id)
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Car not found")
+        price_stats.invalidate()
+        car_comparables.remove([car_id])
         logger.info(f"Deleted car: {car_id}")
         return {"message": "Car deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting car {car_id}: {str(e)}")
         raise HTTPException(status_code=400, detail="Invalid car ID")
 
+@app.get("/cache/stats", tags=["Cars"])
+async def get_cache_stats():
+    """Hit, miss and invalidation counters of the single-car response cache"""
+    return car_cache.stats()
+
+@app.get("/cars/{car_id}/comparables", tags=["Cars"])
+async def get_comparables(
+    car_id: str,
+    k: int = Query(comparables.DEFAULT_K, ge=1, le=comparables.MAX_K, description="Number of cars to return")
+):
+    """The k cars of the same model and fuel type closest to a stored car in year, mileage, tax, mpg and engine size"""
+    if not ObjectId.is_valid(car_id):
+        raise HTTPException(status_code=400, detail="Invalid car ID")
+    index = car_comparables.require()
+    car_id = car_key(car_id)
+    try:
+        car = index.get(car_id)
+        if car is None:
+            # Created by another process since the last rebuild, or missing
+            doc = await db.cars.find_one({"_id": ObjectId(car_id)}, {"features": 0})
+            if doc is None:
+                raise HTTPException(status_code=404, detail="Car not found")
+            car = car_helper(doc)
+        return index.nearest(car, k, exclude=car_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error finding comparables for car {car_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error finding comparable cars")
+
+@app.post("/cars/comparables", tags=["Cars"])
+async def find_comparables(
+    car: ComparablesQuery,
+    k: int = Query(comparables.DEFAULT_K, ge=1, le=comparables.MAX_K, description="Number of cars to return")
+):
+    """The k stored cars of the given model and fuel type closest to the described car"""
+    index = car_comparables.require()
+    return index.nearest({**car.dict(), "fueltypeid": await fueltypes.get_id(car.fueltype)}, k)
+
+@app.get("/comparables/stats", tags=["Cars"])
+async def get_comparables_stats():
+    """Size of the comparables index and when it was last rebuilt"""
+    return car_comparables.require().stats()
+
+@app.get("/models/search", response_model=List[Dict[str, Any]], tags=["Models"])
+async def search_models(
+    q: str = Query(..., min_length=1, description="Part of a model name, possibly misspelt"),
+    limit: int = Query(model_names.DEFAULT_LIMIT, ge=1, le=model_names.MAX_LIMIT)
+):
+    """Models containing q or similar to it by trigrams, with the number of cars of each"""
+    try:
+        matches = await car_models.search(q, limit)
+        pipeline = [
+            {"$match": {"modelkey": {"$in": [key for key, _, _ in matches]}}},
+            {"$group": {"_id": "$modelkey", "cars": {"$sum": 1}}}
+        ]
+        counts = {doc["_id"]: doc["cars"] async for doc in db.cars.aggregate(pipeline)}
+        # Models whose last car was deleted since the names were loaded have no count
+        return [
+            {"model": name, "cars": counts[key], "similarity": score}
+            for key, name, score in matches if key in counts
+        ]
+    except Exception as e:
+        logger.error(f"Error searching models for {q!r}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error searching models")
+
+@app.get("/models/autocomplete", response_model=List[str], tags=["Models"])
+async def autocomplete_models(
+    prefix: str = Query(..., min_length=1, description="Start of a model name"),
+    limit: int = Query(model_names.DEFAULT_LIMIT, ge=1, le=model_names.MAX_LIMIT)
+):
+    """Model names starting with prefix, ignoring case and surrounding spaces, from the in-process name list"""
+    try:
+        return await car_models.complete(prefix, limit)
+    except Exception as e:
+        logger.error(f"Error completing model names for {prefix!r}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error completing model names")
+
 @app.get("/predict/mpg/{car_id}", tags=["Predictions"])
 async def predict_mpg(car_id: str):
     """Predict MPG for a specific car"""
@@ -282,4 +814,104 @@ async def predict_mpg(car_id: str):
         }
     except Exception as e:
         logger.error(f"Error predicting MPG for car {car_id}: {str(e)}")
-        raise HTTPException(status_code=500, detail="Error predicting MPG") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Error predicting MPG")
+
+@app.post("/predict/price", tags=["Predictions"])
+async def predict_price(cars: Union[CarFeatures, List[CarFeatures]]):
+    """Predict the price of one car or a list of cars"""
+    single = not isinstance(cars, list)
+    if single:
+        cars = [cars]
+    elif len(cars) > MAX_PREDICT_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PREDICT_BATCH_SIZE} cars per request")
+    try:
+        prices = await prediction.predict_prices([car.dict() for car in cars])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error predicting prices: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error predicting price")
+    results = [{"predicted_price": price} for price in prices]
+    return results[0] if single else results
+
+async def predict_stored_prices(ids: List[ObjectId]) -> List[Dict[str, Any]]:
+    """Score stored cars from their feature vectors: one read and one model call"""
+    cars, vectors = await car_features.load(prediction.feature_encoder(), ids)
+    prices = await prediction.predict_vectors(vectors)
+    return [
+        {"car_id": str(car_id), "actual_price": actual, "predicted_price": price}
+        for (car_id, actual), price in zip(cars, prices)
+    ]
+
+@app.get("/predict/price/{car_id}", tags=["Predictions"])
+async def predict_car_price(car_id: str):
+    """Predict the price of a stored car from its stored feature vector"""
+    try:
+        results = await predict_stored_prices([ObjectId(car_id)])
+        if not results:
+            raise HTTPException(status_code=404, detail="Car not found")
+        return results[0]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error predicting price for car {car_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error predicting price")
+
+@app.post("/predict/price/cars", tags=["Predictions"])
+async def predict_car_prices(car_ids: List[str]):
+    """Predict the prices of stored cars in one model call"""
+    if len(car_ids) > MAX_PREDICT_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PREDICT_BATCH_SIZE} cars per request")
+    invalid = [car_id for car_id in car_ids if not ObjectId.is_valid(car_id)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid car IDs: {invalid}")
+    try:
+        results = await predict_stored_prices([ObjectId(car_id) for car_id in car_ids])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error predicting prices for {len(car_ids)} cars: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error predicting price")
+    found = {result["car_id"] for result in results}
+    missing = [car_id for car_id in car_ids if car_id not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Cars not found: {missing}")
+    return results
+
+@app.post("/features/backfill", tags=["Predictions"])
+async def backfill_features(batch_size: int = Query(BACKFILL_BATCH_SIZE, ge=1, le=10000)):
+    """Compute and store feature vectors for every car without a current one"""
+    encoder = prediction.feature_encoder()
+    start = time.perf_counter()
+    try:
+        computed = await car_features.backfill(encoder, batch_size)
+    except Exception as e:
+        logger.error(f"Error backfilling feature vectors: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error backfilling feature vectors")
+    logger.info(f"Backfilled {computed} feature vectors")
+    return {"version": encoder.version, "computed": computed, "seconds": round(time.perf_counter() - start, 3)}
+
+@app.get("/stats/{dimension}", response_model=List[Dict[str, Any]], tags=["Statistics"])
+async def get_price_stats(dimension: str = Path(..., pattern=f"^({'|'.join(STATS_FIELDS)})$")):
+    """Count, average, median, min and max price per model, year, fuel type or transmission"""
+    try:
+        rows = await price_stats.get(dimension)
+        names = {"model": car_models, "fueltype": fueltypes, "transmission": transmissions}.get(dimension)
+        results = []
+        for row in rows:
+            value = row["_id"]
+            if names is not None and value is not None:
+                value = await names.get_name(value) or value
+            results.append({
+                "value": "Unknown" if value is None else str(value),
+                "count": row["count"],
+                "avg_price": row["avg_price"],
+                "median_price": row["median_price"],
+                "min_price": row["min_price"],
+                "max_price": row["max_price"]
+            })
+        # Models are grouped by modelkey and fuel types and transmissions by id; order by name like the SQL API
+        return sorted(results, key=lambda result: result["value"])
+    except Exception as e:
+        logger.error(f"Error computing {dimension} statistics: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error computing statistics")
@@ -0,0 +1,89 @@
+from typing import Any, Dict, List, Tuple
+import asyncio
+import os
+import time
+
+# Longest a cached aggregation is served, bounding how stale statistics get after
+# writes this process is not told about (other workers, replicate.py)
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "300"))
+
+# API dimension -> cars field it groups on
+STATS_FIELDS = {
+    "model": "modelkey",
+    "year": "year",
+    "fueltype": "fueltypeid",
+    "transmission": "transmissionid"
+}
+
+
+def price_stats_pipeline(field: str) -> List[Dict[str, Any]]:
+    """$group pipeline for count, average, median, min and max price per value of field.
+
+    Prices are pushed in sorted order and the median read from the middle of the
+    array (averaging the two middle values for even counts), which works on servers
+    older than MongoDB 7's $median.
+    """
+    return [
+        {"$sort": {"price": 1}},
+        {"$group": {
+            "_id": f"${field}",
+            "count": {"$sum": 1},
+            "avg_price": {"$avg": "$price"},
+            "min_price": {"$min": "$price"},
+            "max_price": {"$max": "$price"},
+            "prices": {"$push": "$price"}
+        }},
+        {"$project": {
+            "_id": 1,
+            "count": 1,
+            "avg_price": {"$round": ["$avg_price", 2]},
+            "min_price": 1,
+            "max_price": 1,
+            "median_price": {"$avg": [
+                {"$arrayElemAt": ["$prices", {"$floor": {"$divide": [{"$subtract": ["$count", 1]}, 2]}}]},
+                {"$arrayElemAt": ["$prices", {"$ceil": {"$divide": [{"$subtract": ["$count", 1]}, 2]}}]}
+            ]}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+class StatsCache:
+    """Aggregation results per dimension, kept until the next write to cars or the TTL.
+
+    invalidate() bumps a generation counter, so a result computed while a write
+    landed is returned to its caller but not cached. Writes made elsewhere
+    (other workers, replicate.py) are picked up once the entry expires.
+    """
+
+    def __init__(self, collection, ttl: float = STATS_CACHE_TTL_SECONDS):
+        self.collection = collection
+        self.ttl = ttl
+        self.results: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        self.generation = 0
+        self.lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.generation += 1
+        self.results = {}
+
+    def _cached(self, dimension: str):
+        entry = self.results.get(dimension)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[1]
+        return None
+
+    async def get(self, dimension: str) -> List[Dict[str, Any]]:
+        rows = self._cached(dimension)
+        if rows is not None:
+            return rows
+        async with self.lock:
+            rows = self._cached(dimension)
+            if rows is not None:
+                return rows
+            generation = self.generation
+            pipeline = price_stats_pipeline(STATS_FIELDS[dimension])
+            rows = await self.collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+            if generation == self.generation:
+                self.results[dimension] = (time.monotonic() + self.ttl, rows)
+            return rows
@@ -0,0 +1,140 @@
+import argparse
+import csv
+import json
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+import servers
+
+sys.path.insert(0, servers.SHARED_DIR)
+
+import comparables  # noqa: E402
+import prediction  # noqa: E402
+from preprocessing import FeatureEncoder  # noqa: E402
+
+
+def read_cars(csv_path: str, scale: int, seed: int):
+    """ford.csv as SQL API records, repeated scale times with jittered mileage"""
+    rng = random.Random(seed)
+    fueltypes = {}
+    base = []
+    with open(csv_path, newline='') as f:
+        for row in csv.DictReader(f):
+            base.append({
+                "model": row["model"],
+                "year": int(row["year"]),
+                "price": float(row["price"]),
+                "mileage": int(row["mileage"]),
+                "tax": int(row["tax"]),
+                "mpg": float(row["mpg"]),
+                "enginesize": float(row["engineSize"]),
+                "fueltypeid": fueltypes.setdefault(row["fuelType"], len(fueltypes) + 1)
+            })
+    cars = []
+    for copy in range(scale):
+        for car in base:
+            mileage = car["mileage"] if copy == 0 else max(0, int(car["mileage"] * rng.uniform(0.8, 1.2)))
+            cars.append({**car, "carid": len(cars) + 1, "mileage": mileage})
+    return cars
+
+
+def timed(fn, queries):
+    """Microseconds per call of fn(car) over queries, and the results"""
+    samples, results = [], []
+    for car in queries:
+        start = time.perf_counter()
+        results.append(fn(car))
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "p50_us": round(statistics.median(samples), 1),
+        "p95_us": round(samples[int(len(samples) * 0.95) - 1], 1),
+        "mean_us": round(statistics.fmean(samples), 1)
+    }, results
+
+
+def run(csv_path: str, scale: int, queries: int, k: int, writes: int, seed: int):
+    rng = random.Random(seed)
+    encoder = FeatureEncoder.load(prediction.MODEL_DIR)
+    cars = read_cars(csv_path, scale, seed)
+
+    start = time.perf_counter()
+    index = comparables.ComparablesIndex(encoder, "carid", cars)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # Baselines: every car's scaled features in one matrix, and one matrix per partition
+    keys = [index.partition_key(car) for car in cars]
+    ids = np.array([car["carid"] for car in cars])
+    matrix = index.points(cars)
+    partitions = {}
+    for position, key in enumerate(keys):
+        partitions.setdefault(key, []).append(position)
+    partitions = {key: (ids[positions], matrix[positions]) for key, positions in partitions.items()}
+    key_codes = {key: code for code, key in enumerate(partitions)}
+    codes = np.array([key_codes[key] for key in keys])
+
+    def scan_all(car):
+        point = index.points([car])[0]
+        mask = (codes == key_codes[index.partition_key(car)]) & (ids != car["carid"])
+        distances = np.linalg.norm(matrix[mask] - point, axis=1)
+        return np.sort(distances)[:k]
+
+    def scan_partition(car):
+        point = index.points([car])[0]
+        part_ids, points = partitions[index.partition_key(car)]
+        distances = np.linalg.norm(points - point, axis=1)[part_ids != car["carid"]]
+        return np.partition(distances, min(k, len(distances) - 1))[:k] if len(distances) > k else distances
+
+    def indexed(car):
+        return index.nearest(car, k, exclude=car["carid"])
+
+    sample = rng.sample(cars, queries)
+    results = {}
+    results["scan_all"], expected = timed(scan_all, sample)
+    results["scan_partition"], _ = timed(scan_partition, sample)
+    results["kd_tree"], found = timed(indexed, sample)
+    mismatches = sum(
+        not np.allclose(sorted(row["distance"] for row in rows), want)
+        for rows, want in zip(found, expected)
+    )
+
+    # The same queries after `writes` cars moved, with writes pending in the partitions
+    start = time.perf_counter()
+    for car in rng.sample(cars, writes):
+        index.upsert({**car, "mileage": int(car["mileage"] * rng.uniform(0.5, 1.5))})
+    upsert_us = (time.perf_counter() - start) * 1e6 / writes
+    results["kd_tree_after_writes"], _ = timed(indexed, sample)
+
+    return {
+        "cars": len(cars),
+        "partitions": len(index.partitions),
+        "largest_partition": max(len(part_ids) for part_ids, _ in partitions.values()),
+        "k": k,
+        "build_ms": round(build_ms, 1),
+        "upsert_us": round(upsert_us, 1),
+        "pending_after_writes": index.stats()["pending"],
+        "mismatches": mismatches,
+        "queries": results
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparables index query latency against brute-force scans")
+    parser.add_argument("--csv", default=servers.CSV_PATH)
+    parser.add_argument("--scale", type=int, default=1, help="Copies of ford.csv to index, with jittered mileage")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("-k", type=int, default=comparables.DEFAULT_K)
+    parser.add_argument("--writes", type=int, default=1000, help="Cars moved before the last measurement")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    result = run(args.csv, args.scale, args.queries, args.k, args.writes, args.seed)
+    for name, timing in result["queries"].items():
+        print(f"{name:>22}: p50 {timing['p50_us']:,.1f} us, p95 {timing['p95_us']:,.1f} us")
+    print(json.dumps(result, indent=2))
+    if result["mismatches"]:
+        sys.exit(1)
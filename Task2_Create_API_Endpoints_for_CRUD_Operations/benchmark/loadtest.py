@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+import servers
+
+SCENARIOS = ["create", "read", "list", "update", "predict", "delete"]
+APIS = ["sql", "mongo"]
+# Field holding a car's id in each API's responses
+ID_FIELDS = {"sql": "carid", "mongo": "id"}
+# Keyset pages are walked in price order, the deepest query shape the list endpoint serves
+LIST_SORT = "price"
+
+logger = logging.getLogger(__name__)
+
+
+def read_cars(csv_path):
+    """ford.csv rows as POST /cars/ payloads"""
+    with open(csv_path, newline='') as f:
+        return [
+            {
+                "model": row["model"],
+                "year": int(row["year"]),
+                "price": float(row["price"]),
+                "mileage": int(row["mileage"]),
+                "tax": int(row["tax"]),
+                "mpg": float(row["mpg"]),
+                "enginesize": float(row["engineSize"]),
+                "transmissiontype": row["transmission"],
+                "fueltype": row["fuelType"]
+            }
+            for row in csv.DictReader(f)
+        ]
+
+
+def features(car):
+    return {key: value for key, value in car.items() if key != "price"}
+
+
+def summarize(latencies, errors, elapsed):
+    """Throughput and latency percentiles, in milliseconds, for one scenario.
+
+    Percentiles need two samples and are None with fewer; the mean and max need one.
+    """
+    ms = lambda seconds: round(seconds * 1000, 3)  # noqa: E731
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) >= 2 else None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_ms": ms(statistics.fmean(latencies)) if latencies else None,
+        "p50_ms": ms(cuts[49]) if cuts else None,
+        "p95_ms": ms(cuts[94]) if cuts else None,
+        "p99_ms": ms(cuts[98]) if cuts else None,
+        "max_ms": ms(max(latencies)) if latencies else None
+    }
+
+
+async def measure(client, requests, concurrency):
+    """Send (method, url, params, body) requests from concurrency workers.
+
+    Returns the scenario summary and the successful responses' JSON bodies.
+    """
+    pending = iter(requests)
+    latencies, bodies = [], []
+    failures = []
+
+    async def worker():
+        for method, url, params, body in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, params=params, json=body)
+            except httpx.HTTPError as e:
+                latencies.append(time.perf_counter() - start)
+                failures.append(f"{method} {url}: {e!r}")
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                failures.append(f"{method} {url}: {response.status_code} {response.text[:200]}")
+            else:
+                bodies.append(response.json())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    for failure in failures[:3]:
+        logger.warning(failure)
+    return summarize(latencies, len(failures), elapsed), bodies
+
+
+async def walk_pages(client, page_size, pages):
+    """Follow X-Next-Cursor for up to pages pages; returns the cursors and the cars seen"""
+    cursors, cars = [], []
+    cursor = None
+    for _ in range(pages):
+        params = {"limit": page_size, "sort": LIST_SORT}
+        if cursor is not None:
+            params["cursor"] = cursor
+        response = await client.get("/cars/", params=params)
+        response.raise_for_status()
+        cars.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        cursors.append(cursor)
+    return cursors, cars
+
+
+def median(values):
+    """Median of the values that are not None, or None if there are none"""
+    values = [value for value in values if value is not None]
+    return statistics.median(values) if values else None
+
+
+def combine(rounds):
+    """Per-metric median of each scenario's summaries over rounds, keeping the most errors seen"""
+    combined = {}
+    for scenario in rounds[0]:
+        summaries = [results[scenario] for results in rounds if scenario in results]
+        combined[scenario] = {
+            key: max(s[key] for s in summaries) if key == "errors" else median(s[key] for s in summaries)
+            for key in summaries[0]
+        }
+    return combined
+
+
+def cycle(items, count):
+    """count items, repeating items in order; empty if there are none to repeat"""
+    return [items[i % len(items)] for i in range(count)] if items else []
+
+
+async def run_scenarios(api, base_url, cars, args):
+    """Run the selected scenarios in order against one API and return their summaries"""
+    id_field = ID_FIELDS[api]
+    n = args.requests
+    payloads = cycle(cars, n)
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits, trust_env=False) as client:
+        cursors, listed = await walk_pages(client, args.page_size, n // args.page_size + 1)
+        listed_ids = [car[id_field] for car in listed]
+
+        # Warm connections, the model and the per-route code paths; untimed
+        await measure(client, (
+            cycle([("GET", f"/cars/{car_id}", None, None) for car_id in listed_ids[-args.warmup:]], args.warmup)
+            + cycle([("POST", "/predict/price", None, features(car)) for car in payloads], args.warmup)
+            + [("GET", "/cars/", {"limit": args.page_size, "sort": LIST_SORT}, None)] * args.warmup
+        ), args.concurrency)
+
+        creates = [("POST", "/cars/", None, car) for car in payloads]
+        if "create" in args.scenarios:
+            results["create"], created = await measure(client, creates, args.concurrency)
+        elif "update" in args.scenarios or "delete" in args.scenarios:
+            _, created = await measure(client, creates, args.concurrency)
+        else:
+            created = []
+        created_ids = [car[id_field] for car in created]
+
+        if "read" in args.scenarios and not listed_ids:
+            logger.warning(f"{api}: no cars to read; skipping the read scenario")
+        elif "read" in args.scenarios:
+            results["read"], _ = await measure(client, [
+                ("GET", f"/cars/{car_id}", None, None) for car_id in cycle(listed_ids, n)
+            ], args.concurrency)
+
+        if "list" in args.scenarios and not cursors:
+            logger.warning(f"{api}: fewer than {args.page_size} cars, so no next-page cursor; skipping the list scenario")
+        elif "list" in args.scenarios:
+            results["list"], _ = await measure(client, [
+                ("GET", "/cars/", {"limit": args.page_size, "sort": LIST_SORT, "cursor": cursor}, None)
+                for cursor in cycle(cursors, n)
+            ], args.concurrency)
+
+        if "update" in args.scenarios and created_ids:
+            results["update"], _ = await measure(client, [
+                ("PUT", f"/cars/{car_id}", None, {"price": car["price"] + 100, "mileage": car["mileage"] + 1})
+                for car_id, car in zip(created_ids, payloads)
+            ], args.concurrency)
+
+        if "predict" in args.scenarios:
+            results["predict"], _ = await measure(client, [
+                ("POST", "/predict/price", None, features(car)) for car in payloads
+            ], args.concurrency)
+
+        # Deleting what this run created keeps a reused database the same size between runs
+        deletes = [("DELETE", f"/cars/{car_id}", None, None) for car_id in created_ids]
+        if "delete" in args.scenarios and deletes:
+            results["delete"], _ = await measure(client, deletes, args.concurrency)
+        elif deletes:
+            await measure(client, deletes, args.concurrency)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against baseline: p95 latency up, or throughput down, by more than tolerance, or new errors"""
+    regressions = []
+    for api, scenarios in baseline["apis"].items():
+        for scenario, base in scenarios.items():
+            current = results["apis"].get(api, {}).get(scenario)
+            if current is None:
+                continue
+            name = f"{api} {scenario}"
+            if None not in (current["p95_ms"], base["p95_ms"]) and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {current['p95_ms']:.1f} ms vs baseline {base['p95_ms']:.1f} ms")
+            if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{name}: {current['throughput_rps']:.0f} req/s vs baseline {base['throughput_rps']:.0f} req/s"
+                )
+            if current["errors"] > base["errors"]:
+                regressions.append(f"{name}: {current['errors']} errors vs baseline {base['errors']}")
+    return regressions
+
+
+def start_servers(args, workdir):
+    """Start the API servers the run needs; returns ({api: base URL}, processes, backends)"""
+    urls, processes, backends = {}, [], {}
+    if "sql" in args.apis:
+        if args.sql_url:
+            urls["sql"], backends["sql"] = args.sql_url, "external"
+        else:
+            database_url = args.database_url
+            backends["sql"] = "postgres"
+            if not database_url:
+                database_url = servers.start_postgres(args.pgdata)
+                backends["sql"] = "pgserver"
+            if args.seed or not args.database_url:
+                servers.seed_postgres(database_url, args.csv)
+            process, urls["sql"] = servers.start_api(
+                "sql", {"DATABASE_URL": database_url, "STATS_REFRESH_SECONDS": "0"}, workdir
+            )
+            processes.append(process)
+    if "mongo" in args.apis:
+        if args.mongo_url:
+            urls["mongo"], backends["mongo"] = args.mongo_url, "external"
+        elif args.mongodb_url:
+            process, urls["mongo"] = servers.start_api("mongo", {"MONGODB_URL": args.mongodb_url}, workdir)
+            processes.append(process)
+            backends["mongo"] = "mongod"
+        else:
+            csv_path = servers.head_csv(args.csv, args.mock_rows, os.path.join(workdir, "mock_cars.csv"))
+            process, urls["mongo"] = servers.start_api("mongo-mock", {"BENCH_CSV_PATH": csv_path}, workdir)
+            processes.append(process)
+            backends["mongo"] = "mongomock"
+    return urls, processes, backends
+
+
+def print_results(results):
+    cell = lambda value: f"{'-':>9}" if value is None else f"{value:>9.2f}"  # noqa: E731
+    print(f"{'api':<6} {'scenario':<8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for api, scenarios in results["apis"].items():
+        for scenario, s in scenarios.items():
+            print(f"{api:<6} {scenario:<8} {s['throughput_rps']:>9.1f} {cell(s['p50_ms'])} "
+                  f"{cell(s['p95_ms'])} {cell(s['p99_ms'])} {s['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the SQL and MongoDB car APIs against local databases")
+    parser.add_argument("--apis", nargs="+", choices=APIS, default=APIS)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once")
+    parser.add_argument("--rounds", type=int, default=1, help="Repeat the scenarios and report per-metric medians")
+    parser.add_argument("--warmup", type=int, default=50, help="Untimed requests per warm-up route")
+    parser.add_argument("--page-size", type=int, default=50, help="limit for the list scenario")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--csv", default=servers.CSV_PATH, help="Cars CSV used to seed and to build payloads")
+    parser.add_argument("--sql-url", help="Benchmark an already running SQL API at this base URL")
+    parser.add_argument("--mongo-url", help="Benchmark an already running MongoDB API at this base URL")
+    parser.add_argument("--database-url", help="Postgres to serve the SQL API from; default is a pgserver cluster")
+    parser.add_argument("--pgdata", default=os.path.join(tempfile.gettempdir(), "ford-bench-pgdata"),
+                        help="Data directory of the pgserver cluster, reused between runs")
+    parser.add_argument("--seed", action="store_true", help="Run setup.sql and load the CSV into --database-url")
+    parser.add_argument("--mongodb-url", help="MongoDB loaded with mongo_setup.py --load; default is in-memory mongomock")
+    parser.add_argument("--mock-rows", type=int, default=2000,
+                        help="CSV rows seeded into mongomock, which scans every document per query")
+    parser.add_argument("--workdir", help="Directory for server logs; default is a new temporary directory")
+    parser.add_argument("--output", help="Write the results JSON here")
+    parser.add_argument("--baseline", help="Results JSON to compare against; regressions exit with status 1")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed fractional p95 increase or throughput drop before a regression")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Also write the results JSON to PATH as the new baseline")
+    args = parser.parse_args()
+    if args.requests < 1 or args.concurrency < 1 or args.rounds < 1 or args.page_size < 1:
+        parser.error("--requests, --concurrency, --rounds and --page-size must be at least 1")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    for noisy in ("httpx", "pgserver"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ford-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    logger.info(f"Server logs in {workdir}")
+
+    cars = read_cars(args.csv)
+    urls, processes, backends = start_servers(args, workdir)
+    try:
+        apis = {}
+        for api, base_url in urls.items():
+            logger.info(f"Benchmarking {api} API at {base_url}")
+            apis[api] = combine([asyncio.run(run_scenarios(api, base_url, cars, args)) for _ in range(args.rounds)])
+    finally:
+        for process in processes:
+            servers.stop_api(process)
+
+    results = {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "rounds": args.rounds,
+            "page_size": args.page_size,
+            "mock_rows": args.mock_rows if backends.get("mongo") == "mongomock" else None,
+            "backends": backends
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "apis": apis
+    }
+    print_results(results)
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            logger.warning("Baseline was recorded with different settings; comparison may not be meaningful")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""The MongoDB API served from an in-memory mongomock database seeded from ford.csv.
+
+loadtest.py runs this with `uvicorn --app-dir benchmark mock_mongo_app:app` when no
+MONGODB_URL is given, so the suite needs no MongoDB server. mongomock executes
+queries in Python, so absolute numbers are far below a real mongod; use it to
+compare runs with each other, not with production.
+"""
+import os
+import sys
+
+import mongomock
+import motor.motor_asyncio
+from mongomock_motor import AsyncMongoMockClient
+
+from servers import API_DIRS, CSV_PATH, TASK1_DIR
+
+sys.path[:0] = [API_DIRS["mongo"], TASK1_DIR]
+
+import mongo_setup
+
+store = mongomock.MongoClient()
+mongo_setup.create_indexes(store["ford-data"])
+# mongomock ignores partialFilterExpression, so the unique carid index would admit
+# only one document without a carid
+store["ford-data"].cars.drop_index("carid_unique")
+mongo_setup.seed_dimensions(store["ford-data"])
+mongo_setup.load_cars(store["ford-data"], os.getenv("BENCH_CSV_PATH", CSV_PATH))
+
+
+class SeededClient(AsyncMongoMockClient):
+    """AsyncIOMotorClient stand-in that serves the seeded store and ignores connection options"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(mock_mongo_client=store)
+
+
+motor.motor_asyncio.AsyncIOMotorClient = SeededClient
+
+import main  # noqa: E402
+
+app = main.app
@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+import httpx
+
+import servers
+
+# GET /cars/ variants compared: the response_model path, the fast path with every
+# field, and the fast path with a three-field projection
+MODES = {
+    "sql": {"default": None, "fast": "carid,model,year,price,mileage,tax,mpg,enginesize,transmissionid,fueltypeid",
+            "fast_projected": "carid,model,price"},
+    "mongo": {"default": None, "fast": "id,model,year,price,mileage,tax,mpg,enginesize,transmissionid,fueltypeid",
+              "fast_projected": "id,model,price"}
+}
+
+
+async def cpu_per_1k_rows(app, fields, limit, pages):
+    """Process CPU milliseconds spent per 1,000 listed cars, paging with X-Next-Cursor.
+
+    The app is called in process through httpx's ASGI transport, so the figure
+    covers routing, the driver's row decoding, serialization and the client, and
+    excludes the database server.
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        bodies = []
+        cursor = None
+        start = time.process_time()
+        for _ in range(pages):
+            params = {"limit": limit}
+            if fields:
+                params["fields"] = fields
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get("/cars/", params=params)
+            response.raise_for_status()
+            bodies.append(response.content)
+            cursor = response.headers.get("X-Next-Cursor")
+        elapsed = time.process_time() - start
+    rows = sum(len(json.loads(body)) for body in bodies)
+    return elapsed * 1000 / rows * 1000
+
+
+class PageCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def skip(self, count):
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length=None):
+        # Fresh dicts, as the driver decodes a new document for every row
+        return [dict(doc) for doc in self.docs]
+
+
+class PageCollection:
+    """Stand-in for db.cars answering every find() with the same decoded documents.
+
+    Without a MongoDB server, mongomock would spend far more CPU executing each
+    query than the API spends on the rows, hiding the difference being measured.
+    Projections are applied once per distinct projection, outside the timed loop.
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.projected = {}
+
+    def find(self, query=None, projection=None):
+        key = tuple(sorted(projection.items())) if projection else None
+        if key not in self.projected:
+            self.projected[key] = [
+                {field: value for field, value in doc.items() if projection.get(field)}
+                for doc in self.docs
+            ] if projection else self.docs
+        return PageCursor(self.projected[key])
+
+
+def run_worker(api, limit, pages, repeats):
+    """Measure every mode against one API in this interpreter and print the results as JSON"""
+    if api == "sql":
+        sys.path.insert(0, servers.API_DIRS["sql"])
+        import main
+    elif os.getenv("MONGODB_URL"):
+        sys.path.insert(0, servers.API_DIRS["mongo"])
+        import main
+    else:
+        import mock_mongo_app
+        main = mock_mongo_app.main
+        docs = list(mock_mongo_app.store["ford-data"].cars.find().sort("_id", 1).limit(limit))
+        main.db = types.SimpleNamespace(cars=PageCollection(docs))
+
+    async def measure():
+        modes = MODES[api]
+        for fields in modes.values():
+            await cpu_per_1k_rows(main.app, fields, limit, 2)
+        samples = {mode: [] for mode in modes}
+        # Interleave the modes so drift in machine load hits them all alike
+        for _ in range(repeats):
+            for mode, fields in modes.items():
+                samples[mode].append(await cpu_per_1k_rows(main.app, fields, limit, pages))
+        return {mode: statistics.median(values) for mode, values in samples.items()}
+
+    print(json.dumps({"api": api, "cpu_ms_per_1k_rows": asyncio.run(measure())}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU per 1,000 rows of GET /cars/ with and without the fast JSON path")
+    parser.add_argument("--apis", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--limit", type=int, default=100, help="Page size (the MongoDB API allows at most 100)")
+    parser.add_argument("--pages", type=int, default=50, help="Pages listed per measurement")
+    parser.add_argument("--repeats", type=int, default=5, help="Measurements per mode; the median is reported")
+    parser.add_argument("--mock-rows", type=int, default=2000, help="CSV rows seeded into mongomock")
+    parser.add_argument("--mongodb-url", help="MongoDB loaded with mongo_setup.py --load; default serves fixed pages in process")
+    parser.add_argument("--database-url", help="Seeded Postgres for the SQL API; default is a pgserver cluster")
+    parser.add_argument("--pgdata", default=os.path.join(tempfile.gettempdir(), "ford-bench-pgdata"))
+    parser.add_argument("--worker", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.limit, args.pages, args.repeats)
+        sys.exit(0)
+
+    workdir = tempfile.mkdtemp(prefix="ford-bench-")
+    env = {
+        **os.environ,
+        "FAST_RESPONSES": "false",
+        "BENCH_CSV_PATH": servers.head_csv(servers.CSV_PATH, args.mock_rows, os.path.join(workdir, "mock_cars.csv"))
+    }
+    env.pop("MONGODB_URL", None)
+    if args.mongodb_url:
+        env["MONGODB_URL"] = args.mongodb_url
+    if "sql" in args.apis:
+        env["DATABASE_URL"] = args.database_url
+        if not args.database_url:
+            env["DATABASE_URL"] = servers.start_postgres(args.pgdata)
+            servers.seed_postgres(env["DATABASE_URL"])
+
+    results = {}
+    for api in args.apis:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", api, "--limit", str(args.limit),
+             "--pages", str(args.pages), "--repeats", str(args.repeats)],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        results[api] = json.loads(output.strip().splitlines()[-1])["cpu_ms_per_1k_rows"]
+
+    for api, modes in results.items():
+        default = modes["default"]
+        print(f"{api:>5}: " + ", ".join(
+            f"{mode} {cpu:,.1f} ms/1k rows ({default / cpu:.2f}x)" for mode, cpu in modes.items()
+        ))
+    print(json.dumps(results, indent=2))
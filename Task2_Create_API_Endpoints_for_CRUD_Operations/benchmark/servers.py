@@ -0,0 +1,120 @@
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIRS = {
+    "sql": os.path.join(BENCH_DIR, "..", "api"),
+    "mongo": os.path.join(BENCH_DIR, "..", "api_mongo")
+}
+SHARED_DIR = os.path.join(BENCH_DIR, "..", "shared")
+TASK1_DIR = os.path.join(BENCH_DIR, "..", "..", "Task1_Create_a_Database_in_SQL_and_Mongo")
+CSV_PATH = os.path.join(BENCH_DIR, "..", "..", "Data", "ford.csv")
+
+logger = logging.getLogger(__name__)
+
+
+def start_postgres(pgdata: str) -> str:
+    """Start (or reuse) a throwaway Postgres cluster in pgdata and return its URL.
+
+    Uses the pgserver package, which ships the Postgres binaries in its wheel, so
+    nothing needs to be installed system-wide and no network access is required.
+    The server is stopped when this interpreter exits.
+    """
+    import pgserver
+
+    server = pgserver.get_server(pgdata, cleanup_mode="stop")
+    return server.get_uri()
+
+
+def seed_postgres(database_url: str, csv_path: str = CSV_PATH):
+    """Create the schema from setup.sql and COPY csv_path into Cars, unless Cars already exists"""
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('cars') IS NOT NULL")
+            if cur.fetchone()[0]:
+                logger.info("Cars table already exists; skipping seed")
+                return
+            with open(os.path.join(TASK1_DIR, "setup.sql")) as f:
+                cur.execute(f.read())
+
+        sys.path.insert(0, TASK1_DIR)
+        import sql_ingest
+        sql_ingest.ingest(conn, csv_path)
+        with conn, conn.cursor() as cur:
+            cur.execute("REFRESH MATERIALIZED VIEW carpricestats")
+            cur.execute("ANALYZE")
+    finally:
+        conn.close()
+
+
+def head_csv(csv_path: str, rows: int, out_path: str) -> str:
+    """Copy the header and first rows lines of csv_path to out_path"""
+    with open(csv_path, newline='') as src, open(out_path, "w", newline='') as dst:
+        dst.writelines(line for _, line in zip(range(rows + 1), src))
+    return out_path
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_api(kind: str, env: dict, workdir: str) -> tuple:
+    """Serve one API with uvicorn on a free local port; returns (process, base URL).
+
+    kind "sql" serves api/main.py; "mongo" serves api_mongo/main.py against
+    MONGODB_URL from env, and "mongo-mock" against an in-memory mongomock
+    database (see mock_mongo_app.py). Server output goes to workdir/<kind>.log.
+    """
+    if kind == "mongo-mock":
+        app, app_dir = "mock_mongo_app:app", BENCH_DIR
+    else:
+        app, app_dir = "main:app", API_DIRS[kind]
+    port = free_port()
+    log = open(os.path.join(workdir, f"{kind}.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--app-dir", app_dir,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(process, base_url)
+    except Exception:
+        stop_api(process)
+        raise
+    return process, base_url
+
+
+def wait_until_ready(process, base_url: str, timeout: float = 120.0):
+    """Poll /metrics until the server answers; startup loads the model and, for the mock, the CSV"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode}; see its log in the work directory")
+        try:
+            if httpx.get(f"{base_url}/metrics", timeout=1.0, trust_env=False).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise TimeoutError(f"API server at {base_url} did not start within {timeout:.0f}s")
+
+
+def stop_api(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
@@ -0,0 +1,245 @@
+from fastapi import HTTPException
+from scipy.spatial import cKDTree
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+import prediction
+from preprocessing import NUMERICAL_FEATURES
+
+DEFAULT_K = 10
+MAX_K = 100
+# Seconds between rebuilds from the database, which pick up cars written by other
+# processes; 0 disables them
+COMPARABLES_REFRESH_SECONDS = float(os.getenv("COMPARABLES_REFRESH_SECONDS", "300"))
+# Cars written since a partition's tree was built that queries scan linearly;
+# one more rebuilds the tree
+COMPARABLES_PENDING_LIMIT = int(os.getenv("COMPARABLES_PENDING_LIMIT", "64"))
+
+logger = logging.getLogger(__name__)
+
+Record = Dict[str, Any]
+
+
+class Partition:
+    """Scaled features of the cars of one model and fuel type.
+
+    A KD-tree covers the cars present when it was built. Cars added, changed or
+    removed since are `pending`: their tree entries are skipped and their current
+    points are compared one by one, until there are enough of them to rebuild.
+    """
+
+    def __init__(self, points: Dict[Hashable, np.ndarray]):
+        self.points = points
+        self.build()
+
+    def build(self):
+        self.tree_ids = list(self.points)
+        self.tree = cKDTree(np.array([self.points[car_id] for car_id in self.tree_ids])) if self.tree_ids else None
+        self.pending = set()
+
+    def changed(self, car_id):
+        self.pending.add(car_id)
+        if len(self.pending) > COMPARABLES_PENDING_LIMIT:
+            self.build()
+
+    def set(self, car_id, point: np.ndarray):
+        self.points[car_id] = point
+        self.changed(car_id)
+
+    def discard(self, car_id):
+        if self.points.pop(car_id, None) is not None:
+            self.changed(car_id)
+
+    def nearest(self, point: np.ndarray, k: int, exclude=None) -> List[Tuple[float, Any]]:
+        """(distance, id) of the k cars closest to point, nearest first"""
+        found = []
+        if self.tree is not None:
+            # Fetch enough extra neighbours to make up for skipped entries
+            count = min(len(self.tree_ids), k + len(self.pending) + 1)
+            distances, positions = self.tree.query(point, k=count)
+            for distance, position in zip(np.atleast_1d(distances), np.atleast_1d(positions)):
+                car_id = self.tree_ids[position]
+                if car_id not in self.pending and car_id != exclude:
+                    found.append((float(distance), car_id))
+        pending = [car_id for car_id in self.pending if car_id in self.points and car_id != exclude]
+        if pending:
+            distances = np.linalg.norm(np.array([self.points[car_id] for car_id in pending]) - point, axis=1)
+            found.extend(zip(distances.tolist(), pending))
+        found.sort(key=lambda item: item[0])
+        return found[:k]
+
+
+class ComparablesIndex:
+    """Nearest-neighbour index of cars, partitioned by model and fuel type.
+
+    Cars are compared on year, mileage, tax, mpg and engine size, scaled with the
+    price model's scaler so that each counts alike. Model names match ignoring
+    case and surrounding whitespace. Records are kept as the API returns them,
+    keyed by their `id_field`, so queries are answered from memory.
+    """
+
+    def __init__(self, encoder, id_field: str, cars: Iterable[Record] = ()):
+        self.encoder = encoder
+        self.id_field = id_field
+        self.cars: Dict[Hashable, Tuple[Tuple, Record]] = {}
+        self.partitions: Dict[Tuple, Partition] = {}
+        # Ids written since track() was called, for carry_over()
+        self.touched: Optional[set] = None
+        self.built_at = time.time()
+        groups: Dict[Tuple, List[Record]] = {}
+        for car in cars:
+            key = self.partition_key(car)
+            self.cars[car[id_field]] = (key, car)
+            groups.setdefault(key, []).append(car)
+        for key, group in groups.items():
+            self.partitions[key] = Partition(dict(zip([car[id_field] for car in group], self.points(group))))
+
+    def partition_key(self, car: Record) -> Tuple:
+        return self.encoder.normalize(car.get("model")), car.get("fueltypeid")
+
+    def points(self, cars: List[Record]) -> np.ndarray:
+        """Scaled numerical features, one row per car; a missing value counts as the mean"""
+        raw = np.array([[car.get(name) for name in NUMERICAL_FEATURES] for car in cars], dtype=np.float64)
+        return np.nan_to_num((raw - self.encoder.mean) / self.encoder.scale)
+
+    def get(self, car_id) -> Optional[Record]:
+        entry = self.cars.get(car_id)
+        return None if entry is None else entry[1]
+
+    def upsert(self, car: Record):
+        car_id = car[self.id_field]
+        self.remove(car_id)
+        key = self.partition_key(car)
+        self.cars[car_id] = (key, car)
+        point = self.points([car])[0]
+        if key in self.partitions:
+            self.partitions[key].set(car_id, point)
+        else:
+            self.partitions[key] = Partition({car_id: point})
+
+    def remove(self, car_id):
+        if self.touched is not None:
+            self.touched.add(car_id)
+        entry = self.cars.pop(car_id, None)
+        if entry is None:
+            return
+        partition = self.partitions[entry[0]]
+        partition.discard(car_id)
+        if not partition.points:
+            del self.partitions[entry[0]]
+
+    def nearest(self, car: Record, k: int = DEFAULT_K, exclude=None) -> List[Record]:
+        """The k cars of car's model and fuel type closest to it, with their distance"""
+        partition = self.partitions.get(self.partition_key(car))
+        if partition is None:
+            return []
+        return [
+            {**self.cars[car_id][1], "distance": distance}
+            for distance, car_id in partition.nearest(self.points([car])[0], k, exclude)
+        ]
+
+    def track(self):
+        self.touched = set()
+
+    def carry_over(self, previous: "ComparablesIndex"):
+        """Apply the writes previous received since its track() call"""
+        for car_id in previous.touched or ():
+            car = previous.get(car_id)
+            if car is None:
+                self.remove(car_id)
+            else:
+                self.upsert(car)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cars": len(self.cars),
+            "partitions": len(self.partitions),
+            "pending": sum(len(partition.pending) for partition in self.partitions.values()),
+            "built_at": self.built_at
+        }
+
+
+class Comparables:
+    """The API's live ComparablesIndex: built at startup, kept up to date by the
+    write endpoints and rebuilt every COMPARABLES_REFRESH_SECONDS.
+
+    load() returns every car as a record. A rebuild runs while requests are
+    served; writes the old index receives in the meantime are applied to the new
+    one before it replaces the old.
+    """
+
+    def __init__(self, load: Callable[[], Awaitable[List[Record]]], id_field: str):
+        self.load = load
+        self.id_field = id_field
+        self.index: Optional[ComparablesIndex] = None
+        self.refresher = None
+        self.lock = asyncio.Lock()
+
+    async def rebuild(self):
+        encoder = prediction.loaded_encoder()
+        if encoder is None:
+            return
+        async with self.lock:
+            previous = self.index
+            if previous is not None:
+                previous.track()
+            start = time.perf_counter()
+            try:
+                cars = await self.load()
+                index = await run_in_threadpool(ComparablesIndex, encoder, self.id_field, cars)
+                # No await from here on, so no write can land between the two steps
+                if previous is not None:
+                    index.carry_over(previous)
+                self.index = index
+            finally:
+                if previous is not None:
+                    previous.touched = None
+        logger.info(f"Built comparables index of {len(index.cars)} cars in {time.perf_counter() - start:.2f}s")
+
+    async def refresh_periodically(self):
+        while True:
+            await asyncio.sleep(COMPARABLES_REFRESH_SECONDS)
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"Error rebuilding comparables index: {str(e)}")
+
+    async def start(self):
+        """Build the index, then schedule rebuilds when COMPARABLES_REFRESH_SECONDS is set.
+
+        Needs the price model's scaler, so call it after prediction.start().
+        """
+        try:
+            await self.rebuild()
+        except Exception as e:
+            logger.error(f"Comparables index unavailable: {str(e)}")
+        if COMPARABLES_REFRESH_SECONDS > 0 and self.refresher is None:
+            self.refresher = asyncio.get_running_loop().create_task(self.refresh_periodically())
+
+    async def stop(self):
+        if self.refresher is not None:
+            self.refresher.cancel()
+            try:
+                await self.refresher
+            except asyncio.CancelledError:
+                pass
+            self.refresher = None
+
+    def require(self) -> ComparablesIndex:
+        if self.index is None:
+            raise HTTPException(status_code=503, detail="Comparables index is not available")
+        return self.index
+
+    def upsert(self, cars: Iterable[Record]):
+        if self.index is not None:
+            for car in cars:
+                self.index.upsert(car)
+
+    def remove(self, car_ids: Iterable[Any]):
+        if self.index is not None:
+            for car_id in car_ids:
+                self.index.remove(car_id)
@@ -0,0 +1,30 @@
+from decimal import Decimal
+from fastapi import Response
+from typing import Any, Dict, Iterable, Optional
+import orjson
+import os
+
+# true sends list and export bodies through orjson without per-item response model
+# validation; a request asking for ?fields= takes that path either way
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+
+def default(value: Any):
+    """Encode the driver types orjson does not know: Decimal as a number, anything else (ObjectId) as text"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=default)
+
+
+def ndjson(records: Iterable[Dict[str, Any]]) -> bytes:
+    """One JSON document per line"""
+    return b"".join(orjson.dumps(record, default=default, option=orjson.OPT_APPEND_NEWLINE) for record in records)
+
+
+def json_response(content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serialized body in a plain Response, bypassing FastAPI's response_model pass"""
+    return Response(content=dumps(content), media_type="application/json", headers=headers)
@@ -0,0 +1,120 @@
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+import asyncio
+import bisect
+import re
+import time
+
+CACHE_TTL_SECONDS = 300
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# pg_trgm's default pg_trgm.similarity_threshold, used by its % operator
+SIMILARITY_THRESHOLD = 0.3
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def model_key(name: Optional[str]) -> Optional[str]:
+    """The form model names are matched in: trimmed and lower-cased, like Cars.ModelKey"""
+    return None if name is None else name.strip().lower()
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """pg_trgm's trigrams of text: each word padded with two spaces before and one after"""
+    return frozenset(
+        padded[i:i + 3]
+        for word in _WORD.findall(text.lower())
+        for padded in (f"  {word} ",)
+        for i in range(len(padded) - 2)
+    )
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """pg_trgm's similarity() of two trigram sets: shared over distinct trigrams"""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class ModelNames:
+    """In-process sorted list of the distinct model names, for autocomplete.
+
+    load() returns (key, name) pairs, one per model_key(), with the spelling to
+    show. Prefix lookups are a binary search over the sorted keys, so they cost
+    the same however many cars there are. The list is read in full on first use
+    and again once the TTL has passed; names written through this process are
+    added straight away. Names whose last car was deleted stay until the reload.
+    """
+
+    def __init__(self, load: Callable[[], Awaitable[Iterable[Tuple[str, str]]]], ttl: float = CACHE_TTL_SECONDS):
+        self.load = load
+        self.ttl = ttl
+        self.expires = 0.0
+        self.keys: List[str] = []
+        self.names: List[str] = []
+        self.grams: Dict[str, FrozenSet[str]] = {}
+        self._lock = asyncio.Lock()
+
+    async def reload(self):
+        pairs = sorted((key, name) for key, name in await self.load() if key)
+        # Swap in whole new lists so that a lookup never sees a half-built index
+        self.keys = [key for key, _ in pairs]
+        self.names = [name for _, name in pairs]
+        self.grams = {key: trigrams(key) for key in self.keys}
+        self.expires = time.monotonic() + self.ttl
+
+    async def _ensure(self):
+        if time.monotonic() >= self.expires:
+            async with self._lock:
+                if time.monotonic() >= self.expires:
+                    await self.reload()
+
+    def add(self, names: Iterable[Optional[str]]):
+        """Insert the model names of cars just written, keeping the list sorted"""
+        for name in names:
+            key = model_key(name)
+            if not key:
+                continue
+            position = bisect.bisect_left(self.keys, key)
+            if position == len(self.keys) or self.keys[position] != key:
+                self.keys.insert(position, key)
+                self.names.insert(position, name.strip())
+                self.grams[key] = trigrams(key)
+
+    async def get_name(self, key: str) -> Optional[str]:
+        """The spelling shown for a model_key(), like DimensionCache.get_name"""
+        await self._ensure()
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self.names[position]
+        return None
+
+    async def complete(self, prefix: str, limit: int = DEFAULT_LIMIT) -> List[str]:
+        """Up to limit model names starting with prefix, ignoring case and surrounding spaces"""
+        await self._ensure()
+        key = model_key(prefix)
+        start = bisect.bisect_left(self.keys, key)
+        names = []
+        for position in range(start, min(start + limit, len(self.keys))):
+            if not self.keys[position].startswith(key):
+                break
+            names.append(self.names[position])
+        return names
+
+    async def search(self, q: str, limit: int = DEFAULT_LIMIT) -> List[Tuple[str, str, float]]:
+        """(key, name, similarity) of the models that contain q or are similar to it.
+
+        Ranked like the SQL API's trigram search: names starting with q first, then
+        by trigram similarity to q. Every name is scored, which is cheap for a
+        catalogue of distinct models rather than cars.
+        """
+        await self._ensure()
+        key = model_key(q)
+        wanted = trigrams(key)
+        matches = []
+        for position, candidate in enumerate(self.keys):
+            score = similarity(self.grams[candidate], wanted)
+            if score >= SIMILARITY_THRESHOLD or key in candidate:
+                matches.append((not candidate.startswith(key), -score, candidate, self.names[position]))
+        matches.sort()
+        return [(candidate, name, -score) for _, score, candidate, name in matches[:limit]]
@@ -0,0 +1,72 @@
+from fastapi import Response
+from logging.handlers import QueueHandler, QueueListener
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+import logging
+import queue
+import time
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ["method", "route"]
+)
+REQUESTS = Counter(
+    "http_requests_total", "Requests by route and status code", ["method", "route", "status"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Database latency by SQL statement type or MongoDB command name", ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use", ["pool"])
+DB_POOL_SIZE = Gauge("db_pool_size", "Connections kept open by the pool", ["pool"])
+
+
+class MetricsMiddleware:
+    """Time every HTTP request and count it by route template and status.
+
+    A plain ASGI middleware, so streaming responses are not buffered. Routes are
+    labelled by their template (/cars/{car_id}), never the raw path, to keep
+    label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], path).observe(time.perf_counter() - start)
+            REQUESTS.labels(scope["method"], path, str(status["code"])).inc()
+
+
+def configure_logging(handler: logging.Handler, level: int = logging.INFO) -> QueueListener:
+    """Route all logging through a queue so handlers never block the event loop.
+
+    Records are formatted and written by handler on the listener's own thread;
+    stop the returned listener on shutdown to flush it.
+    """
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(level)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def metrics_response() -> Response:
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
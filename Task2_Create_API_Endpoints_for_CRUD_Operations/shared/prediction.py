@@ -0,0 +1,68 @@
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List
+import logging
+import os
+import sys
+
+MODEL_DIR = os.getenv(
+    "MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Task3_Script_to_Fetch_Data_for_Prediction")
+)
+PREDICT_MAX_BATCH_SIZE = int(os.getenv("PREDICT_MAX_BATCH_SIZE", "64"))
+PREDICT_MAX_WAIT_MS = float(os.getenv("PREDICT_MAX_WAIT_MS", "5"))
+
+sys.path.append(MODEL_DIR)
+from serving import MicroBatcher, load_predictor  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+predictor = None
+batcher = None
+vector_batcher = None
+
+
+async def start():
+    """Load the model artifacts once and start the micro-batching workers"""
+    global predictor, batcher, vector_batcher
+    try:
+        predictor = await run_in_threadpool(load_predictor, MODEL_DIR)
+    except Exception as e:
+        logger.error(f"Price model unavailable: {str(e)}")
+        return
+    batcher = MicroBatcher(predictor.predict, PREDICT_MAX_BATCH_SIZE, PREDICT_MAX_WAIT_MS)
+    batcher.start()
+    # Requests scoring stored feature vectors are batched the same way, one vector per car
+    vector_batcher = MicroBatcher(predictor.predict_features, PREDICT_MAX_BATCH_SIZE, PREDICT_MAX_WAIT_MS)
+    vector_batcher.start()
+
+
+async def stop():
+    for worker in (batcher, vector_batcher):
+        if worker is not None:
+            await worker.stop()
+
+
+def loaded_encoder():
+    """The FeatureEncoder of the loaded model, or None while no model is loaded"""
+    return None if predictor is None else predictor.features
+
+
+def feature_encoder():
+    encoder = loaded_encoder()
+    if encoder is None:
+        raise HTTPException(status_code=503, detail="Price model is not loaded")
+    return encoder
+
+
+async def predict_prices(cars: List[Dict[str, Any]]) -> List[float]:
+    if batcher is None:
+        raise HTTPException(status_code=503, detail="Price model is not loaded")
+    return await batcher.predict(cars)
+
+
+async def predict_vectors(vectors) -> List[float]:
+    """Prices for rows of a matrix built by FeatureEncoder.unpack"""
+    if vector_batcher is None:
+        raise HTTPException(status_code=503, detail="Price model is not loaded")
+    return await vector_batcher.predict(list(vectors))
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+from fastapi import Response
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import os
+import time
+
+CAR_CACHE_SIZE = int(os.getenv("CAR_CACHE_SIZE", "1024"))
+CAR_CACHE_TTL_SECONDS = float(os.getenv("CAR_CACHE_TTL_SECONDS", "60"))
+# redis://host:6379/0 shares the cache between workers; unset keeps it in process
+CAR_CACHE_URL = os.getenv("CAR_CACHE_URL")
+
+# (JSON body, ETag)
+Entry = Tuple[bytes, str]
+
+
+class MemoryBackend:
+    """Per-process LRU map bounded by entry count and age"""
+
+    name = "memory"
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Tuple[float, Entry]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Entry]:
+        item = self.entries.get(key)
+        if item is None:
+            return None
+        expires, entry = item
+        if time.monotonic() >= expires:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: Entry):
+        self.entries[key] = (time.monotonic() + self.ttl, entry)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self.entries.pop(key, None)
+
+    def size(self) -> int:
+        return len(self.entries)
+
+
+class RedisBackend:
+    """Cache shared by every worker pointed at the same Redis; needs the redis package"""
+
+    name = "redis"
+
+    def __init__(self, url: str, ttl: float, prefix: str = "car:"):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Entry]:
+        value = await self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        etag, _, body = value.partition(b"\n")
+        return body, etag.decode()
+
+    async def set(self, key: str, entry: Entry):
+        body, etag = entry
+        await self.client.set(self.prefix + key, etag.encode() + b"\n" + body, px=int(self.ttl * 1000))
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names etag (weak comparison, as RFC 9110 asks for GET)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    """Read-through cache of serialized JSON responses, keyed by resource id.
+
+    A miss that started before an invalidation in this process is not stored, so
+    a read racing an update cannot put the old row back after it was evicted.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, key) -> Optional[Entry]:
+        entry = await self.backend.get(str(key))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def version(self) -> int:
+        """Token to pass to set(), taken before loading the value"""
+        return self.invalidations
+
+    async def set(self, key, content: Any, version: int) -> Entry:
+        body = json.dumps(content, separators=(",", ":")).encode()
+        entry = (body, make_etag(body))
+        if version == self.invalidations:
+            await self.backend.set(str(key), entry)
+        return entry
+
+    async def invalidate(self, key):
+        self.invalidations += 1
+        await self.backend.delete(str(key))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "size": self.backend.size()
+        }
+
+
+def respond(entry: Entry, if_none_match: Optional[str]) -> Response:
+    """The cached body, or 304 Not Modified when the client already has it"""
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def create_cache() -> ResponseCache:
+    if CAR_CACHE_URL:
+        return ResponseCache(RedisBackend(CAR_CACHE_URL, CAR_CACHE_TTL_SECONDS))
+    return ResponseCache(MemoryBackend(CAR_CACHE_SIZE, CAR_CACHE_TTL_SECONDS))
+
+
+car_cache = create_cache()
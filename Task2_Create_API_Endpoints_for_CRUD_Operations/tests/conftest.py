@@ -0,0 +1,38 @@
+"""Fixtures for the API tests.
+
+The MongoDB API runs against the benchmark's in-memory store, which needs the
+benchmark requirements (mongomock-motor, httpx):
+    pip install -r api_mongo/requirements.txt -r benchmark/requirements.txt
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmark")
+sys.path.insert(0, BENCH_DIR)
+
+import servers  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("mongo_api")
+    csv_path = str(workdir / "cars.csv")
+    servers.head_csv(servers.CSV_PATH, 50, csv_path)
+    environ, cwd = dict(os.environ), os.getcwd()
+    os.environ["BENCH_CSV_PATH"] = csv_path
+    os.environ["COMPARABLES_REFRESH_SECONDS"] = "0"
+    # main.py writes app.log to the working directory
+    os.chdir(workdir)
+    try:
+        from fastapi.testclient import TestClient
+        import mock_mongo_app
+
+        with TestClient(mock_mongo_app.app) as test_client:
+            yield test_client
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
@@ -0,0 +1,49 @@
+"""CarLogs partition maintenance from setup.sql, on a throwaway pgserver cluster.
+
+Needs the benchmark requirements (pgserver, psycopg2); see conftest.py.
+"""
+import os
+
+import psycopg2
+import pytest
+
+import servers
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    url = servers.start_postgres(str(tmp_path_factory.mktemp("pgdata")))
+    connection = psycopg2.connect(url)
+    with connection, connection.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS public CASCADE; CREATE SCHEMA public")
+        with open(os.path.join(servers.TASK1_DIR, "setup.sql")) as f:
+            cur.execute(f.read())
+    yield connection
+    connection.close()
+
+
+def test_partition_created_after_rows_landed_in_the_default(conn):
+    with conn, conn.cursor() as cur:
+        # Five months ahead is past the three that setup.sql creates
+        cur.execute("SELECT (date_trunc('month', NOW()) + INTERVAL '5 months')::DATE")
+        month = cur.fetchone()[0]
+        partition = f"carlogs_{month:%Y_%m}"
+        cur.execute(
+            "INSERT INTO CarLogs (CarID, LogDate, LogAction) VALUES (1, %s, 'Inserted'), (2, %s, 'Updated')",
+            (month, month)
+        )
+        cur.execute("SELECT count(*) FROM CarLogs_default")
+        assert cur.fetchone()[0] == 2
+
+        cur.execute("SELECT MaintainCarLogs(12, 5)")
+        cur.execute(f"SELECT count(*) FROM {partition}")
+        assert cur.fetchone()[0] == 2
+        cur.execute("SELECT count(*) FROM CarLogs_default")
+        assert cur.fetchone()[0] == 0
+        cur.execute("SELECT count(*) FROM CarLogs WHERE LogDate = %s", (month,))
+        assert cur.fetchone()[0] == 2
+        cur.execute("SELECT relispartition FROM pg_class WHERE relname = 'carlogs_default'")
+        assert cur.fetchone()[0]
+
+        # Later runs find the partition in place
+        cur.execute("SELECT MaintainCarLogs(12, 5)")
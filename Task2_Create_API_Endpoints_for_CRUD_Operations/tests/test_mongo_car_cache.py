@@ -0,0 +1,30 @@
+"""GET /cars/{car_id} of the MongoDB API against the benchmark's in-memory store; see conftest.py"""
+
+
+def test_update_evicts_car_read_with_non_canonical_id(client):
+    car = client.get("/cars/", params={"limit": 1}).json()[0]
+    upper_id = car["id"].upper()
+
+    before = client.get(f"/cars/{upper_id}")
+    assert before.status_code == 200
+    assert before.json()["price"] == car["price"]
+
+    assert client.put(f"/cars/{car['id']}", json={"price": 99999}).status_code == 200
+
+    after = client.get(f"/cars/{upper_id}")
+    assert after.json()["price"] == 99999
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert client.get(f"/cars/{car['id']}").json()["price"] == 99999
+
+
+def test_delete_evicts_car_read_with_non_canonical_id(client):
+    car = client.get("/cars/", params={"limit": 1, "sort": "-id"}).json()[0]
+    upper_id = car["id"].upper()
+
+    assert client.get(f"/cars/{upper_id}").status_code == 200
+    assert client.delete(f"/cars/{car['id']}").status_code == 200
+    assert client.get(f"/cars/{upper_id}").status_code == 404
+
+
+def test_malformed_id_is_rejected(client):
+    assert client.get("/cars/not-an-id").status_code == 400
@@ -0,0 +1,49 @@
+"""Cursor paging of the MongoDB API's GET /cars/ over documents without a sort value; see conftest.py."""
+import base64
+import json
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def priced(client):
+    import mock_mongo_app
+
+    cars = mock_mongo_app.store["ford-data"].cars
+    ids = [doc["_id"] for doc in cars.find({}, {"_id": 1}).sort("_id", 1)]
+    cars.update_many({"_id": {"$in": ids[::7]}}, {"$set": {"price": None}})
+    return len(ids)
+
+
+def pages(client, **params):
+    seen, cursor = [], None
+    while True:
+        response = client.get("/cars/", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        seen += response.json()
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return seen
+
+
+@pytest.mark.parametrize("sort", ["price", "-price"])
+def test_cursor_pages_reach_cars_without_a_price(client, priced, sort):
+    seen = pages(client, sort=sort, limit=4)
+    assert len(seen) == len({car["id"] for car in seen}) == priced
+
+    prices = [car.get("price") for car in seen]
+    missing = prices.count(None)
+    assert missing and all(price is None for price in prices[-missing:])
+    valued = prices[:-missing]
+    assert valued == sorted(valued, reverse=sort.startswith("-"))
+
+    offsets = [car for skip in range(0, priced, 4)
+               for car in client.get("/cars/", params={"sort": sort, "limit": 4, "skip": skip}).json()]
+    assert [car["id"] for car in offsets] == [car["id"] for car in seen]
+
+
+@pytest.mark.parametrize("key", ["cheap", {"$ne": None}, True])
+def test_cursor_with_a_key_of_the_wrong_type_is_rejected(client, key):
+    state = {"after": "0" * 24, "sort": "price", "key": key}
+    cursor = base64.urlsafe_b64encode(json.dumps(state).encode()).decode().rstrip("=")
+    assert client.get("/cars/", params={"sort": "price", "cursor": cursor}).status_code == 400
@@ -0,0 +1,22 @@
+"""Row shaping of the MongoDB API's exports and fast list responses."""
+import os
+import sys
+
+TASK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path[:0] = [os.path.join(TASK_DIR, "api_mongo"), os.path.join(TASK_DIR, "shared")]
+
+import export  # noqa: E402
+
+
+def test_records_project_each_document_to_fields():
+    docs = [
+        {"_id": 1, "model": "Fiesta", "price": 9000},
+        {"_id": 2, "model": "Focus", "price": 12000, "year": 2019, "extra": "x"},
+        {"_id": 3, "price": 7000, "year": 2015},
+    ]
+    rows = export.records(docs, ["id", "model", "year"])
+    assert rows == [
+        {"id": "1", "model": "Fiesta", "year": None},
+        {"id": "2", "model": "Focus", "year": 2019},
+        {"id": "3", "model": None, "year": 2015},
+    ]
@@ -0,0 +1,54 @@
+"""Stored feature vectors of the MongoDB API across updates; see conftest.py."""
+import asyncio
+
+from bson import Binary, ObjectId
+
+STALE = {"version": "stale", "vector": Binary(b"\0" * 32)}
+
+
+def stored(car_id):
+    import mock_mongo_app
+
+    return mock_mongo_app.store["ford-data"].cars.find_one({"_id": ObjectId(car_id)})
+
+
+def test_update_of_a_model_input_drops_the_old_vector(client, monkeypatch):
+    # Imported once the client fixture has moved to its working directory
+    import mock_mongo_app
+
+    async def fail(cars):
+        pass
+
+    # As if no encoder were loaded, or storing the new vector had failed
+    monkeypatch.setattr(mock_mongo_app.main, "refresh_features", fail)
+    car = client.get("/cars/", params={"limit": 2}).json()[1]
+    cars = mock_mongo_app.store["ford-data"].cars
+    cars.update_one({"_id": ObjectId(car["id"])}, {"$set": {"features": STALE}})
+
+    assert client.put(f"/cars/{car['id']}", json={"price": car["price"] + 1}).status_code == 200
+    assert stored(car["id"])["features"] == STALE
+
+    assert client.put(f"/cars/{car['id']}", json={"mileage": car["mileage"] + 1}).status_code == 200
+    assert "features" not in stored(car["id"])
+
+
+
+def test_stored_car_without_a_price_is_still_scored(client):
+    import mock_mongo_app
+
+    main = mock_mongo_app.main
+    car = client.get("/cars/", params={"limit": 3}).json()[2]
+    doc = stored(car["id"])
+    encoder = main.prediction.feature_encoder()
+    # A current vector, so that load() reads it instead of writing one through
+    # bulk_write, which mongomock can't run
+    vector = encoder.pack([asyncio.run(main.car_features.model_input(doc))])[0]
+    features = {"version": encoder.version, "vector": Binary(vector)}
+    mock_mongo_app.store["ford-data"].cars.update_one(
+        {"_id": doc["_id"]}, {"$set": {"price": None, "features": features}}
+    )
+
+    response = client.get(f"/predict/price/{car['id']}")
+    assert response.status_code == 200
+    assert response.json()["actual_price"] is None
+    assert response.json()["predicted_price"] > 0
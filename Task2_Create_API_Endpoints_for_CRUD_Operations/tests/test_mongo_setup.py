@@ -0,0 +1,23 @@
+"""Dimension seeding in Task1's mongo_setup.py, on a mongomock store."""
+import mongomock
+
+import servers
+
+
+def test_seed_keeps_ids_taken_by_loaded_cars(monkeypatch, tmp_path):
+    # mongo_setup.py writes mongo_setup.log to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(servers.TASK1_DIR)
+    import mongo_setup
+
+    db = mongomock.MongoClient()["ford-data"]
+    mongo_setup.create_indexes(db)
+    db.transmissions.insert_one({"transmissionid": 1, "transmissiontype": "Manual"})
+
+    mongo_setup.seed_dimensions(db)
+    mongo_setup.seed_dimensions(db)
+
+    ids = mongo_setup.dimension_ids(db, "transmissions")
+    assert ids["manual"] == 1
+    assert sorted(ids) == ["automatic", "manual", "semi-automatic"]
+    assert sorted(ids.values()) == [1, 2, 3]
@@ -0,0 +1,40 @@
+"""Expiry of the MongoDB API's price statistics cache."""
+import asyncio
+import os
+import sys
+
+TASK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path[:0] = [os.path.join(TASK_DIR, "api_mongo"), os.path.join(TASK_DIR, "shared")]
+
+import stats  # noqa: E402
+
+
+class Collection:
+    """Stands in for a Motor collection, counting aggregations"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def aggregate(self, pipeline, **kwargs):
+        self.calls += 1
+        collection = self
+
+        class Cursor:
+            async def to_list(self, length):
+                return [{"_id": 2019, "count": collection.calls}]
+
+        return Cursor()
+
+
+def test_results_are_recomputed_after_the_ttl():
+    collection = Collection()
+
+    async def run():
+        cached = stats.StatsCache(collection, ttl=60)
+        assert await cached.get("year") == await cached.get("year")
+        expired = stats.StatsCache(collection, ttl=0)
+        first = await expired.get("year")
+        assert await expired.get("year") != first
+
+    asyncio.run(run())
+    assert collection.calls == 3
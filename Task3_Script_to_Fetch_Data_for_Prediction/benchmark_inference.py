@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATH = os.path.join(MODEL_DIR, "..", "Data", "ford.csv")
+BACKENDS = ["numpy", "keras"]
+
+
+def run_worker(backend, batch_sizes, repeats):
+    """Measure one backend from a cold interpreter and print the results as JSON"""
+    start = time.perf_counter()
+    if backend == "numpy":
+        from numpy_model import NumpyPricePredictor
+        predictor = NumpyPricePredictor.load()
+    else:
+        from serving import KerasPricePredictor
+        predictor = KerasPricePredictor.load()
+    startup = time.perf_counter() - start
+
+    import csv
+    with open(CSV_PATH, newline='') as f:
+        cars = [
+            {key: value if key in ("model", "transmission", "fuelType") else float(value) for key, value in row.items()}
+            for row in csv.DictReader(f)
+        ]
+
+    throughput = {}
+    predictions = predictor.predict(cars[:256])
+    for batch_size in batch_sizes:
+        batch = cars[:batch_size]
+        predictor.predict(batch)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            predictor.predict(batch)
+        elapsed = time.perf_counter() - start
+        throughput[batch_size] = batch_size * repeats / elapsed
+
+    print(json.dumps({
+        "backend": backend,
+        "startup_seconds": startup,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rows_per_second": throughput,
+        "predictions": predictions
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the NumPy and Keras price model backends")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 1024])
+    parser.add_argument("--repeats", type=int, default=50, help="Timed predict calls per batch size")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.batch_sizes, args.repeats)
+        sys.exit(0)
+
+    results = {}
+    for backend in args.backends:
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--repeats", str(args.repeats),
+             "--batch-sizes", *map(str, args.batch_sizes)],
+            cwd=MODEL_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        results[backend] = json.loads(output.strip().splitlines()[-1])
+
+    for backend, result in results.items():
+        rates = ", ".join(f"batch {size}: {rate:,.0f} rows/s" for size, rate in result["rows_per_second"].items())
+        print(f"{backend:>6}: startup {result['startup_seconds'] * 1000:,.0f} ms, "
+              f"max RSS {result['max_rss_mb']:,.0f} MB, {rates}")
+
+    if len(results) == 2:
+        numpy_prices, keras_prices = results["numpy"]["predictions"], results["keras"]["predictions"]
+        worst = max(abs(a - b) / max(abs(b), 1.0) for a, b in zip(numpy_prices, keras_prices))
+        print(f"Max relative difference between backends: {worst:.2e}")
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import zipfile
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from preprocessing import CATEGORICAL_FEATURES, MODEL_DIR, FeatureEncoder
+
+NPZ_PATH = os.path.join(MODEL_DIR, "car_price_model.npz")
+
+ACTIVATIONS = {
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "linear": lambda x: x
+}
+
+
+def read_h5_dense_layers(h5_path: str) -> List[Dict[str, Any]]:
+    """Kernel, bias and activation of each Dense layer in a Keras .h5 file, read with h5py alone"""
+    import h5py
+
+    with h5py.File(h5_path, "r") as f:
+        config = json.loads(f.attrs["model_config"])
+        layers = []
+        for layer in config["config"]["layers"]:
+            if layer["class_name"] != "Dense":
+                continue
+            name = layer["config"]["name"]
+            weights = {}
+
+            # Keras 2 stores <name>/<name>/kernel:0, Keras 3 <name>/sequential/<name>/kernel
+            def collect(path, obj):
+                if isinstance(obj, h5py.Dataset):
+                    weights[path.rsplit("/", 1)[-1].split(":")[0]] = obj[()]
+
+            f["model_weights"][name].visititems(collect)
+            layers.append({
+                "kernel": np.asarray(weights["kernel"], dtype=np.float32),
+                "bias": np.asarray(weights["bias"], dtype=np.float32),
+                "activation": layer["config"]["activation"]
+            })
+    return layers
+
+
+def export_npz(model_dir: str = MODEL_DIR, out_path: str = NPZ_PATH):
+    """Write the model weights and the preprocessing parameters to one uncompressed .npz"""
+    layers = read_h5_dense_layers(os.path.join(model_dir, "car_price_model.h5"))
+    encoder = FeatureEncoder.load(model_dir)
+    arrays = {
+        "scaler_mean": encoder.mean,
+        "scaler_scale": encoder.scale,
+        "activations": np.array([layer["activation"] for layer in layers])
+    }
+    for i, layer in enumerate(layers):
+        arrays[f"kernel_{i}"] = layer["kernel"]
+        arrays[f"bias_{i}"] = layer["bias"]
+    for field, values in encoder.classes.items():
+        arrays[f"classes_{field}"] = np.array(values, dtype=str)
+    # Uncompressed, so every member can be memory-mapped straight from the file
+    np.savez(out_path, **arrays)
+    return out_path
+
+
+def load_npz(path: str = NPZ_PATH, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """Read every array in an uncompressed .npz, memory-mapping them when mmap is set"""
+    if not mmap:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            # Skip the local file header to reach the .npy bytes
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            arrays[info.filename[:-len(".npy")]] = np.memmap(
+                path, dtype=dtype, mode="r", shape=shape,
+                order="F" if fortran_order else "C", offset=f.tell()
+            )
+    return arrays
+
+
+class NumpyPricePredictor:
+    """Dense forward pass over the exported weights; no TensorFlow needed"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.layers = [
+            (arrays[f"kernel_{i}"], arrays[f"bias_{i}"], ACTIVATIONS[str(activation)])
+            for i, activation in enumerate(arrays["activations"])
+        ]
+        self.features = FeatureEncoder(
+            arrays["scaler_mean"],
+            arrays["scaler_scale"],
+            {field: [str(value) for value in arrays[f"classes_{field}"]] for field in CATEGORICAL_FEATURES}
+        )
+
+    @classmethod
+    def load(cls, path: str = NPZ_PATH, mmap: bool = True) -> "NumpyPricePredictor":
+        return cls(load_npz(path, mmap))
+
+    def forward(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x.reshape(-1)
+
+    def predict(self, cars: Sequence[Dict[str, Any]]) -> List[float]:
+        if not cars:
+            return []
+        return self.forward(self.features.transform(cars)).tolist()
+
+    def predict_features(self, x) -> List[float]:
+        """Prices for rows already encoded by self.features, e.g. stored feature vectors"""
+        if len(x) == 0:
+            return []
+        return self.forward(x).tolist()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export car_price_model.h5 to a NumPy .npz")
+    parser.add_argument("--out", default=NPZ_PATH, help="Where to write the .npz")
+    parser.add_argument("--verify", action="store_true", help="Compare against Keras on ford.csv (needs TensorFlow)")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="Allowed relative difference from Keras")
+    args = parser.parse_args()
+
+    path = export_npz(out_path=args.out)
+    print(f"Wrote {path} ({os.path.getsize(path)} bytes)")
+
+    if args.verify:
+        import pandas as pd
+        import tensorflow as tf
+        from tensorflow import keras
+
+        keras_model = keras.models.load_model(
+            os.path.join(MODEL_DIR, "car_price_model.h5"),
+            custom_objects={"mse": tf.keras.losses.MeanSquaredError()},
+            compile=False
+        )
+        predictor = NumpyPricePredictor.load(path)
+        x = predictor.features.transform(pd.read_csv(os.path.join(MODEL_DIR, "..", "Data", "ford.csv")))
+        expected = keras_model.predict(x.astype(np.float32), batch_size=4096, verbose=0).reshape(-1)
+        actual = predictor.forward(x)
+        worst = float(np.max(np.abs(actual - expected) / np.maximum(np.abs(expected), 1.0)))
+        print(f"Max relative difference from Keras over {len(x)} rows: {worst:.2e}")
+        if worst > args.tolerance:
+            raise SystemExit(1)
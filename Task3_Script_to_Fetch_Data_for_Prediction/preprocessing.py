@@ -0,0 +1,181 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import pickle
+import time
+from typing import Any, Dict, Iterable, List, Sequence, Union
+
+import numpy as np
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Order matches the training matrix: scaled numerical columns, then encoded categoricals.
+# Keys are the API field names; values are the ford.csv / notebook column names.
+NUMERICAL_FEATURES = {
+    "year": "year",
+    "mileage": "mileage",
+    "tax": "tax",
+    "mpg": "mpg",
+    "enginesize": "engineSize"
+}
+CATEGORICAL_FEATURES = {
+    "model": "model",
+    "transmissiontype": "transmission",
+    "fueltype": "fuelType"
+}
+
+# Code given to values an encoder has never seen: its first class
+UNSEEN_CODE = 0
+
+# Stored feature vectors are little-endian float32, the precision the model runs at
+FEATURE_DTYPE = np.dtype("<f4")
+
+Records = Union[Sequence[Dict[str, Any]], "pandas.DataFrame"]  # noqa: F821
+
+
+class FeatureEncoder:
+    """Turn car records into the model's feature matrix in one pass.
+
+    The label encoders are flattened into class -> code dicts and the scaler into
+    mean/scale vectors, so a batch costs one dict lookup per categorical value and
+    one matrix operation, instead of an sklearn call per value. Values an encoder
+    has not seen get UNSEEN_CODE, as in the notebook's safe_transform.
+
+    Categorical values without an exact match are matched again ignoring case and
+    surrounding whitespace: the encoders were fitted on ford.csv, whose model names
+    start with a space, while cars created through the APIs usually do not.
+    """
+
+    def __init__(self, mean, scale, classes: Dict[str, Sequence[Any]]):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.classes = {field: list(classes[field]) for field in CATEGORICAL_FEATURES}
+        self.lookups = {
+            field: {value: code for code, value in enumerate(values)}
+            for field, values in self.classes.items()
+        }
+        # First class wins where spellings collide (ford.csv has both ' Focus' and 'Focus')
+        self.normalized_lookups = {
+            field: {self.normalize(value): code for code, value in reversed(list(enumerate(values)))}
+            for field, values in self.classes.items()
+        }
+        self.width = len(NUMERICAL_FEATURES) + len(CATEGORICAL_FEATURES)
+        # Fingerprint of the parameters, so stored vectors can be matched to the artifacts they came from
+        digest = hashlib.sha256(self.mean.tobytes() + self.scale.tobytes())
+        digest.update(json.dumps({field: [str(value) for value in values] for field, values in self.classes.items()},
+                                 sort_keys=True).encode())
+        self.version = digest.hexdigest()[:16]
+
+    @staticmethod
+    def normalize(value: Any) -> Any:
+        return value.strip().casefold() if isinstance(value, str) else value
+
+    @classmethod
+    def from_sklearn(cls, scaler, label_encoders) -> "FeatureEncoder":
+        return cls(
+            scaler.mean_,
+            scaler.scale_,
+            {field: label_encoders[column].classes_ for field, column in CATEGORICAL_FEATURES.items()}
+        )
+
+    @classmethod
+    def load(cls, model_dir: str = MODEL_DIR) -> "FeatureEncoder":
+        with open(os.path.join(model_dir, "label_encoders.pkl"), "rb") as f:
+            label_encoders = pickle.load(f)
+        with open(os.path.join(model_dir, "scaler.pkl"), "rb") as f:
+            scaler = pickle.load(f)
+        return cls.from_sklearn(scaler, label_encoders)
+
+    @staticmethod
+    def _column(cars: Records, field: str, column: str) -> List[Any]:
+        """Values of one feature, read from the API field name or the CSV column name"""
+        if hasattr(cars, "columns"):
+            return list(cars[field] if field in cars.columns else cars[column])
+        return [car.get(field, car.get(column)) for car in cars]
+
+    def encode(self, field: str, values: Iterable[Any]) -> np.ndarray:
+        lookup = self.lookups[field]
+        normalized = self.normalized_lookups[field]
+        normalize = self.normalize
+        return np.fromiter(
+            (lookup[value] if value in lookup else normalized.get(normalize(value), UNSEEN_CODE) for value in values),
+            dtype=np.float64
+        )
+
+    def numerical(self, cars: Records) -> np.ndarray:
+        """Raw numerical features, with missing values as 0"""
+        return np.column_stack([
+            np.array([0.0 if value is None else value for value in self._column(cars, field, column)], dtype=np.float64)
+            for field, column in NUMERICAL_FEATURES.items()
+        ])
+
+    def transform(self, cars: Records) -> np.ndarray:
+        if len(cars) == 0:
+            return np.empty((0, self.width), dtype=np.float64)
+        scaled = (self.numerical(cars) - self.mean) / self.scale
+        categorical = np.column_stack([
+            self.encode(field, self._column(cars, field, column))
+            for field, column in CATEGORICAL_FEATURES.items()
+        ])
+        return np.hstack([scaled, categorical])
+
+    def pack(self, cars: Records) -> List[bytes]:
+        """One stored feature vector per car"""
+        matrix = self.transform(cars).astype(FEATURE_DTYPE)
+        return [row.tobytes() for row in matrix]
+
+    def unpack(self, vectors: Sequence[bytes]) -> np.ndarray:
+        """Stored feature vectors back into a model input matrix, copied once into one buffer"""
+        return np.frombuffer(b"".join(vectors), dtype=FEATURE_DTYPE).reshape(-1, self.width)
+
+
+def transform_per_row(cars: Sequence[Dict[str, Any]], scaler, label_encoders) -> np.ndarray:
+    """The notebook's preprocess_data/safe_transform path, kept as the reference"""
+    rows = []
+    for car in cars:
+        encoded = []
+        for field, column in CATEGORICAL_FEATURES.items():
+            encoder = label_encoders[column]
+            value = car.get(field, car.get(column))
+            if value not in encoder.classes_:
+                value = encoder.classes_[0]
+            encoded.append(encoder.transform([value])[0])
+        numerical = [float(car.get(field, car.get(column)) or 0) for field, column in NUMERICAL_FEATURES.items()]
+        rows.append(np.concatenate([scaler.transform([numerical])[0], encoded]))
+    return np.array(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the vectorized preprocessing against the per-row path")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(MODEL_DIR, "..", "Data", "ford.csv"))
+    parser.add_argument("--rows", type=int, default=2000, help="Rows to run through the slow per-row path")
+    args = parser.parse_args()
+
+    with open(args.csv_path, newline='') as f:
+        cars = [
+            {key: value if key in ("model", "transmission", "fuelType") else float(value) for key, value in row.items()}
+            for row in csv.DictReader(f)
+        ]
+    encoder = FeatureEncoder.load()
+    with open(os.path.join(MODEL_DIR, "label_encoders.pkl"), "rb") as f:
+        label_encoders = pickle.load(f)
+    with open(os.path.join(MODEL_DIR, "scaler.pkl"), "rb") as f:
+        scaler = pickle.load(f)
+
+    start = time.perf_counter()
+    fast = encoder.transform(cars)
+    fast_seconds = time.perf_counter() - start
+
+    sample = cars[:args.rows]
+    start = time.perf_counter()
+    slow = transform_per_row(sample, scaler, label_encoders)
+    slow_seconds = time.perf_counter() - start
+
+    identical = np.array_equal(fast[:len(sample)], slow)
+    print(f"Vectorized: {len(cars)} rows in {fast_seconds * 1000:.1f} ms ({len(cars) / fast_seconds:.0f} rows/sec)")
+    print(f"Per-row:    {len(sample)} rows in {slow_seconds * 1000:.1f} ms ({len(sample) / slow_seconds:.0f} rows/sec)")
+    print(f"Identical output on {len(sample)} rows: {identical}")
+    if not identical:
+        raise SystemExit(1)
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from numpy_model import NumpyPricePredictor
+from preprocessing import MODEL_DIR, FeatureEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class KerasPricePredictor:
+    """The trained Keras model with the feature encoding it was fitted with"""
+
+    def __init__(self, model, features: FeatureEncoder):
+        self.model = model
+        self.features = features
+
+    @classmethod
+    def load(cls, model_dir: str = MODEL_DIR) -> "KerasPricePredictor":
+        import tensorflow as tf
+        from tensorflow import keras
+
+        model = keras.models.load_model(
+            os.path.join(model_dir, "car_price_model.h5"),
+            custom_objects={"mse": tf.keras.losses.MeanSquaredError()},
+            compile=False
+        )
+        logger.info(f"Loaded price model from {model_dir}")
+        return cls(model, FeatureEncoder.load(model_dir))
+
+    def predict(self, cars: Sequence[Dict[str, Any]]) -> List[float]:
+        if not cars:
+            return []
+        return self.predict_features(self.features.transform(cars))
+
+    def predict_features(self, x) -> List[float]:
+        """Prices for rows already encoded by self.features, e.g. stored feature vectors"""
+        if len(x) == 0:
+            return []
+        # predict_on_batch skips the per-call setup that model.predict pays
+        output = self.model.predict_on_batch(np.asarray(x, dtype=np.float32))
+        return [float(price) for price in np.asarray(output).reshape(-1)]
+
+
+def load_predictor(model_dir: str = MODEL_DIR):
+    """The NumPy engine when car_price_model.npz has been exported, else the Keras model"""
+    npz_path = os.path.join(model_dir, "car_price_model.npz")
+    if os.path.exists(npz_path):
+        predictor = NumpyPricePredictor.load(npz_path)
+        logger.info(f"Loaded NumPy price model from {npz_path}")
+        return predictor
+    return KerasPricePredictor.load(model_dir)
+
+
+class MicroBatcher:
+    """Group concurrent prediction requests into one model call.
+
+    Requests queue up until max_batch_size cars are waiting or the oldest request
+    has waited max_wait_ms, then the whole batch is scored in a worker thread.
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def predict(self, cars: List[Dict[str, Any]]) -> List[float]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((cars, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            cars = [car for request, _ in batch for car in request]
+            try:
+                prices = await loop.run_in_executor(None, self.predict_fn, cars)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            start = 0
+            for request, future in batch:
+                if not future.done():
+                    future.set_result(prices[start:start + len(request)])
+                start += len(request)
@@ -0,0 +1,421 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import os
+import pickle
+import shutil
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from preprocessing import CATEGORICAL_FEATURES, MODEL_DIR, NUMERICAL_FEATURES, FeatureEncoder
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CSV_PATH = os.path.join(MODEL_DIR, "..", "Data", "ford.csv")
+STATE_FILE = "training_state.json"
+
+# Columns of every chunk, with the API field names FeatureEncoder reads
+NUMERIC_COLUMNS = ["price", *NUMERICAL_FEATURES]
+TEXT_COLUMNS = list(CATEGORICAL_FEATURES)
+
+CAR_QUERY = """
+    SELECT c.CarID, c.Price, c.Year, c.Mileage, c.Tax, c.MPG, c.EngineSize,
+           c.Model, t.TransmissionType, f.FuelType
+    FROM Cars c
+    LEFT JOIN Transmissions t ON t.TransmissionID = c.TransmissionID
+    LEFT JOIN FuelTypes f ON f.FuelTypeID = c.FuelTypeID
+    WHERE c.CarID > %s AND (%s::INTEGER IS NULL OR c.CarID <= %s)
+    ORDER BY c.CarID
+"""
+
+
+class Chunk(dict):
+    """Column name -> array for a run of rows, read by FeatureEncoder like a DataFrame.
+
+    `key` holds each row's position in its source (carid, _id or CSV line), which
+    only grows, so training can resume after the last key it has seen.
+    """
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self)
+
+    def __len__(self) -> int:
+        return len(self["key"])
+
+    @classmethod
+    def from_rows(cls, keys: List[Any], rows: List[tuple]) -> "Chunk":
+        """Build a chunk from tuples in NUMERIC_COLUMNS + TEXT_COLUMNS order; None becomes NaN"""
+        columns = list(zip(*rows)) if rows else [()] * (len(NUMERIC_COLUMNS) + len(TEXT_COLUMNS))
+        chunk = cls(key=np.array(keys))
+        for name, values in zip(NUMERIC_COLUMNS + TEXT_COLUMNS, columns):
+            chunk[name] = np.array(values, dtype=np.float64 if name in NUMERIC_COLUMNS else object)
+        return chunk
+
+    def take(self, mask: np.ndarray) -> "Chunk":
+        return Chunk({name: values[mask] for name, values in self.items()})
+
+    def complete(self) -> "Chunk":
+        """Rows with every feature and the price, as the notebook's dropna() keeps"""
+        mask = np.ones(len(self), dtype=bool)
+        for name in NUMERIC_COLUMNS:
+            mask &= ~np.isnan(self[name])
+        for name in TEXT_COLUMNS:
+            mask &= np.array([value is not None for value in self[name]], dtype=bool)
+        return self.take(mask)
+
+
+def csv_chunks(path: str, chunk_size: int, after=None, until=None) -> Iterator[Chunk]:
+    """ford.csv in chunks, keyed by data line number, from after (exclusive) to until (inclusive)"""
+    columns = {**NUMERICAL_FEATURES, **CATEGORICAL_FEATURES, "price": "price"}
+    after = after or 0
+    with open(path, newline='') as f:
+        keys, rows = [], []
+        for line, row in enumerate(csv.DictReader(f), start=1):
+            if line <= after:
+                continue
+            if until is not None and line > until:
+                break
+            keys.append(line)
+            rows.append(tuple(
+                float(row[columns[name]]) if row[columns[name]] != "" else None for name in NUMERIC_COLUMNS
+            ) + tuple(row[columns[name]] for name in TEXT_COLUMNS))
+            if len(rows) == chunk_size:
+                yield Chunk.from_rows(keys, rows)
+                keys, rows = [], []
+        if rows:
+            yield Chunk.from_rows(keys, rows)
+
+
+def postgres_chunks(url: str, chunk_size: int, after=None, until=None) -> Iterator[Chunk]:
+    """Cars from the SQL API's database through a server-side cursor, keyed by CarID"""
+    import psycopg2
+
+    conn = psycopg2.connect(url)
+    try:
+        with conn, conn.cursor(name="train_cars") as cur:
+            cur.itersize = chunk_size
+            cur.execute(CAR_QUERY, (after or 0, until, until))
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield Chunk.from_rows([row[0] for row in rows], [row[1:] for row in rows])
+    finally:
+        conn.close()
+
+
+def mongo_chunks(url: str, chunk_size: int, after=None, until=None) -> Iterator[Chunk]:
+    """Cars from the MongoDB API's database in _id order, keyed by the _id hex string"""
+    from bson import ObjectId
+    from pymongo import MongoClient
+
+    client = MongoClient(url)
+    try:
+        db = client["ford-data"]
+        transmissions = {doc["transmissionid"]: doc["transmissiontype"] for doc in db.transmissions.find()
+                         if "transmissionid" in doc}
+        fueltypes = {doc["fueltypeid"]: doc["fueltype"] for doc in db.fueltype.find() if "fueltypeid" in doc}
+        bounds = {}
+        if after:
+            bounds["$gt"] = ObjectId(after)
+        if until:
+            bounds["$lte"] = ObjectId(until)
+        query = {"_id": bounds} if bounds else {}
+        cursor = db.cars.find(query).sort("_id", 1).batch_size(chunk_size)
+        keys, rows = [], []
+        for doc in cursor:
+            keys.append(str(doc["_id"]))
+            rows.append(tuple(doc.get(name) for name in NUMERIC_COLUMNS) + (
+                doc.get("model"),
+                transmissions.get(doc.get("transmissionid")),
+                fueltypes.get(doc.get("fueltypeid"))
+            ))
+            if len(rows) == chunk_size:
+                yield Chunk.from_rows(keys, rows)
+                keys, rows = [], []
+        if rows:
+            yield Chunk.from_rows(keys, rows)
+    finally:
+        client.close()
+
+
+def write_snapshot(chunks: Iterator[Chunk], path: str, source: str) -> int:
+    """Write chunks to a directory of .npy columns that snapshot_chunks memory-maps.
+
+    Text columns are stored as int32 codes into a vocabulary kept in meta.json.
+    Each column is appended to a raw file first and given its .npy header once
+    the row count is known, so memory stays at one chunk.
+    """
+    os.makedirs(path, exist_ok=True)
+    vocabulary = {name: {} for name in TEXT_COLUMNS}
+    parts = {}
+    dtypes = {}
+    rows = 0
+    try:
+        for chunk in chunks:
+            columns = {"key": chunk["key"], **{name: chunk[name] for name in NUMERIC_COLUMNS}}
+            for name in TEXT_COLUMNS:
+                codes = vocabulary[name]
+                columns[name] = np.array(
+                    [-1 if value is None else codes.setdefault(value, len(codes)) for value in chunk[name]],
+                    dtype=np.int32
+                )
+            if not dtypes:
+                # Mongo keys are fixed-width hex strings, which sort like the ObjectIds
+                dtypes = {name: np.dtype("<U24") if values.dtype.kind in "OU" else values.dtype
+                          for name, values in columns.items()}
+                parts = {name: open(os.path.join(path, f"{name}.part"), "wb") for name in columns}
+            for name, values in columns.items():
+                parts[name].write(np.ascontiguousarray(values, dtype=dtypes[name]).tobytes())
+            rows += len(chunk)
+    finally:
+        for f in parts.values():
+            f.close()
+
+    for name, dtype in dtypes.items():
+        part = os.path.join(path, f"{name}.part")
+        with open(os.path.join(path, f"{name}.npy"), "wb") as out, open(part, "rb") as f:
+            np.lib.format.write_array_header_1_0(out, {
+                "descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (rows,)
+            })
+            shutil.copyfileobj(f, out)
+        os.remove(part)
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({"rows": rows, "source": source,
+                   "vocabulary": {name: list(codes) for name, codes in vocabulary.items()}}, f)
+    return rows
+
+
+def snapshot_chunks(path: str, chunk_size: int, after=None, until=None) -> Iterator[Chunk]:
+    """Chunks of a snapshot written by write_snapshot, read through memory maps"""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["rows"] == 0:
+        return
+    columns = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+               for name in ["key", *NUMERIC_COLUMNS, *TEXT_COLUMNS]}
+    # Code -1 (missing) indexes the None appended to each vocabulary
+    vocabulary = {name: np.array(values + [None], dtype=object) for name, values in meta["vocabulary"].items()}
+    keys = columns["key"]
+    start = 0 if after is None else int(np.searchsorted(keys, np.array(after, dtype=keys.dtype), side="right"))
+    end = len(keys) if until is None else int(np.searchsorted(keys, np.array(until, dtype=keys.dtype), side="right"))
+    for begin in range(start, end, chunk_size):
+        window = slice(begin, min(begin + chunk_size, end))
+        chunk = Chunk(key=np.asarray(keys[window]))
+        for name in NUMERIC_COLUMNS:
+            chunk[name] = np.asarray(columns[name][window])
+        for name in TEXT_COLUMNS:
+            chunk[name] = vocabulary[name][columns[name][window]]
+        yield chunk
+
+
+def held_out(keys: np.ndarray, percent: int) -> np.ndarray:
+    """Rows set aside for validation, chosen by a hash of their key so every pass agrees"""
+    return np.array([zlib.crc32(str(key).encode()) % 100 < percent for key in keys], dtype=bool)
+
+
+def fit_preprocessing(chunks: Iterator[Chunk]):
+    """StandardScaler fitted with partial_fit and LabelEncoders over the category
+    values seen, in one pass; the same parameters as fitting on the whole table"""
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+    scaler = StandardScaler()
+    values = {name: set() for name in TEXT_COLUMNS}
+    rows = 0
+    for chunk in chunks:
+        chunk = chunk.complete()
+        if not len(chunk):
+            continue
+        scaler.partial_fit(np.column_stack([chunk[name] for name in NUMERICAL_FEATURES]))
+        for name in TEXT_COLUMNS:
+            values[name].update(chunk[name])
+        rows += len(chunk)
+    if rows == 0:
+        raise ValueError("No complete rows to train on")
+    label_encoders = {
+        column: LabelEncoder().fit(np.array(sorted(values[field]), dtype=object))
+        for field, column in CATEGORICAL_FEATURES.items()
+    }
+    return scaler, label_encoders
+
+
+def scan(chunks: Iterator[Chunk], percent: int):
+    """Rows and last key of a source, and the complete rows in the training and validation splits"""
+    rows, last, validation, complete = 0, None, 0, 0
+    for chunk in chunks:
+        if len(chunk):
+            rows += len(chunk)
+            last = chunk["key"][-1].item()
+            keys = chunk.complete()["key"]
+            complete += len(keys)
+            validation += int(held_out(keys, percent).sum())
+    return rows, last, {False: complete - validation, True: validation}
+
+
+def make_dataset(chunks: Callable[[], Iterator[Chunk]], encoder: FeatureEncoder, validation: bool,
+                 percent: int, rows: int, batch_size: int, shuffle_buffer: int):
+    """tf.data pipeline that re-reads the source on every epoch, one chunk at a time"""
+    import tensorflow as tf
+
+    def generate():
+        for chunk in chunks():
+            chunk = chunk.complete()
+            chunk = chunk.take(held_out(chunk["key"], percent) == validation)
+            if len(chunk):
+                yield encoder.transform(chunk).astype(np.float32), chunk["price"].astype(np.float32)
+
+    dataset = tf.data.Dataset.from_generator(generate, output_signature=(
+        tf.TensorSpec(shape=(None, encoder.width), dtype=tf.float32),
+        tf.TensorSpec(shape=(None,), dtype=tf.float32)
+    )).unbatch()
+    if not validation:
+        dataset = dataset.shuffle(shuffle_buffer)
+    # A known length lets Keras show progress and end epochs without a warning
+    dataset = dataset.batch(batch_size).apply(tf.data.experimental.assert_cardinality(math.ceil(rows / batch_size)))
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def build_model(width: int):
+    """The notebook's architecture"""
+    from tensorflow import keras
+
+    return keras.Sequential([
+        keras.Input(shape=(width,)),
+        keras.layers.Dense(64, activation='relu'),
+        keras.layers.Dense(32, activation='relu'),
+        keras.layers.Dense(1)
+    ])
+
+
+def load_state(model_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(model_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def train(chunks: Callable[..., Iterator[Chunk]], source: str, model_dir: str, incremental: bool, epochs: int,
+          batch_size: int, learning_rate: float, validation_percent: int, shuffle_buffer: int, export: bool = True):
+    """Train on every row of the source, or fine-tune the saved model on the rows
+    added since the last checkpoint, and write the artifacts and checkpoint to model_dir.
+
+    chunks(after, until) reads the rows with keys in (after, until]. Every pass after
+    the first scan stops at the last key it saw, so rows inserted during training
+    don't outrun the dataset lengths counted by the scan.
+    """
+    from tensorflow import keras
+
+    state = load_state(model_dir)
+    if incremental:
+        if state is None or state["source"] != source:
+            raise ValueError(f"No {source} checkpoint in {model_dir}; run a full training first")
+        encoder = FeatureEncoder.load(model_dir)
+        if encoder.version != state["feature_version"]:
+            raise ValueError("scaler.pkl or label_encoders.pkl changed since the checkpoint; run a full training")
+        after = state["after"]
+        rows, last, splits = scan(chunks(after), validation_percent)
+        if splits[False] == 0:
+            logger.info(f"No complete rows added since {source} key {after}; nothing to train")
+            return state
+        new_chunks = lambda: chunks(after, last)  # noqa: E731
+        # The encoders stay as the model was trained; new category values get code 0
+        unseen = sum(
+            value not in encoder.lookups[field]
+            and encoder.normalize(value) not in encoder.normalized_lookups[field]
+            for chunk in new_chunks() for field in TEXT_COLUMNS for value in chunk.complete()[field]
+        )
+        if unseen:
+            logger.warning(f"{unseen} category values in the new rows are unknown to the encoders")
+        model = keras.models.load_model(os.path.join(model_dir, "car_price_model.h5"), compile=False)
+        total = state["rows"] + rows
+        logger.info(f"Fine-tuning on {rows} rows added after key {after}")
+    else:
+        start = time.perf_counter()
+        rows, last, splits = scan(chunks(None), validation_percent)
+        new_chunks = lambda: chunks(None, last)  # noqa: E731
+        scaler, label_encoders = fit_preprocessing(new_chunks())
+        encoder = FeatureEncoder.from_sklearn(scaler, label_encoders)
+        logger.info(f"Fitted preprocessing on {rows} rows in {time.perf_counter() - start:.1f}s")
+        model = build_model(encoder.width)
+        total = rows
+
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=learning_rate), loss='mse', metrics=['mae'])
+    train_data = make_dataset(new_chunks, encoder, False, validation_percent, splits[False], batch_size, shuffle_buffer)
+    validation_data = None
+    if splits[True]:
+        validation_data = make_dataset(new_chunks, encoder, True, validation_percent, splits[True], batch_size,
+                                       shuffle_buffer)
+    history = model.fit(train_data, epochs=epochs, validation_data=validation_data, verbose=2)
+
+    os.makedirs(model_dir, exist_ok=True)
+    model.save(os.path.join(model_dir, "car_price_model.h5"))
+    if not incremental:
+        with open(os.path.join(model_dir, "label_encoders.pkl"), "wb") as f:
+            pickle.dump(label_encoders, f)
+        with open(os.path.join(model_dir, "scaler.pkl"), "wb") as f:
+            pickle.dump(scaler, f)
+    if export:
+        from numpy_model import export_npz
+        export_npz(model_dir, os.path.join(model_dir, "car_price_model.npz"))
+
+    state = {
+        "source": source,
+        "after": last,
+        "rows": total,
+        "feature_version": encoder.version,
+        "val_mae": float(history.history["val_mae"][-1]) if "val_mae" in history.history else None,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    with open(os.path.join(model_dir, STATE_FILE), "w") as f:
+        json.dump(state, f, indent=2)
+    logger.info(f"Saved model to {model_dir}; checkpoint at {source} key {last}")
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the price model from a database or snapshot, streaming in chunks")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--database-url", help="SQL API database (postgresql://...)")
+    source.add_argument("--mongodb-url", help="MongoDB API database (mongodb://...)")
+    source.add_argument("--snapshot", help="Snapshot directory written with --write-snapshot")
+    source.add_argument("--csv", help="CSV in ford.csv format (default when no source is given)")
+    parser.add_argument("--write-snapshot", metavar="DIR", help="Copy the source into a memory-mapped snapshot and exit")
+    parser.add_argument("--incremental", action="store_true", help="Fine-tune on rows added since the last checkpoint")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Where artifacts and the checkpoint are read and written")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows read from the source at a time")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--learning-rate", type=float, default=0.001)
+    parser.add_argument("--validation-percent", type=int, default=20, help="Share of rows held out, by key hash")
+    parser.add_argument("--shuffle-buffer", type=int, default=10000, help="Rows shuffled together in memory")
+    parser.add_argument("--no-export", action="store_true", help="Skip writing car_price_model.npz")
+    args = parser.parse_args()
+
+    if args.database_url:
+        name, read, location = "postgres", postgres_chunks, args.database_url
+    elif args.mongodb_url:
+        name, read, location = "mongodb", mongo_chunks, args.mongodb_url
+    elif args.snapshot:
+        with open(os.path.join(args.snapshot, "meta.json")) as f:
+            name = json.load(f)["source"]
+        read, location = snapshot_chunks, args.snapshot
+    else:
+        name, read, location = "csv", csv_chunks, args.csv or CSV_PATH
+
+    chunks = lambda after, until=None: read(location, args.chunk_size, after, until)  # noqa: E731
+    if args.write_snapshot:
+        start = time.perf_counter()
+        rows = write_snapshot(chunks(None), args.write_snapshot, name)
+        logger.info(f"Wrote {rows} rows to {args.write_snapshot} in {time.perf_counter() - start:.1f}s")
+    else:
+        train(chunks, name, args.model_dir, args.incremental, args.epochs, args.batch_size, args.learning_rate,
+              args.validation_percent, args.shuffle_buffer, export=not args.no_export)